@@ -53,6 +53,7 @@ setup(
     tests_require=TESTS_REQUIRE,
     install_requires=[
         'setuptools',
+        'gevent',
         'nti.app.assessment',
         'nti.app.contentlibrary',
         'nti.app.products.courseware',
@@ -65,9 +66,11 @@ setup(
         'nti.externalization',
         'nti.links',
         'nti.ntiids',
+        'perfmetrics',
         'pyramid',
         'requests',
         'six',
+        'zc.catalog',
         'zope.annotation',
         'zope.cachedescriptors',
         'zope.component',
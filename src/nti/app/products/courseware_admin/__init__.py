@@ -11,6 +11,9 @@ from __future__ import absolute_import
 from nti.app.products.courseware import MessageFactory
 
 VIEW_EXPORT_COURSE = 'Export'
+VIEW_EXPORT_COURSE_JOB = 'ExportJob'
+VIEW_ADMIN_EXPORT_COURSE_JOB = 'ExportCourseJob'
+VIEW_DOWNLOAD_COURSE_EXPORT = 'DownloadCourseExport'
 VIEW_IMPORT_COURSE = 'Import'
 VIEW_COURSE_ROLES = 'Roles'
 VIEW_COURSE_EDITORS = 'Editors'
@@ -20,6 +23,10 @@ VIEW_COURSE_ADMINS = 'CourseAdmins'
 VIEW_EXPLICTLY_ADMINISTERED_COURSES = 'CoursesExplicitlyAdministered'
 VIEW_COURSE_ADMIN_LEVELS = 'AdminLevels'
 VIEW_ADMIN_IMPORT_COURSE = 'ImportCourse'
+VIEW_IMPORT_COURSE_JOB = 'ImportCourseJob'
+VIEW_VALIDATE_COURSE_ARCHIVE = 'ValidateCourseArchive'
+VIEW_IMPORT_UPLOADS = 'ImportUploads'
+VIEW_REBUILD_ENROLLMENT_CATALOG_JOB = 'RebuildEnrollmentCatalogJob'
 VIEW_COURSE_REMOVE_EDITORS = 'RemoveEditors'
 VIEW_COURSE_SUGGESTED_TAGS = 'SuggestedTags'
 VIEW_ASSESSMENT_POLICIES = 'AssessmentPolicies'
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+
+from zope import interface
+
+from zope.securitypolicy.interfaces import IPrincipalRoleManager
+
+from nti.app.assessment.interfaces import ICourseEvaluations
+
+from nti.app.products.courseware.resources.interfaces import ICourseRootFolder
+
+from nti.app.products.courseware_admin.interfaces import ICourseExportArtifactCache
+
+from nti.app.products.courseware_admin.utils import iter_outline_objects
+
+from nti.app.products.courseware_admin.zipstream import COMPRESSION_DEFLATE
+
+from nti.assessment.interfaces import IQAssignmentPolicies
+
+from nti.contentlibrary.interfaces import IEditableContentPackage
+
+from nti.contenttypes.completion.interfaces import ICompletableItemContainer
+from nti.contenttypes.completion.interfaces import ICompletableItemDefaultRequiredPolicy
+from nti.contenttypes.completion.interfaces import ICompletionContextCompletionPolicyContainer
+
+from nti.contenttypes.courses.common import get_course_packages
+
+from nti.contenttypes.courses.discussions.interfaces import ICourseDiscussions
+
+from nti.contenttypes.courses.grading.interfaces import ICourseGradingPolicy
+
+from nti.contenttypes.courses.interfaces import ICourseInstance
+from nti.contenttypes.courses.interfaces import ICourseEnrollments
+from nti.contenttypes.courses.interfaces import ICourseCatalogEntry
+from nti.contenttypes.courses.interfaces import ICourseInstanceVendorInfo
+
+#: Default maximum age (in seconds) of a cached export
+DEFAULT_MAX_AGE = 24 * 60 * 60
+
+#: Default maximum total size (in bytes) of the cached exports
+DEFAULT_MAX_SIZE = 10 * 1024 * 1024 * 1024
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def _last_modified(obj):
+    return getattr(obj, 'lastModified', None) or 0
+
+
+def _iter_folder(folder):
+    stack = [folder] if folder is not None else []
+    while stack:
+        node = stack.pop()
+        yield node
+        values = getattr(node, 'values', None)
+        if callable(values):
+            stack.extend(values())
+
+
+def _iter_export_sources(course):
+    """
+    Iterate the objects the course exporter writes out: the course, its
+    catalog entry, vendor info, outline, assessments, policies, editable
+    content packages, discussions, forums, completion policies and the files
+    of its root folder.
+    """
+    yield course
+    yield ICourseCatalogEntry(course, None)
+    yield ICourseInstanceVendorInfo(course, None)
+    yield IQAssignmentPolicies(course, None)
+    yield ICourseGradingPolicy(course, None)
+    for package in get_course_packages(course):
+        if IEditableContentPackage.providedBy(package):
+            yield package
+    # course discussions, and the forums, topics and comments of its board
+    for obj in _iter_folder(ICourseDiscussions(course, None)):
+        yield obj
+    for obj in _iter_folder(getattr(course, 'Discussions', None)):
+        yield obj
+    policies = ICompletionContextCompletionPolicyContainer(course, None)
+    if policies is not None:
+        yield getattr(policies, 'context_policy', None)
+        for obj in _iter_folder(policies):
+            yield obj
+    yield ICompletableItemContainer(course, None)
+    yield ICompletableItemDefaultRequiredPolicy(course, None)
+    for obj in iter_outline_objects(course):
+        yield obj
+    evaluations = ICourseEvaluations(course, None)
+    if evaluations is not None:
+        yield evaluations
+        for obj in evaluations.values():
+            yield obj
+    for obj in _iter_folder(ICourseRootFolder(course, None)):
+        yield obj
+
+
+def _iter_backup_sources(course):
+    """
+    Iterate the state only backup exports write out: the enrollment
+    records and role assignments of the course.
+    """
+    enrollments = ICourseEnrollments(course)
+    count = 0
+    for record in enrollments.iter_enrollments():
+        count += 1
+        yield _last_modified(record)
+    yield count
+    manager = IPrincipalRoleManager(course, None)
+    if manager is not None:
+        for value in sorted((role, principal, str(setting))
+                            for role, principal, setting in manager.getPrincipalsAndRoles()):
+            yield value
+
+
+def get_course_export_version(context, backup=False):
+    """
+    Return a version of everything the course exporter writes out for the
+    given course: the most recent modification time and the number of its
+    exported objects and, for backups, a digest of its enrollment records
+    and role assignments.
+    """
+    course = ICourseInstance(context)
+    sources = [x for x in _iter_export_sources(course) if x is not None]
+    result = '%r|%s' % (max(_last_modified(x) for x in sources), len(sources))
+    if backup:
+        digest = hashlib.sha1()
+        for value in _iter_backup_sources(course):
+            digest.update(repr(value).encode('utf-8'))
+        result = '%s|%s' % (result, digest.hexdigest())
+    return result
+
+
+@interface.implementer(ICourseExportArtifactCache)
+class ExportArtifactCache(object):
+    """
+    Cache export archives under ``root/<key>/<filename>``. The root,
+    maximum age and maximum size may be set with the
+    ``COURSE_EXPORT_CACHE_DIR``, ``COURSE_EXPORT_CACHE_MAX_AGE`` and
+    ``COURSE_EXPORT_CACHE_MAX_SIZE`` environment variables.
+
+    Export jobs are shared by all nodes; the root should be on storage
+    shared by them as well, otherwise archives missing from the local root
+    are built again on download.
+    """
+
+    def __init__(self, root=None, max_age=None, max_size=None):
+        self.root = root \
+                 or os.getenv('COURSE_EXPORT_CACHE_DIR') \
+                 or os.path.join(tempfile.gettempdir(), 'nti_course_exports')
+        self.max_age = max_age \
+                    or int(os.getenv('COURSE_EXPORT_CACHE_MAX_AGE') or DEFAULT_MAX_AGE)
+        self.max_size = max_size \
+                     or int(os.getenv('COURSE_EXPORT_CACHE_MAX_SIZE') or DEFAULT_MAX_SIZE)
+
+    def key(self, course, backup=False, salt=None, compression=None):
+        entry = ICourseCatalogEntry(course)
+        version = get_course_export_version(course, backup)
+        compression = (compression or COMPRESSION_DEFLATE).strip().lower()
+        data = u'%s|%r|%s|%s|%s' % (entry.ntiid, version, bool(backup),
+                                    salt or u'', compression)
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def _entries(self):
+        if not os.path.isdir(self.root):
+            return ()
+        result = []
+        for name in os.listdir(self.root):
+            entry_dir = os.path.join(self.root, name)
+            files = os.listdir(entry_dir) if os.path.isdir(entry_dir) else ()
+            if not files:
+                continue
+            path = os.path.join(entry_dir, files[0])
+            try:
+                stat = os.stat(path)
+            except OSError:  # pragma: no cover
+                continue
+            result.append((stat.st_mtime, stat.st_size, entry_dir, path))
+        return sorted(result)
+
+    def get(self, key):
+        entry_dir = os.path.join(self.root, key)
+        files = os.listdir(entry_dir) if os.path.isdir(entry_dir) else ()
+        if not files:
+            return None
+        path = os.path.join(entry_dir, files[0])
+        if time.time() - os.path.getmtime(path) > self.max_age:
+            shutil.rmtree(entry_dir, True)
+            return None
+        return path
+
+    def put(self, key, path):
+        entry_dir = os.path.join(self.root, key)
+        shutil.rmtree(entry_dir, True)
+        os.makedirs(entry_dir)
+        result = os.path.join(entry_dir, os.path.basename(path))
+        shutil.move(path, result)
+        # age entries from the time they are cached
+        os.utime(result, None)
+        self.evict(keep=entry_dir)
+        return result
+
+    def evict(self, keep=None):
+        now = time.time()
+        entries = []
+        for mtime, size, entry_dir, path in self._entries():
+            if entry_dir == keep:
+                continue
+            if now - mtime > self.max_age:
+                logger.info("Evicting expired course export %s", path)
+                shutil.rmtree(entry_dir, True)
+            else:
+                entries.append((size, entry_dir, path))
+        total = sum(x[0] for x in entries)
+        if keep is not None:
+            total += sum(os.path.getsize(os.path.join(keep, x))
+                         for x in os.listdir(keep))
+        # oldest first
+        for size, entry_dir, path in entries:
+            if total <= self.max_size:
+                break
+            logger.info("Evicting course export %s", path)
+            shutil.rmtree(entry_dir, True)
+            total -= size
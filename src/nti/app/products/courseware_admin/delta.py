@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Incremental (delta) course exports.
+
+A manifest export is a regular course archive that also carries an
+``export_manifest.json`` recording the ``lastModified`` time of every
+outline object and the digest of every exported file. A delta export is
+made against the manifest of a previous export (its base) and only holds
+the files that changed since then, plus its own manifest chained to the
+base. A base archive followed by its chain of deltas is imported through
+a :class:`ChainedFiler`.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import io
+import os
+import time
+import uuid
+import hashlib
+import itertools
+import tempfile
+
+import six
+
+import simplejson as json
+
+from nti.app.products.courseware_admin.exporter import stage_course
+from nti.app.products.courseware_admin.exporter import export_filename
+
+from nti.app.products.courseware_admin.filer import ChainedFiler
+from nti.app.products.courseware_admin.filer import close_filer
+from nti.app.products.courseware_admin.filer import get_archive_filer
+
+from nti.app.products.courseware_admin.utils import iter_outline_objects
+
+from nti.app.products.courseware_admin.zipstream import write_zip
+from nti.app.products.courseware_admin.zipstream import get_zip_writer
+
+from nti.contenttypes.courses.interfaces import ICourseInstance
+from nti.contenttypes.courses.interfaces import ICourseExportFiler
+from nti.contenttypes.courses.interfaces import ICourseCatalogEntry
+from nti.contenttypes.courses.interfaces import InvalidCourseArchiveException
+
+MANIFEST_NAME = 'export_manifest.json'
+
+#: Read size when computing file digests
+BUFFER_SIZE = 256 * 1024
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def _digest(path):
+    result = hashlib.sha1()
+    with open(path, 'rb') as stream:
+        while True:
+            data = stream.read(BUFFER_SIZE)
+            if not data:
+                break
+            result.update(data)
+    return result.hexdigest()
+
+
+def _iter_files(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            if name != MANIFEST_NAME:
+                yield name, path
+
+
+def get_object_versions(context):
+    """
+    Return a map of the ntiid to the ``lastModified`` time of every object
+    in the course outline.
+    """
+    result = {}
+    for obj in iter_outline_objects(context):
+        ntiid = getattr(obj, 'ntiid', None)
+        if ntiid:
+            result[ntiid] = getattr(obj, 'lastModified', None) or 0
+    return result
+
+
+def read_manifest(source):
+    """
+    Return the export manifest of the given manifest file, archive path or
+    archive filer, or None if it has none.
+    """
+    if isinstance(source, six.string_types):
+        if source.endswith('.json'):
+            with open(source, 'rb') as fp:
+                return json.load(fp)
+        filer = get_archive_filer(source)
+        try:
+            return read_manifest(filer)
+        finally:
+            close_filer(filer)
+    manifest = source.get(MANIFEST_NAME)
+    return json.load(manifest) if manifest is not None else None
+
+
+def _changed(current, base):
+    return sorted(k for k, v in current.items() if base.get(k) != v)
+
+
+def export_course_delta(context, base=None, backup=True, salt=None, path=None,
+                        compression=None):
+    """
+    Export the given course as a manifest archive. With a ``base`` manifest
+    only the files that changed since the base export are archived.
+
+    Exported file names depend on the object ntiids, so deltas should be
+    made with ``backup`` (or the same ``salt`` as their base).
+
+    :returns: A tuple of the archive path and its manifest.
+    """
+    course = ICourseInstance(context)
+    entry = ICourseCatalogEntry(course)
+    filer = ICourseExportFiler(course)
+    if base is not None and base.get('Course') != entry.ntiid:
+        raise ValueError("Base manifest is for a different course")
+    try:
+        stage_course(course, filer, backup, salt)
+        files = dict((name, _digest(source))
+                     for name, source in _iter_files(filer.path))
+        objects = get_object_versions(course)
+        manifest = {
+            'Id': uuid.uuid4().hex,
+            'Course': entry.ntiid,
+            'CreatedTime': time.time(),
+            'Backup': bool(backup),
+            'Base': base['Id'] if base is not None else None,
+            'Delta': base is not None,
+            'Objects': objects,
+            'Files': files,
+        }
+        base_files = base.get('Files', {}) if base is not None else {}
+        base_objects = base.get('Objects', {}) if base is not None else {}
+        changed = _changed(files, base_files)
+        manifest['Changed'] = changed
+        manifest['Removed'] = sorted(set(base_files) - set(files))
+        manifest['ChangedObjects'] = _changed(objects, base_objects)
+        manifest['RemovedObjects'] = sorted(set(base_objects) - set(objects))
+        # write archive
+        path = path or tempfile.mkdtemp()
+        name = export_filename(course)
+        if base is not None:
+            name = '%s.delta.zip' % name[:-4]
+        zip_file = os.path.join(path, name)
+        writer = get_zip_writer(compression)
+        stream = io.BytesIO(json.dumps(manifest, indent='\t').encode('utf-8'))
+        parts = [writer.iter_file(os.path.join(filer.path, key), key)
+                 for key in changed]
+        parts.append(writer.iter_stream(MANIFEST_NAME, stream))
+        parts.append(writer.iter_close())
+        write_zip(itertools.chain(*parts), zip_file)
+        logger.info('Course %s exported to %s (%s/%s file(s)) (%s changed object(s))',
+                    entry.ntiid, zip_file, len(changed), len(files),
+                    len(manifest['ChangedObjects']))
+        return zip_file, manifest
+    finally:
+        filer.reset()
+
+
+def chain_archives(filers):
+    """
+    Return a :class:`ChainedFiler` over the given filers of a base manifest
+    archive followed by its deltas, in order.
+    """
+    base = None
+    for filer in filers:
+        manifest = read_manifest(filer)
+        if manifest is None:
+            logger.error('Archive %s has no export manifest', filer)
+            raise InvalidCourseArchiveException()
+        if base is None and manifest.get('Delta'):
+            logger.error('Archive %s is not a base export', filer)
+            raise InvalidCourseArchiveException()
+        if base is not None and manifest.get('Base') != base['Id']:
+            logger.error('Archive %s is not a delta of %s', filer, base['Id'])
+            raise InvalidCourseArchiveException()
+        base = manifest
+    keys = list(base['Files']) + [MANIFEST_NAME]
+    return ChainedFiler(filers, keys)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Dry-run imports.
+
+A dry run dooms the current transaction, so that whatever the importer
+does is aborted, and counts the objects that are created, updated or
+removed in the meantime, by type, from their lifecycle events. Events are
+only counted for the greenlet (or thread) running the dry run.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import time
+import threading
+
+from collections import defaultdict
+
+from contextlib import contextmanager
+
+import transaction
+
+from zope import component
+
+from zope.interface.interfaces import IObjectEvent
+
+from zope.lifecycleevent.interfaces import IObjectAddedEvent
+from zope.lifecycleevent.interfaces import IObjectRemovedEvent
+from zope.lifecycleevent.interfaces import IObjectModifiedEvent
+
+CREATED = u'Created'
+UPDATED = u'Updated'
+REMOVED = u'Removed'
+
+_local = threading.local()
+
+logger = __import__('logging').getLogger(__name__)
+
+
+class ChangeCounter(object):
+    """
+    Counts the objects changed during a dry run. An object counts once,
+    as created or removed if it was, otherwise as updated.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.finished = None
+        self.events = 0
+        self._changes = {}
+
+    def record(self, obj, kind):
+        self.events += 1
+        key = id(obj)
+        previous = self._changes.get(key)
+        if previous is None or previous[1] == UPDATED:
+            self._changes[key] = (type(obj).__name__, kind, obj)
+
+    def finish(self):
+        if self.finished is None:
+            self.finished = time.time()
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+    def toExternalObject(self, *unused_args, **unused_kwargs):
+        changes = {
+            CREATED: defaultdict(int),
+            UPDATED: defaultdict(int),
+            REMOVED: defaultdict(int),
+        }
+        for name, kind, _ in self._changes.values():
+            changes[kind][name] += 1
+        result = dict((k, dict(v)) for k, v in changes.items())
+        result['Totals'] = dict((k, sum(v.values())) for k, v in changes.items())
+        result['Events'] = self.events
+        result['Elapsed'] = self.elapsed
+        return result
+
+
+def get_change_counter():
+    """
+    Return the :class:`ChangeCounter` of the running dry run, if any.
+    """
+    return getattr(_local, 'counter', None)
+
+
+@component.adapter(None, IObjectEvent)
+def _count_object_event(obj, event):
+    counter = get_change_counter()
+    if counter is None:
+        return
+    if IObjectAddedEvent.providedBy(event):
+        counter.record(obj, CREATED)
+    elif IObjectRemovedEvent.providedBy(event):
+        counter.record(obj, REMOVED)
+    elif IObjectModifiedEvent.providedBy(event):
+        counter.record(obj, UPDATED)
+
+
+@contextmanager
+def dry_run():
+    """
+    Doom the current transaction and yield a :class:`ChangeCounter` of the
+    objects changed within.
+    """
+    transaction.doom()
+    counter = ChangeCounter()
+    previous = get_change_counter()
+    _local.counter = counter
+    try:
+        yield counter
+    finally:
+        _local.counter = previous
+        counter.finish()
+        logger.info("Dry run (elapsed=%.3fs) (events=%s) %s",
+                    counter.elapsed, counter.events,
+                    counter.toExternalObject()['Totals'])
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Coalesced modified events for batched object creation.
+
+Within :func:`held_modified_events`, the modified events sent by the
+greenlet (or thread) that opened it are held back, by object, while every
+other event is dispatched right away; a single modified event is then sent
+for each of these objects on exit.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import threading
+
+from collections import OrderedDict
+
+from contextlib import contextmanager
+
+import zope.event
+
+from zope import lifecycleevent
+
+from zope.lifecycleevent.interfaces import IObjectModifiedEvent
+
+logger = __import__('logging').getLogger(__name__)
+
+
+class ModifiedEventGate(object):
+    """
+    Stands in for the :mod:`zope.event` subscribers while any greenlet holds
+    modified events, dispatching every event but the modified events of
+    the greenlets holding them.
+    """
+
+    def __init__(self):
+        self.users = 0
+        self.dispatch = ()
+        self.local = threading.local()
+
+    def __call__(self, event):
+        held = getattr(self.local, 'held', None)
+        if held is not None and IObjectModifiedEvent.providedBy(event):
+            held.setdefault(id(event.object), event.object)
+            return
+        for subscriber in self.dispatch:
+            subscriber(event)
+
+    def open(self):
+        if not self.users:
+            self.dispatch = list(zope.event.subscribers)
+            zope.event.subscribers[:] = [self]
+        self.users += 1
+
+    def close(self):
+        self.users -= 1
+        if not self.users:
+            zope.event.subscribers[:] = self.dispatch
+            self.dispatch = ()
+
+
+_gate = ModifiedEventGate()
+
+
+@contextmanager
+def held_modified_events():
+    """
+    Hold back the modified events sent within, yielding the (ordered) map
+    of the modified objects, to which more objects may be added; a single
+    modified event is sent for each of them on a successful exit.
+    """
+    held = OrderedDict()
+    previous = getattr(_gate.local, 'held', None)
+    _gate.open()
+    _gate.local.held = held
+    try:
+        yield held
+    finally:
+        _gate.local.held = previous
+        _gate.close()
+    for obj in held.values():
+        lifecycleevent.modified(obj)
+    logger.debug("Sent %s coalesced modified event(s)", len(held))
@@ -8,37 +8,183 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import absolute_import
 
+import os
+import re
 import time
 import tempfile
 
 from zope import component
+from zope import interface
+
+from nti.app.products.courseware_admin.timing import PhaseTimer
+
+from nti.app.products.courseware_admin.zipstream import ZipStreamWriter
+
+from nti.app.products.courseware_admin.zipstream import get_zip_writer
+from nti.app.products.courseware_admin.zipstream import iter_zip_directory
+from nti.app.products.courseware_admin.zipstream import write_zip_directory
 
 from nti.contenttypes.courses.interfaces import ICourseExporter
 from nti.contenttypes.courses.interfaces import ICourseInstance
 from nti.contenttypes.courses.interfaces import ICourseExportFiler
 from nti.contenttypes.courses.interfaces import ICourseCatalogEntry
 
+from nti.namedfile.file import safe_filename
+
 logger = __import__('logging').getLogger(__name__)
 
 
-def export_course(context, backup=True, salt=None, path=None):
+def _section_name(key):
+    name = key.replace(os.sep, '/').strip('/').split('/')[0]
+    return re.sub(r'[^\w-]', '_', name) or 'root'
+
+
+class TimedExportFiler(object):
+    """
+    A proxy of an export filer that attributes the time spent by the course
+    exporter to the section (i.e. top level bucket or file) of each file it
+    saves: the time since the previous save goes to the saved file section.
+    """
+
+    def __init__(self, filer, timer):
+        self._filer = filer
+        self._timer = timer
+        self._last = time.time()
+        interface.directlyProvides(self, interface.providedBy(filer))
+
+    def __getattr__(self, name):
+        return getattr(self._filer, name)
+
+    def save(self, key, source, *args, **kwargs):
+        result = self._filer.save(key, source, *args, **kwargs)
+        now = time.time()
+        bucket = kwargs.get('bucket') or (args[1] if len(args) > 1 else None)
+        self._timer.add('Export.%s' % _section_name(bucket or key),
+                        now - self._last)
+        self._timer.count('Files')
+        self._last = now
+        return result
+
+
+def staged_size(path):
+    """
+    Return the size in bytes of the files under the given staging path.
+    """
+    result = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            result += os.path.getsize(os.path.join(root, name))
+    return result
+
+
+def set_archive_size(timer, size):
+    """
+    Record the size of the export archive and its compression ratio.
+    """
+    timer.gauge('ArchiveBytes', size)
+    staged = timer.values.get('StagedBytes')
+    if staged and size:
+        timer.gauge('CompressionRatio', round(staged / size, 2))
+
+
+def stage_course(course, filer, backup=True, salt=None, timer=None):
+    """
+    Export the course to the staging area of the given export filer,
+    recording its phases in the given :class:`PhaseTimer`, if any.
+    """
+    timer = timer if timer is not None else PhaseTimer('export')
+    entry = ICourseCatalogEntry(course)
+    # prepare filer
+    with timer.phase('Prepare'):
+        filer.prepare()
+    # export course
+    salt = salt or str(time.time())
+    logger.info('Initiating course export for %s (backup=%s) (salt=%s)',
+                entry.ntiid, backup, salt)
+    exporter = component.getUtility(ICourseExporter)
+    with timer.phase('Export'):
+        exporter.export(course, TimedExportFiler(filer, timer), backup, salt)
+    timer.gauge('StagedBytes', staged_size(filer.path))
+
+
+def export_course(context, backup=True, salt=None, path=None, timer=None,
+                  compression=None):
+    """
+    Export the course to a zip archive in the given directory, returning
+    its path. The archive is written with the given compression policy
+    (see :func:`get_zip_writer`), if any.
+    """
+    timer = timer if timer is not None else PhaseTimer('export')
     course = ICourseInstance(context)
     filer = ICourseExportFiler(course)
-    entry = ICourseCatalogEntry(course)
     # pylint: disable=too-many-function-args
     try:
-        # prepare filer
-        filer.prepare()
-        # export course
-        salt = salt or str(time.time())
-        logger.info('Initiating course export for %s (backup=%s) (salt=%s)',
-                    entry.ntiid, backup, salt)
-        exporter = component.getUtility(ICourseExporter)
-        exporter.export(course, filer, backup, salt)
+        stage_course(course, filer, backup, salt, timer)
         # zip contents
         path = path or tempfile.mkdtemp()
-        # pylint: disable=redundant-keyword-arg
-        zip_file = filer.asZip(path=path)
+        with timer.phase('Zip'):
+            if compression:
+                zip_file = os.path.join(path, export_filename(course))
+                write_zip_directory(filer.path, zip_file,
+                                    get_zip_writer(compression))
+            else:
+                # pylint: disable=redundant-keyword-arg
+                zip_file = filer.asZip(path=path)
+        set_archive_size(timer, os.path.getsize(zip_file))
         return zip_file
     finally:
         filer.reset()
+
+
+def export_filename(context):
+    entry = ICourseCatalogEntry(context)
+    name = entry.ProviderUniqueID or entry.ntiid
+    return '%s.zip' % safe_filename(name)
+
+
+class StreamingCourseExport(object):
+    """
+    A WSGI ``app_iter`` producing the zip archive of an exported course
+    straight from the export filer staging area, i.e. without writing the
+    archive to disk. The filer is reset once the response is closed, when
+    the timings of the export (including streaming) are reported.
+    """
+
+    started = None
+
+    def __init__(self, filer, writer=None, timer=None, ntiid=None):
+        self.filer = filer
+        self.ntiid = ntiid
+        self.writer = writer if writer is not None else ZipStreamWriter()
+        self.timer = timer if timer is not None else PhaseTimer('export')
+
+    def __iter__(self):
+        self.started = time.time()
+        return iter_zip_directory(self.filer.path, self.writer)
+
+    def close(self):
+        self.filer.reset()
+        if self.started is not None:
+            self.timer.add('Stream', time.time() - self.started)
+            set_archive_size(self.timer, self.writer.bytes_written)
+            self.timer.report(course=self.ntiid)
+
+
+def stream_course(context, backup=True, salt=None, timer=None,
+                  compression=None):
+    """
+    Export the course to its staging area, returning an iterable over the
+    bytes of its zip archive, written with the given compression policy.
+    The iterable must be closed once consumed.
+    """
+    writer = get_zip_writer(compression)
+    timer = timer if timer is not None else PhaseTimer('export')
+    course = ICourseInstance(context)
+    filer = ICourseExportFiler(course)
+    try:
+        stage_course(course, filer, backup, salt, timer)
+    except Exception:
+        filer.reset()
+        raise
+    return StreamingCourseExport(filer, writer, timer=timer,
+                                 ntiid=ICourseCatalogEntry(course).ntiid)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import os
+import time
+import zipfile
+import tempfile
+import threading
+
+import gevent
+
+from gevent.threadpool import ThreadPool
+
+from nti.contenttypes.courses.creator import delete_directory
+
+#: Number of threads used to decompress archive members
+DEFAULT_WORKERS = 4
+
+#: Read/write buffer size used when extracting members
+BUFFER_SIZE = 1024 * 1024
+
+#: Seconds between progress reports
+PROGRESS_INTERVAL = 2
+
+logger = __import__('logging').getLogger(__name__)
+
+
+class ExtractionProgress(object):
+    """
+    Tracks the bytes and members extracted from an archive. Counters are
+    updated by the extraction threads.
+    """
+
+    #: The extraction directory
+    root = None
+
+    #: The extracted archive contents, e.g. its enclosing directory
+    path = None
+
+    def __init__(self, members_total=0, bytes_total=0):
+        self.bytes_done = 0
+        self.members_done = 0
+        self.bytes_total = bytes_total
+        self.members_total = members_total
+        self.started = time.time()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def update(self, nbytes=0, members=0):
+        with self._lock:
+            self.bytes_done += nbytes
+            self.members_done += members
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def percent(self):
+        if not self.bytes_total:
+            return 100.0 if self.finished else 0.0
+        return round(self.bytes_done * 100.0 / self.bytes_total, 2)
+
+    def toExternalObject(self, *unused_args, **unused_kwargs):
+        return {
+            'Members': self.members_done,
+            'TotalMembers': self.members_total,
+            'Bytes': self.bytes_done,
+            'TotalBytes': self.bytes_total,
+            'Percent': self.percent,
+            'Elapsed': self.elapsed,
+        }
+
+    def __repr__(self):
+        return '<%s %s/%s members %s/%s bytes>' % (self.__class__.__name__,
+                                                   self.members_done,
+                                                   self.members_total,
+                                                   self.bytes_done,
+                                                   self.bytes_total)
+
+
+def log_progress(progress):
+    logger.info('Extracted %s/%s member(s), %s/%s byte(s) (%s%%) in %.2f(s)',
+                progress.members_done, progress.members_total,
+                progress.bytes_done, progress.bytes_total,
+                progress.percent, progress.elapsed)
+
+
+def _member_target(target, name):
+    result = os.path.normpath(os.path.join(target, name))
+    if not result.startswith(os.path.join(target, '')):
+        raise IOError("Invalid archive member %s" % name)
+    return result
+
+
+def _partition(infos, count):
+    """
+    Split the archive members into at most ``count`` groups of roughly the
+    same uncompressed size.
+    """
+    groups = [[] for _ in range(count)]
+    sizes = [0] * count
+    for info in sorted(infos, key=lambda x: x.file_size, reverse=True):
+        idx = sizes.index(min(sizes))
+        groups[idx].append(info)
+        sizes[idx] += info.file_size
+    return [x for x in groups if x]
+
+
+def _extract_members(path, target, infos, progress, buffer_size):
+    # each thread reads through its own archive handle
+    archive = zipfile.ZipFile(path)
+    try:
+        for info in infos:
+            out_file = _member_target(target, info.filename)
+            with archive.open(info) as source, \
+                    open(out_file, 'wb', buffer_size) as fp:
+                while True:
+                    data = source.read(buffer_size)
+                    if not data:
+                        break
+                    fp.write(data)
+                    progress.update(nbytes=len(data))
+            progress.update(members=1)
+    finally:
+        archive.close()
+
+
+def extract_archive(path, target=None, workers=DEFAULT_WORKERS, progress=None,
+                    buffer_size=BUFFER_SIZE, interval=PROGRESS_INTERVAL):
+    """
+    Extract the given zip archive decompressing its members on a bounded
+    pool of threads.
+
+    :param path: The archive path
+    :param target: The target directory; a temp directory if not provided
+    :param workers: The maximum number of extraction threads
+    :param progress: A callable invoked with the :class:`ExtractionProgress`
+        every ``interval`` seconds and once extraction is complete
+    :return: The final :class:`ExtractionProgress`. As with
+        :func:`check_archive`, its ``path`` points to the single enclosing
+        directory of the archive, if any; ``root`` is the directory to remove
+    """
+    if not zipfile.is_zipfile(path):
+        raise IOError("Invalid archive")
+    target = os.path.abspath(target or tempfile.mkdtemp())
+    with zipfile.ZipFile(path) as archive:
+        infos = archive.infolist()
+    files = []
+    for info in infos:
+        out_path = _member_target(target, info.filename)
+        if info.filename.endswith('/'):
+            out_dir = out_path
+        else:
+            out_dir = os.path.dirname(out_path)
+            files.append(info)
+        if not os.path.isdir(out_dir):
+            os.makedirs(out_dir)
+    state = ExtractionProgress(len(files), sum(x.file_size for x in files))
+    state.root = state.path = target
+    workers = max(1, min(workers or DEFAULT_WORKERS, len(files) or 1))
+    pool = ThreadPool(workers)
+    try:
+        results = [
+            pool.spawn(_extract_members, path, target, group, state, buffer_size)
+            for group in _partition(files, workers)
+        ]
+        pending = list(results)
+        while pending:
+            gevent.wait(pending, timeout=interval)
+            pending = [x for x in pending if not x.ready()]
+            if pending and progress is not None:
+                progress(state)
+        for result in results:
+            result.get()  # raise any extraction error
+    except Exception:
+        delete_directory(target)
+        raise
+    finally:
+        pool.kill()
+    state.finished = time.time()
+    if progress is not None:
+        progress(state)
+    # check for extract dir
+    names = os.listdir(target)
+    if len(names) == 1 and os.path.isdir(os.path.join(target, names[0])):
+        state.path = os.path.join(target, names[0])
+    return state
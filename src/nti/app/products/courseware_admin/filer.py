@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import os
+import time
+import shutil
+import zipfile
+import tempfile
+import mimetypes
+
+from zope import interface
+
+from nti.cabinet.filer import DirectoryFiler
+
+from nti.cabinet.interfaces import ISourceFile
+
+from nti.cabinet.mixins import SourceBucket
+
+#: Size (in bytes) over which spooled archive members are written to disk
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def _zip_time(info):
+    try:
+        return time.mktime(info.date_time + (0, 0, -1))
+    except (OverflowError, ValueError):  # pragma: no cover
+        return 0
+
+
+@interface.implementer(ISourceFile)
+class ArchiveSourceFile(object):
+    """
+    A lazily opened, read-only stream over a single zip archive member.
+
+    Zip member streams only move forward: rewinding reopens the member,
+    while any other seek first spools the member to a temporary file.
+    """
+
+    __parent__ = None
+
+    def __init__(self, archive, info, name=None):
+        self._v_fp = None
+        self._v_spooled = False
+        self.info = info
+        self.archive = archive
+        self.name = name or os.path.basename(info.filename)
+        self.createdTime = self.lastModified = _zip_time(info)
+
+    @property
+    def filename(self):
+        return self.name
+    __name__ = filename
+
+    @property
+    def contentType(self):
+        return mimetypes.guess_type(self.name)[0] or u'application/octet-stream'
+    mimeType = contentType
+
+    @property
+    def length(self):
+        return self.info.file_size
+    size = length
+
+    def getSize(self):
+        return self.length
+
+    @property
+    def _fp(self):
+        if self._v_fp is None:
+            self._v_fp = self.archive.open(self.info)
+        return self._v_fp
+
+    def read(self, size=-1):
+        return self._fp.read(size)
+
+    def readline(self, size=-1):
+        return self._fp.readline(size)
+
+    def readlines(self, sizehint=-1):
+        return self._fp.readlines(sizehint)
+
+    def __iter__(self):
+        return iter(self._fp)
+
+    def _spool(self):
+        position = self.tell()
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        source = self.archive.open(self.info)
+        try:
+            shutil.copyfileobj(source, spool)
+        finally:
+            source.close()
+        self.close()
+        spool.seek(position)
+        self._v_fp = spool
+        self._v_spooled = True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=0):
+        if not self._v_spooled:
+            if offset == 0 and whence == 0:
+                self.close()
+                return 0
+            self._spool()
+        return self._v_fp.seek(offset, whence)
+
+    def tell(self):
+        return self._fp.tell() if self._v_fp is not None else 0
+
+    def close(self):
+        if self._v_fp is not None:
+            self._v_fp.close()
+            self._v_fp = None
+        self._v_spooled = False
+
+    @property
+    def data(self):
+        self.close()
+        try:
+            return self.read()
+        finally:
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *unused_args):
+        self.close()
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.info.filename)
+
+
+class ArchiveFiler(DirectoryFiler):
+    """
+    A read-only :class:`DirectoryFiler` backed directly by the central
+    directory of a zip archive.
+
+    Keys are relative to the archive root; a single enclosing directory
+    (e.g. ``course/``) is transparently skipped, matching the behavior of
+    extracting the archive. Members are never written to disk, they are
+    opened as streams only when read.
+    """
+
+    def __init__(self, path):
+        # pylint: disable=super-init-not-called
+        self.native = False
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.archive = zipfile.ZipFile(self.path)
+        self._files = {}
+        self._buckets = {u'': set()}
+        self._build_index()
+
+    def _build_index(self):
+        infos = self.archive.infolist()
+        names = [x.filename.replace('\\', '/') for x in infos]
+        # check for enclosing directory
+        prefix = u''
+        roots = set(x.split('/', 1)[0] for x in names if x)
+        if len(roots) == 1:
+            root = roots.pop() + '/'
+            if all(x.startswith(root) for x in names if x):
+                prefix = root
+        for info, name in zip(infos, names):
+            if prefix:
+                if not name.startswith(prefix):
+                    continue
+                name = name[len(prefix):]
+            is_dir = name.endswith('/')
+            name = name.strip('/')
+            if not name:
+                continue
+            parts = name.split('/')
+            # register all parent buckets
+            for idx in range(len(parts)):
+                parent = '/'.join(parts[:idx])
+                child = '/'.join(parts[:idx + 1])
+                self._buckets.setdefault(parent, set()).add(child)
+                if idx < len(parts) - 1 or is_dir:
+                    self._buckets.setdefault(child, set())
+            if not is_dir:
+                self._files[name] = info
+
+    def _key(self, key, bucket=None):
+        key = key or u''
+        if bucket:
+            key = os.path.join(bucket, key)
+        key = key.replace('\\', '/')
+        root = self.path.replace('\\', '/') + '/'
+        if key.startswith(root):
+            key = key[len(root):]
+        key = os.path.normpath(key).replace('\\', '/')
+        return u'' if key in ('.', '/') else key.strip('/')
+
+    def reset(self):
+        pass
+
+    def prepare(self):
+        pass
+
+    def close(self):
+        self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *unused_args):
+        self.close()
+
+    def save(self, *unused_args, **unused_kwargs):
+        raise IOError("Archive filers are read-only")
+    remove = save
+
+    def get(self, key, bucket=None):
+        key = self._key(key, bucket)
+        if key in self._files:
+            return ArchiveSourceFile(self.archive, self._files[key])
+        elif key in self._buckets:
+            return SourceBucket(key, self)
+        return None
+
+    def list(self, bucket=None):
+        bucket = self._key(bucket)
+        return tuple(sorted(self._buckets.get(bucket) or ()))
+
+    def contains(self, key, bucket=None):
+        key = self._key(key, bucket)
+        return key in self._files or key in self._buckets
+
+    def is_bucket(self, key):
+        return self._key(key) in self._buckets
+    isBucket = is_bucket
+
+    def key_name(self, identifier):
+        return os.path.basename(self._key(identifier))
+
+    def iter_files(self):
+        """
+        Return an iterable of (key, :class:`zipfile.ZipInfo`) for every
+        file member in the archive.
+        """
+        return iter(sorted(self._files.items()))
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.path)
+
+
+class ChainedFiler(ArchiveFiler):
+    """
+    A read-only filer overlaying a chain of filers, e.g. a base archive
+    followed by its delta archives. Only the given keys are visible, each
+    one read from the last filer in the chain that has it.
+    """
+
+    def __init__(self, filers, keys):
+        # pylint: disable=super-init-not-called
+        self.native = False
+        self.filers = tuple(filers)
+        self.path = self.filers[-1].path
+        self._files = {}
+        self._buckets = {u'': set()}
+        for key in keys:
+            for filer in reversed(self.filers):
+                if filer.contains(key) and not filer.is_bucket(key):
+                    self._files[key] = filer
+                    break
+            else:
+                raise IOError("Missing archive member %s" % key)
+            parts = key.split('/')
+            for idx in range(len(parts)):
+                parent = '/'.join(parts[:idx])
+                child = '/'.join(parts[:idx + 1])
+                self._buckets.setdefault(parent, set()).add(child)
+                if idx < len(parts) - 1:
+                    self._buckets.setdefault(child, set())
+
+    def close(self):
+        for filer in self.filers:
+            close_filer(filer)
+
+    def save(self, *unused_args, **unused_kwargs):
+        raise IOError("Chained filers are read-only")
+    remove = save
+
+    def get(self, key, bucket=None):
+        key = self._key(key, bucket)
+        if key in self._files:
+            return self._files[key].get(key)
+        elif key in self._buckets:
+            return SourceBucket(key, self)
+        return None
+
+    def iter_files(self):
+        """
+        Return an iterable of (key, filer) for every visible file.
+        """
+        return iter(sorted(self._files.items(), key=lambda x: x[0]))
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.filers)
+
+
+def get_archive_filer(path):
+    """
+    Return a filer over the given archive path. Directories are served by a
+    :class:`DirectoryFiler`, zip files by an :class:`ArchiveFiler`.
+    """
+    path = os.path.expanduser(path)
+    if os.path.isdir(path):
+        return DirectoryFiler(path)
+    if not zipfile.is_zipfile(path):
+        raise IOError("Invalid archive")
+    return ArchiveFiler(path)
+
+
+def close_filer(filer):
+    close = getattr(filer, 'close', None)
+    if callable(close):
+        close()
@@ -9,25 +9,28 @@ from __future__ import print_function
 from __future__ import absolute_import
 
 import os
-import zipfile
-import tempfile
+import time
 
-import simplejson as json
+from contextlib import contextmanager
 
 from zope import component
 from zope import lifecycleevent
 
-from nti.app.products.courseware.utils import EXPORT_HASH_KEY
-from nti.app.products.courseware.utils import COURSE_META_NAME
+from zope.event import notify
 
-from nti.cabinet.filer import read_source
-from nti.cabinet.filer import DirectoryFiler
+from nti.app.products.courseware_admin.events import held_modified_events
 
-from nti.contentfolder.interfaces import IRootFolder
+from nti.app.products.courseware_admin.extraction import extract_archive
+
+from nti.app.products.courseware_admin.index import index_export_hash
+from nti.app.products.courseware_admin.index import get_courses_for_export_hash
+
+from nti.app.products.courseware_admin.session import get_import_session
 
-from nti.contenttypes.courses import COURSE_EXPORT_HASH_FILE
+from nti.app.products.courseware_admin.utils import iter_outline_objects
+
+from nti.contentfolder.interfaces import IRootFolder
 
-from nti.contenttypes.courses.creator import delete_directory
 from nti.contenttypes.courses.creator import create_course_subinstance
 from nti.contenttypes.courses.creator import create_course as course_creator
 
@@ -41,12 +44,10 @@ from nti.contenttypes.courses.interfaces import ICourseImportMetadata
 from nti.contenttypes.courses.interfaces import InvalidCourseArchiveException
 from nti.contenttypes.courses.interfaces import DuplicateImportFromExportException
 
-from nti.contenttypes.courses.utils import get_courses_for_export_hash
-
 from nti.contenttypes.presentation.interfaces import INTIMedia
 from nti.contenttypes.presentation.interfaces import IConcreteAsset
-from nti.contenttypes.presentation.interfaces import INTILessonOverview
-from nti.contenttypes.presentation.interfaces import IItemAssetContainer
+
+from nti.externalization.interfaces import ObjectModifiedFromExternalEvent
 
 from nti.externalization.internalization import find_factory_for
 
@@ -57,61 +58,93 @@ from nti.recorder.interfaces import IRecordable
 logger = __import__('logging').getLogger(__name__)
 
 
-def check_archive(path):
+@contextmanager
+def _import_session(archive, deltas=()):
+    """
+    Yield an :class:`ImportSession` for the given archive path, filer or
+    session, closing it afterwards only if it was opened here.
+    """
+    session, created = get_import_session(archive, deltas)
+    try:
+        yield session
+    finally:
+        if created:
+            session.close()
+
+
+def check_archive(path, progress=None, workers=None):
+    """
+    Extract the given archive to a temp directory, returning its path or
+    None if the archive is already a directory.
+    """
     if not os.path.isdir(path):
-        if not zipfile.is_zipfile(path):
-            raise IOError("Invalid archive")
-        archive = zipfile.ZipFile(path)
-        tmp_path = tempfile.mkdtemp()
-        archive.extractall(tmp_path)
-        # check for extract dir
-        files = os.listdir(tmp_path)
-        if len(files) == 1 and os.path.isdir(os.path.join(tmp_path, files[0])):
-            tmp_path = os.path.join(tmp_path, files[0])
-    else:
-        tmp_path = None
-    return tmp_path
+        return extract_archive(path, workers=workers, progress=progress).path
+    return None
 
 
-def _lockout(course):
-    logger.info("Locking course")
+def _iter_lockout_objects(course):
+    for obj in iter_outline_objects(course):
+        if not ICourseOutline.providedBy(obj):
+            yield obj
+        yield IConcreteAsset(obj, None)
+
+
+def lockout_course(course):
+    """
+    Lock every recordable outline node and lesson asset of the course.
+
+    The objects are collected and locked first; a single modified event
+    is then sent for each object whose lock state changed, so that every
+    catalog, the metadata queue and the modified subscribers see the new
+    lock state in one pass.
 
-    def _do_lock(obj):
+    :returns: A dict of the object counts and timings.
+    """
+    start = time.time()
+    seen = set()
+    objects = []
+    for obj in _iter_lockout_objects(course):
         if      obj is not None \
+            and id(obj) not in seen \
             and IRecordable.providedBy(obj) \
             and not INTIMedia.providedBy(obj):
+            seen.add(id(obj))
+            objects.append(obj)
+    collected = time.time()
+
+    changed = []
+    for obj in objects:
+        if not obj.isLocked():
             obj.lock()
-            lifecycleevent.modified(obj)
+            changed.append(obj)
+    locked = time.time()
+
+    for obj in changed:
+        lifecycleevent.modified(obj)
+    result = {
+        'Total': len(objects),
+        'Locked': len(changed),
+        'CollectTime': collected - start,
+        'LockTime': locked - collected,
+        'NotifyTime': time.time() - locked,
+        'Elapsed': time.time() - start,
+    }
+    logger.info("Locked %s/%s course object(s) in %.2f(s)",
+                result['Locked'], result['Total'], result['Elapsed'])
+    return result
 
-    def _lock_assets(asset):
-        _do_lock(asset)
-        _do_lock(IConcreteAsset(asset, None))
-        if IItemAssetContainer.providedBy(asset):
-            for item in asset.Items or ():
-                _lock_assets(item)
 
-    def _recur(node):
-        if not ICourseOutline.providedBy(node):
-            _do_lock(node)
-        _lock_assets(INTILessonOverview(node, None))
-        for child in node.values():
-            _recur(child)
-    _recur(course.Outline)
+def _lockout(course):
+    logger.info("Locking course")
+    return lockout_course(course)
 
 
-def _check_export_hash(course, filer, validate):
+def _check_export_hash(course, session, validate):
     """
     Validate the export hash has not been seen in this environment by any
     other courses. Otherwise, we may get courses with colliding ntiids.
     """
-    source = filer.get(COURSE_META_NAME)
-    if source:
-        meta = json.load(source)
-        export_hash = meta.get(EXPORT_HASH_KEY)
-    if not source or not export_hash:
-        # Backwards compatibility
-        source = filer.get(COURSE_EXPORT_HASH_FILE)
-        export_hash = read_source(source)
+    export_hash = session.export_hash
     if export_hash is not None:
         if validate:
             imported_courses = get_courses_for_export_hash(export_hash)
@@ -123,101 +156,160 @@ def _check_export_hash(course, filer, validate):
                             entry_ntiids)
                 raise DuplicateImportFromExportException(entry_ntiids)
         ICourseImportMetadata(course).import_hash = export_hash
+        index_export_hash(course, export_hash)
     else:
         logger.error(u'Attempting to import course archive with no export hash')
         raise InvalidCourseArchiveException()
 
 
-def _execute(course, archive_path, writeout=True, lockout=False, 
-             clear=False, validate_export_hash=True):
+def _execute(course, archive_path, writeout=True, lockout=False,
+             clear=False, validate_export_hash=True, deltas=()):
     course = ICourseInstance(course, None)
     if course is None:
         raise ValueError("Invalid course")
-    if clear:
-        root = IRootFolder(course)
-        root.clear()
 
-    tmp_path = None
-    try:
-        tmp_path = check_archive(archive_path)
-        filer = DirectoryFiler(tmp_path or archive_path)
-        _check_export_hash(course, filer, validate_export_hash)
+    with _import_session(archive_path, deltas) as session:
+        timer = session.timer
+        if clear:
+            with timer.phase('Clear'):
+                root = IRootFolder(course)
+                root.clear()
+        with timer.phase('ExportHash'):
+            _check_export_hash(course, session, validate_export_hash)
         importer = component.getUtility(ICourseImporter)
-        result = importer.process(course, filer, writeout)
+        filer = session.filer
+        with timer.phase('Process'):
+            result = importer.process(course, filer, writeout)
         if lockout:
-            _lockout(course)
+            with timer.phase('Lockout'):
+                stats = _lockout(course)
+            timer.count('LockCandidates', stats['Total'])
+            timer.count('Locked', stats['Locked'])
         return result
-    finally:
-        delete_directory(tmp_path)
 
 
 def import_course(ntiid, archive_path, writeout=True, lockout=False,
-                  clear=False, validate_export_hash=True):
+                  clear=False, validate_export_hash=True, deltas=()):
     """
     Import a course from a file archive
 
     :param ntiid Course NTIID
-    :param archive_path archive path
+    :param archive_path archive path, source filer or :class:`ImportSession`
     :param validate_export_hash whether to validate the export_hash against other imported courses
+    :param deltas paths of delta archives to apply on top of the base archive
     """
     course = find_object_with_ntiid(ntiid) if ntiid else None
-    _execute(course, archive_path, writeout, lockout, clear, validate_export_hash)
+    _execute(course, archive_path, writeout, lockout, clear,
+             validate_export_hash, deltas)
     return course
 
 
 def create_sections(course, archive_path, writeout=True, creator=None):
     """
-    Creates section courses from a file archive
-
-    :param archive_path archive path
+    Creates section courses from a file archive, in a single pass over its
+    sections; sections that already exist are left as they are. The
+    modified events sent while the sections are created are held back; a
+    single modified event is then sent for each new section, its entry and
+    any other object modified meanwhile.
+
+    :param archive_path archive path, source filer or :class:`ImportSession`
+    :returns: The list of created sections
     """
-    tmp_path = None
-    try:
-        tmp_path = check_archive(archive_path)
-        path = tmp_path or archive_path
-        archive_sec_path = os.path.expanduser(path)
-        archive_sec_path = os.path.join(archive_sec_path, SECTIONS)
+    result = []
+    with _import_session(archive_path) as session:
+        filer = session.filer
         # Import sections, if necessary.
-        if os.path.isdir(archive_sec_path):
-            for name in os.listdir(archive_sec_path):
-                ipath = os.path.join(archive_sec_path, name)
-                if not os.path.isdir(ipath):
-                    continue
-                logger.info('Creating subinstance (%s)', name)
-                create_course_subinstance(course, name, writeout, creator=creator)
-    finally:
-        delete_directory(tmp_path)
+        if filer.is_bucket(SECTIONS):
+            existing = set(course.SubInstances.keys())
+            names = [filer.key_name(x) for x in filer.list(SECTIONS)
+                     if filer.is_bucket(x)]
+            names = [x for x in names if x not in existing]
+            with session.timer.phase('CreateSections'):
+                with held_modified_events() as modified:
+                    for name in names:
+                        logger.info('Creating subinstance (%s)', name)
+                        create_course_subinstance(course, name, writeout, creator=creator)
+                        section = course.SubInstances[name]
+                        result.append(section)
+                        for obj in (section, ICourseCatalogEntry(section, None)):
+                            if obj is not None:
+                                modified.setdefault(id(obj), obj)
+            session.timer.count('Created', len(result))
+            session.timer.count('Notified', len(modified))
+            if result:
+                logger.info('%s/%s section(s) created', len(result),
+                            len(result) + len(existing))
+    return result
+
+
+def get_section_previews(course):
+    """
+    Return a map of the section names of the given course to the
+    ``PreviewRawValue`` of their catalog entries.
+    """
+    result = {}
+    for name, section in course.SubInstances.items():
+        entry = ICourseCatalogEntry(section)
+        result[name] = getattr(entry, 'PreviewRawValue', None)
+    return result
+
+
+def _set_preview(entry, raw_value):
+    if raw_value is not None:
+        entry.Preview = raw_value
+    else:
+        delattr(entry, 'Preview')
+
+
+def restore_section_previews(course, previews, preview_raw_value=None):
+    """
+    Set the preview state of every section of the given course in place,
+    after an import: sections in ``previews`` (see :func:`get_section_previews`)
+    get their previous state back while new sections take the given (e.g.
+    the parent course) state. A single modified event is sent for each
+    section, and its entry, whose preview state changed.
+
+    :returns: The number of objects notified
+    """
+    changed = []
+    for name, section in course.SubInstances.items():
+        entry = ICourseCatalogEntry(section)
+        if name in previews:
+            raw_value = previews[name]
+            if getattr(entry, 'PreviewRawValue', None) == raw_value:
+                continue
+        else:
+            raw_value = preview_raw_value
+        _set_preview(entry, raw_value)
+        changed.append((section, entry))
+    for section, entry in changed:
+        notify(ObjectModifiedFromExternalEvent(section))
+        notify(ObjectModifiedFromExternalEvent(entry))
+    return 2 * len(changed)
 
 
 def create_course(admin, key, archive_path, catalog=None, writeout=True,
-                  lockout=False, clear=False, creator=None, validate_export_hash=True):
+                  lockout=False, clear=False, creator=None, validate_export_hash=True,
+                  deltas=()):
     """
     Creates a course from a file archive
 
     :param admin Administrative level key
     :param key Course name
-    :param archive_path archive path
+    :param archive_path archive path, source filer or :class:`ImportSession`
+    :param deltas paths of delta archives to apply on top of the base archive
     """
-    tmp_path = None
-    try:
-        tmp_path = check_archive(archive_path)
-
+    with _import_session(archive_path, deltas) as session:
         # Create course using factory specified by meta-info
-        path = tmp_path or archive_path
-        meta_path = os.path.expanduser(path)
-        meta_path = os.path.join(meta_path, COURSE_META_NAME)
-        filer = DirectoryFiler(path)
         course_factory = None
-        meta_source = filer.get(meta_path)
-        if meta_source:
-            meta = json.load(meta_source)
-            course_factory = find_factory_for(meta)
-        course = course_creator(admin, key, catalog, writeout,
-                                creator=creator, factory=course_factory)
-
-        create_sections(course, path, writeout, creator)
+        if session.meta:
+            course_factory = find_factory_for(session.meta)
+        with session.timer.phase('CreateCourse'):
+            course = course_creator(admin, key, catalog, writeout,
+                                    creator=creator, factory=course_factory)
+        session.timer.count('Created')
+
+        create_sections(course, session, writeout, creator)
         # process
-        _execute(course, path, writeout, lockout, clear, validate_export_hash)
+        _execute(course, session, writeout, lockout, clear, validate_export_hash)
         return course
-    finally:
-        delete_directory(tmp_path)
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+A persistent index of course export hashes (the hash of the archive a
+course was imported from) to course intids.
+
+The index is installed lazily, in the dataserver folder annotations, the
+first time a course is imported. Until it is rebuilt (see
+:func:`rebuild_export_hash_index`) it may not hold courses imported
+before it was installed, so lookups fall back to the courses catalog.
+Once installed, it is kept in sync with the import metadata of courses
+as they are created or modified (see :func:`sync_export_hash`), whoever
+set their import hash.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import BTrees
+
+from persistent import Persistent
+
+from zope import component
+from zope import interface
+
+from zope.component.hooks import site as current_site
+
+from zope.container.contained import Contained
+
+from zope.intid.interfaces import IIntIds
+
+from nti.app.products.courseware_admin.interfaces import ICourseExportHashIndex
+
+from nti.app.products.courseware_admin.utils import get_dataserver_annotations
+
+from nti.contenttypes.courses.interfaces import ICourseCatalog
+from nti.contenttypes.courses.interfaces import ICourseInstance
+from nti.contenttypes.courses.interfaces import ICourseImportMetadata
+
+from nti.contenttypes.courses.utils import get_course_subinstances
+from nti.contenttypes.courses.utils import get_courses_for_export_hash as catalog_courses_for_export_hash
+
+from nti.site.hostpolicy import get_all_host_sites
+
+EXPORT_HASH_INDEX_KEY = 'nti.app.products.courseware_admin.index.ExportHashIndex'
+
+logger = __import__('logging').getLogger(__name__)
+
+
+@interface.implementer(ICourseExportHashIndex)
+class ExportHashIndex(Persistent, Contained):
+
+    family = BTrees.family64
+
+    built = False
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._hashes = self.family.OO.BTree()
+        self._docs = self.family.IO.BTree()
+
+    def index(self, doc_id, export_hash):
+        self.unindex(doc_id)
+        if not export_hash:
+            return
+        docs = self._hashes.get(export_hash)
+        if docs is None:
+            docs = self._hashes[export_hash] = self.family.II.TreeSet()
+        docs.add(doc_id)
+        self._docs[doc_id] = export_hash
+
+    def unindex(self, doc_id):
+        export_hash = self._docs.pop(doc_id, None)
+        if export_hash is None:
+            return
+        docs = self._hashes.get(export_hash)
+        if docs is not None:
+            docs.discard(doc_id)
+            if not docs:
+                del self._hashes[export_hash]
+
+    def get(self, export_hash):
+        docs = self._hashes.get(export_hash) if export_hash else None
+        return tuple(docs) if docs is not None else ()
+
+    def get_export_hash(self, doc_id):
+        return self._docs.get(doc_id)
+
+    def __len__(self):
+        return len(self._docs)
+
+
+def get_export_hash_index(create=False):
+    """
+    Return the export hash index, installing it if ``create`` is set.
+    """
+    annotations = get_dataserver_annotations()
+    if annotations is None:
+        return None
+    result = annotations.get(EXPORT_HASH_INDEX_KEY)
+    if result is None and create:
+        result = ExportHashIndex()
+        annotations[EXPORT_HASH_INDEX_KEY] = result
+        logger.info("Installed course export hash index")
+    return result
+
+
+def index_export_hash(course, export_hash):
+    intids = component.getUtility(IIntIds)
+    doc_id = intids.queryId(course)
+    index = get_export_hash_index(create=True)
+    if doc_id is not None and index is not None:
+        index.index(doc_id, export_hash)
+
+
+def sync_export_hash(course):
+    """
+    Update the export hash index entry of the given course from its import
+    metadata, if the index is installed and the course has an intid.
+    """
+    index = get_export_hash_index()
+    intids = component.queryUtility(IIntIds)
+    if index is None or intids is None:
+        return
+    doc_id = intids.queryId(course)
+    if doc_id is None:
+        return
+    metadata = ICourseImportMetadata(course, None)
+    export_hash = getattr(metadata, 'import_hash', None) or None
+    if index.get_export_hash(doc_id) != export_hash:
+        index.index(doc_id, export_hash)
+
+
+def unindex_export_hash(course):
+    """
+    Remove the course from the export hash index, along with any entries
+    for its hash whose course is gone.
+    """
+    index = get_export_hash_index()
+    if index is None:
+        return
+    intids = component.getUtility(IIntIds)
+    doc_id = intids.queryId(course)
+    if doc_id is not None:
+        index.unindex(doc_id)
+    metadata = ICourseImportMetadata(course, None)
+    export_hash = getattr(metadata, 'import_hash', None)
+    for doc_id in index.get(export_hash):
+        obj = intids.queryObject(doc_id)
+        if obj is None or obj is course:
+            index.unindex(doc_id)
+
+
+def get_courses_for_export_hash(export_hash):
+    """
+    Return the courses imported from an archive with the given hash.
+    """
+    index = get_export_hash_index()
+    if index is None or not index.built:
+        return catalog_courses_for_export_hash(export_hash)
+    intids = component.getUtility(IIntIds)
+    result = (intids.queryObject(x) for x in index.get(export_hash))
+    return [x for x in result if ICourseInstance.providedBy(x)]
+
+
+def _iter_courses():
+    seen = set()
+    for host_site in get_all_host_sites():
+        with current_site(host_site):
+            catalog = component.queryUtility(ICourseCatalog)
+            if catalog is None or catalog.isEmpty():
+                continue
+            for entry in catalog.iterCatalogEntries():
+                course = ICourseInstance(entry, None)
+                if course is None:
+                    continue
+                courses = [course]
+                courses.extend(get_course_subinstances(course) or ())
+                for obj in courses:
+                    if id(obj) not in seen:
+                        seen.add(id(obj))
+                        yield obj
+
+
+def rebuild_export_hash_index():
+    """
+    Rebuild the export hash index from every course in every site,
+    returning the number of courses indexed.
+    """
+    intids = component.getUtility(IIntIds)
+    index = get_export_hash_index(create=True)
+    index.clear()
+    count = 0
+    for course in _iter_courses():
+        doc_id = intids.queryId(course)
+        metadata = ICourseImportMetadata(course, None)
+        export_hash = getattr(metadata, 'import_hash', None)
+        if doc_id is not None and export_hash:
+            index.index(doc_id, export_hash)
+            count += 1
+    index.built = True
+    return count
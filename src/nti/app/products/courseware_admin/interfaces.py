@@ -60,4 +60,129 @@ class CourseAdminSummary(Contained):
         self.__parent__ = container
         self.user = user
         self.username = user.username
-        
\ No newline at end of file
+
+
+class ICourseExportArtifactCache(interface.Interface):
+    """
+    A bounded, on-disk cache of course export archives.
+    """
+
+    def key(course, backup=False, salt=None, compression=None):
+        """
+        Return the cache key for an export of the given course with the
+        given parameters (including its compression policy). The key
+        changes whenever the course is modified.
+        """
+
+    def get(key):
+        """
+        Return the path of the cached archive for the given key or None.
+        """
+
+    def put(key, path):
+        """
+        Move the archive at the given path into the cache, returning its
+        new path.
+        """
+
+    def evict(keep=None):
+        """
+        Remove expired entries and, oldest first, any entries over the
+        total size bound, never removing the ``keep`` entry directory.
+        """
+
+
+class ICourseExportHashIndex(interface.Interface):
+    """
+    A persistent index of the export hash of the archive each course was
+    imported from to the course intids.
+    """
+
+    built = interface.Attribute("Whether the index holds every course")
+
+    def index(doc_id, export_hash):
+        """
+        Record the given course intid as imported with the given hash.
+        """
+
+    def unindex(doc_id):
+        """
+        Remove the given course intid from the index.
+        """
+
+    def get(export_hash):
+        """
+        Return the tuple of the course intids imported with the given hash.
+        """
+
+    def get_export_hash(doc_id):
+        """
+        Return the hash the given course intid is indexed with, if any.
+        """
+
+    def clear():
+        """
+        Remove all entries.
+        """
+
+
+class ICourseImportStaging(interface.Interface):
+    """
+    A content-addressed, on-disk staging area for uploaded archives.
+    """
+
+    def stage(source, filename):
+        """
+        Write the given upload source to the staging area, returning the
+        path of its staged copy; an identical upload reuses the copy.
+        """
+
+    def extract(path, workers=None, progress=None):
+        """
+        Return the path of the extraction of the given staged archive,
+        extracting it only once.
+        """
+
+    def evict():
+        """
+        Remove the expired staged uploads.
+        """
+
+    def __contains__(path):
+        """
+        Return whether the given path is a staged upload.
+        """
+
+
+class ICourseArchiveUploads(interface.Interface):
+    """
+    Resumable, chunked uploads of course archives.
+    """
+
+    def create(filename, size, creator=None, checksum=None):
+        """
+        Start an upload of ``size`` bytes, with an optional sha256
+        checksum of the whole archive, returning its status.
+        """
+
+    def get(upload_id):
+        """
+        Return the status of the given upload (e.g. its ``Offset``) or None.
+        """
+
+    def write(upload_id, offset, data, checksum=None):
+        """
+        Write a chunk at the given offset, which must be the current upload
+        offset, verifying its optional sha256 checksum. Return the upload
+        status.
+        """
+
+    def path(upload_id):
+        """
+        Return the path of the archive of a completed upload or None.
+        """
+
+    def remove(upload_id):
+        """
+        Remove the given upload.
+        """
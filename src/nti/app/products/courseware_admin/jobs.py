@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Background course administration jobs (e.g. imports and exports).
+
+Job state is kept in redis, when available, so any worker can report on
+a job; otherwise it is kept in process.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import time
+import uuid
+
+import gevent
+
+import simplejson as json
+
+import transaction
+
+from zope import component
+
+from nti.dataserver.interfaces import IRedisClient
+from nti.dataserver.interfaces import IDataserverTransactionRunner
+
+JOB_PENDING = u'Pending'
+JOB_RUNNING = u'Running'
+JOB_SUCCESS = u'Success'
+JOB_FAILED = u'Failed'
+
+#: How long (in seconds) job state is kept around
+JOB_EXPIRATION = 2 * 24 * 60 * 60
+
+JOB_KEY_PREFIX = 'nti/courseware_admin/jobs/'
+
+#: Job state when no redis client is available
+_local_jobs = {}
+
+logger = __import__('logging').getLogger(__name__)
+
+
+class CourseAdminJob(object):
+    """
+    The state of a background course administration job.
+    """
+
+    mimeType = mime_type = 'application/vnd.nextthought.courseware_admin.job'
+
+    _fields = ('jobId', 'kind', 'state', 'phase', 'creator', 'site',
+               'params', 'result', 'error', 'progress',
+               'created', 'started', 'finished')
+
+    def __init__(self, kind, creator=None, site=None, params=None, jobId=None):
+        self.kind = kind
+        self.site = site
+        self.creator = creator
+        self.params = params or {}
+        self.jobId = jobId or uuid.uuid4().hex
+        self.state = JOB_PENDING
+        self.phase = None
+        self.error = None
+        self.result = None
+        self.progress = None
+        self.created = time.time()
+        self.started = self.finished = None
+
+    @property
+    def elapsed(self):
+        if not self.started:
+            return 0
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def done(self):
+        return self.state in (JOB_SUCCESS, JOB_FAILED)
+
+    def update(self, **kwargs):
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+        save_job(self)
+
+    def to_json(self):
+        return dict((x, getattr(self, x)) for x in self._fields)
+
+    @classmethod
+    def from_json(cls, data):
+        result = cls(data['kind'], jobId=data['jobId'])
+        for name in cls._fields:
+            setattr(result, name, data.get(name))
+        return result
+
+    def toExternalObject(self, *unused_args, **unused_kwargs):
+        result = {
+            'MimeType': self.mimeType,
+            'JobId': self.jobId,
+            'Kind': self.kind,
+            'State': self.state,
+            'Phase': self.phase,
+            'Creator': self.creator,
+            'Site': self.site,
+            'Params': self.params,
+            'Error': self.error,
+            'Progress': self.progress,
+            'CreatedTime': self.created,
+            'StartTime': self.started,
+            'EndTime': self.finished,
+            'Elapsed': self.elapsed,
+        }
+        return result
+
+    def __repr__(self):
+        return '<%s %s %s %s>' % (self.__class__.__name__, self.kind,
+                                  self.jobId, self.state)
+
+
+def _redis():
+    return component.queryUtility(IRedisClient)
+
+
+def save_job(job):
+    redis = _redis()
+    if redis is not None:
+        redis.set(JOB_KEY_PREFIX + job.jobId,
+                  json.dumps(job.to_json()),
+                  ex=JOB_EXPIRATION)
+    else:
+        _local_jobs[job.jobId] = job.to_json()
+    return job
+
+
+def get_job(job_id):
+    if not job_id:
+        return None
+    redis = _redis()
+    if redis is not None:
+        data = redis.get(JOB_KEY_PREFIX + job_id)
+        data = json.loads(data) if data else None
+    else:
+        data = _local_jobs.get(job_id)
+    return CourseAdminJob.from_json(data) if data else None
+
+
+def _error_details(exc):
+    try:
+        # e.g. raised JSON errors
+        details = exc.json_body
+    except Exception:  # pylint: disable=broad-except
+        details = None
+    if not isinstance(details, dict):
+        details = {'message': str(exc) or exc.__class__.__name__}
+    details.setdefault('code', exc.__class__.__name__)
+    return details
+
+
+def run_job(job, func, retries=0, side_effect_free=False, transactional=True):
+    """
+    Run ``func(job)`` in its own transaction, in the job site, recording
+    its return value as the job result. If ``transactional`` is not set,
+    ``func`` is called as is, and runs its own transactions (e.g. to
+    commit its work in batches).
+    """
+    job.update(state=JOB_RUNNING, started=time.time())
+    try:
+        if transactional:
+            runner = component.getUtility(IDataserverTransactionRunner)
+            site_names = (job.site,) if job.site else ()
+            result = runner(lambda: func(job),
+                            retries=retries,
+                            site_names=site_names,
+                            side_effect_free=side_effect_free)
+        else:
+            result = func(job)
+    except Exception as e:  # pylint: disable=broad-except
+        logger.exception("Job %s failed", job)
+        job.update(state=JOB_FAILED,
+                   error=_error_details(e),
+                   finished=time.time())
+    else:
+        job.update(state=JOB_SUCCESS,
+                   result=result,
+                   finished=time.time())
+        logger.info("Job %s completed in %.2f(s)", job, job.elapsed)
+    return job
+
+
+def spawn_job(job, func, after_commit=True, **kwargs):
+    """
+    Save the given job and run it in a greenlet. By default the job starts
+    only once the current transaction commits successfully.
+    """
+    save_job(job)
+
+    def _spawn(success=True):
+        if success:
+            gevent.spawn(run_job, job, func, **kwargs)
+        else:
+            job.update(state=JOB_FAILED,
+                       error={'message': u'Job aborted', 'code': 'JobAborted'},
+                       finished=time.time())
+
+    if after_commit:
+        transaction.get().addAfterCommitHook(_spawn)
+    else:
+        _spawn()
+    return job
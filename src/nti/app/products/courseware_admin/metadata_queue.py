@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Coalesced metadata queueing for catalog rebuilds.
+
+Within :func:`coalesced_metadata_queue`, the objects a rebuild queues for
+metadata (re)indexing through :func:`queue_metadata` are buffered by
+intid, without duplicates, and their intids are queued a batch at a time;
+the remaining ones are queued on exit. Queueing can also be turned off
+entirely, e.g. when only the catalogs need repair. Buffers are kept for
+the greenlet (or thread) that opened them.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import threading
+
+from contextlib import contextmanager
+
+import BTrees
+
+from zope import component
+
+from zope.intid.interfaces import IIntIds
+
+from nti.metadata import queue_add as metadata_queue_add
+
+from nti.metadata.interfaces import IMetadataQueue
+
+#: Default number of buffered objects that triggers a flush
+DEFAULT_QUEUE_BATCH_SIZE = 10000
+
+_local = threading.local()
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def queue_metadata_ids(doc_ids):
+    """
+    Queue the given intids for metadata indexing at once, without resolving
+    their objects, returning the number of intids queued.
+    """
+    queue = component.queryUtility(IMetadataQueue)
+    if queue is None:
+        return 0
+    count = 0
+    for doc_id in doc_ids:
+        queue.add(doc_id)
+        count += 1
+    return count
+
+
+class MetadataQueueBuffer(object):
+    """
+    Buffers the intids of the objects to queue for metadata indexing,
+    queueing each at most once per batch. A disabled buffer drops them.
+    """
+
+    family = BTrees.family64
+
+    def __init__(self, batch_size=DEFAULT_QUEUE_BATCH_SIZE, enabled=True):
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.pending = self.family.II.TreeSet()
+        self.count = self.dropped = 0
+
+    @property
+    def size(self):
+        return len(self.pending)
+
+    def add(self, obj, doc_id=None):
+        if not self.enabled:
+            self.dropped += 1
+            return
+        if doc_id is None:
+            doc_id = component.getUtility(IIntIds).queryId(obj)
+        if doc_id is None or doc_id in self.pending:
+            return
+        self.pending.add(doc_id)
+        if self.size >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        queue_metadata_ids(self.pending)
+        self.count += len(self.pending)
+        self.pending = self.family.II.TreeSet()
+
+
+def get_metadata_buffer():
+    """
+    Return the :class:`MetadataQueueBuffer` in use, if any.
+    """
+    return getattr(_local, 'buffer', None)
+
+
+def queue_metadata(obj, doc_id=None):
+    """
+    Queue the given object for metadata indexing, through the buffer in
+    use, if any.
+    """
+    buffer = get_metadata_buffer()
+    if buffer is None:
+        metadata_queue_add(obj)
+    else:
+        buffer.add(obj, doc_id)
+
+
+@contextmanager
+def coalesced_metadata_queue(enabled=True, batch_size=DEFAULT_QUEUE_BATCH_SIZE):
+    """
+    Buffer (or, unless ``enabled``, drop) the objects queued within for
+    metadata indexing, flushing them on a successful exit.
+    """
+    buffer = MetadataQueueBuffer(batch_size, enabled)
+    previous = get_metadata_buffer()
+    _local.buffer = buffer
+    try:
+        yield buffer
+        buffer.flush()
+    finally:
+        _local.buffer = previous
+    logger.info("Queued %s object(s) for metadata indexing (dropped=%s)",
+                buffer.count, buffer.dropped)
@@ -0,0 +1,643 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Rebuilds of the course catalogs (indexes).
+
+A rebuild may be scoped (see :class:`RebuildScope`) to some sites, courses
+or recently modified objects, in which case only the entries of the
+matching documents are reindexed.
+
+A full rebuild of the enrollment catalog does not clear the live indexes
+and reindex every course, enrollment record and course role at once;
+instead it indexes course by course into a shadow copy of the catalog,
+whose indexes are swapped into the live catalog once every course is
+indexed. Until then enrollment queries are answered by the live indexes;
+the courses and enrollment records modified meanwhile are recorded (see
+:func:`record_enrollment_change`) and reindexed into the shadow catalog
+before the swap.
+It may be run in batches (see :func:`run_enrollment_catalog_rebuild`),
+each committed in its own transaction along with a checkpoint of the
+courses indexed so far, from which an interrupted rebuild resumes.
+
+A parallel rebuild (see :func:`parallel_reindex`) reindexes the courses of
+several sites at once, each site in its own transaction.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import time
+
+from collections import OrderedDict
+
+import BTrees
+
+from gevent.pool import Pool
+
+from persistent import Persistent
+
+from zope import component
+
+from zope.component.hooks import site as current_site
+
+from zope.container.contained import Contained
+
+from zope.intid.interfaces import IIntIds
+
+from zc.catalog.index import SetIndex
+from zc.catalog.index import ValueIndex
+
+from nti.app.products.courseware_admin.metadata_queue import queue_metadata
+from nti.app.products.courseware_admin.metadata_queue import get_metadata_buffer
+from nti.app.products.courseware_admin.metadata_queue import coalesced_metadata_queue
+
+from nti.app.products.courseware_admin.utils import get_dataserver_annotations
+
+from nti.contentlibrary.index import get_contentbundle_catalog
+
+from nti.contenttypes.courses.index import get_enrollment_catalog
+from nti.contenttypes.courses.index import create_enrollment_catalog
+
+from nti.contenttypes.courses.interfaces import ICourseCatalog
+from nti.contenttypes.courses.interfaces import ICourseInstance
+from nti.contenttypes.courses.interfaces import ICourseSubInstance
+from nti.contenttypes.courses.interfaces import ICourseCatalogEntry
+from nti.contenttypes.courses.interfaces import ICourseEnrollments
+from nti.contenttypes.courses.interfaces import IContentCourseInstance
+from nti.contenttypes.courses.interfaces import ICourseInstanceEnrollmentRecord
+
+from nti.contenttypes.courses.utils import index_course_roles
+
+from nti.dataserver.interfaces import IDataserverTransactionRunner
+
+from nti.site.hostpolicy import get_all_host_sites
+
+ENROLLMENT_REBUILD_KEY = 'nti.app.products.courseware_admin.rebuild.EnrollmentCatalogRebuild'
+
+#: The attribute of the live enrollment catalog flagging a running rebuild
+ENROLLMENT_REBUILD_FLAG = 'rebuilding'
+
+#: The index classes whose state may be swapped into a live catalog, and
+#: the attributes holding that state
+SWAPPABLE_INDEXES = (
+    (SetIndex, ('values_to_documents', 'documents_to_values',
+                'documentCount', 'wordCount')),
+    (ValueIndex, ('values_to_documents', 'documents_to_values',
+                  'documentCount', 'wordCount')),
+)
+
+#: Default (minimum) number of documents indexed per committed batch
+DEFAULT_BATCH_SIZE = 1000
+
+#: Default number of sites reindexed concurrently by a parallel rebuild
+DEFAULT_WORKERS = 4
+
+#: Default number of retries of a (conflicting) rebuild transaction
+DEFAULT_RETRIES = 3
+
+#: Seconds after which a rebuild whose checkpoint has not been updated is
+#: considered stale, e.g. because its job died
+STALE_REBUILD_TIMEOUT = 30 * 60
+
+logger = __import__('logging').getLogger(__name__)
+
+
+class CatalogRebuild(Persistent, Contained):
+    """
+    The checkpoint of a catalog rebuild: the shadow catalog and the
+    (intids of the) courses indexed into it so far, along with the number
+    of documents indexed, by site, and the (intids of the) documents
+    modified since the rebuild started.
+    """
+
+    family = BTrees.family64
+
+    jobId = None
+
+    #: The documents modified while the rebuild runs, kept apart from the
+    #: checkpoint (to avoid conflicts with it)
+    modified = None
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.catalog.__parent__ = self
+        self.courses = self.family.II.TreeSet()
+        self.modified = self.family.II.TreeSet()
+        self.items = self.family.OO.BTree()
+        self.count = self.total = 0
+        self.started = self.updated = time.time()
+
+    def add(self, site_name, doc_id, count):
+        self.courses.add(doc_id)
+        self.items[site_name] = self.items.get(site_name, 0) + count
+        self.count += count
+        self.updated = time.time()
+
+    def is_stale(self, timeout=STALE_REBUILD_TIMEOUT):
+        return time.time() - self.updated > timeout
+
+    def progress(self):
+        return {
+            'Courses': len(self.courses),
+            'TotalCourses': self.total,
+            'Documents': self.count,
+            'Items': dict(self.items),
+            'StartTime': self.started,
+            'LastModified': self.updated,
+        }
+
+
+def get_enrollment_rebuild():
+    """
+    Return the checkpoint of the running (or interrupted) enrollment
+    catalog rebuild, if any.
+    """
+    annotations = get_dataserver_annotations()
+    return annotations.get(ENROLLMENT_REBUILD_KEY) if annotations is not None else None
+
+
+def is_enrollment_rebuild_running(catalog=None):
+    """
+    Return whether an enrollment catalog rebuild is running (or was
+    interrupted), from a flag on the live enrollment catalog, which is
+    cheaper to check than the rebuild checkpoint.
+    """
+    catalog = get_enrollment_catalog() if catalog is None else catalog
+    return bool(getattr(catalog, ENROLLMENT_REBUILD_FLAG, False))
+
+
+def _set_enrollment_rebuild_flag(value):
+    catalog = get_enrollment_catalog()
+    if catalog is not None and is_enrollment_rebuild_running(catalog) != value:
+        setattr(catalog, ENROLLMENT_REBUILD_FLAG, value)
+
+
+def record_enrollment_change(obj):
+    """
+    Record the given (modified) course or enrollment record in the running
+    enrollment catalog rebuild, if any, to be reindexed into its shadow
+    catalog once every course is indexed.
+    """
+    if not is_enrollment_rebuild_running():
+        return
+    rebuild = get_enrollment_rebuild()
+    if rebuild is None or rebuild.modified is None:
+        return
+    intids = component.queryUtility(IIntIds)
+    doc_id = intids.queryId(obj) if intids is not None else None
+    if doc_id is not None:
+        rebuild.modified.add(doc_id)
+
+
+def remove_enrollment_rebuild():
+    annotations = get_dataserver_annotations()
+    if annotations is not None and ENROLLMENT_REBUILD_KEY in annotations:
+        del annotations[ENROLLMENT_REBUILD_KEY]
+    _set_enrollment_rebuild_flag(False)
+
+
+class RebuildScope(object):
+    """
+    Limits a rebuild to the given host sites (names), courses (catalog
+    entry or course ntiids) and objects modified since the given time. An
+    empty scope matches everything.
+    """
+
+    def __init__(self, sites=(), ntiids=(), since=None):
+        self.sites = set(sites or ())
+        self.ntiids = set(ntiids or ())
+        self.since = since
+
+    def __bool__(self):
+        return bool(self.sites or self.ntiids or self.since is not None)
+    __nonzero__ = __bool__
+
+    def includes_site(self, site_name):
+        return not self.sites or site_name in self.sites
+
+    def includes_course(self, course, entry):
+        return not self.ntiids \
+            or getattr(entry, 'ntiid', None) in self.ntiids \
+            or getattr(course, 'ntiid', None) in self.ntiids
+
+    def includes(self, obj):
+        return self.since is None \
+            or (getattr(obj, 'lastModified', None) or 0) >= self.since
+
+
+def iter_catalog_courses(intids, scope=None):
+    """
+    Yield the site name, intid and course of every course in scope, once,
+    in every host site; each course is yielded within its site.
+    """
+    seen = set()
+    scope = scope or RebuildScope()
+    for host_site in get_all_host_sites():
+        if not scope.includes_site(host_site.__name__):
+            continue
+        with current_site(host_site):
+            library = component.queryUtility(ICourseCatalog)
+            if library is None or library.isEmpty():
+                continue
+            for entry in library.iterCatalogEntries():
+                course = ICourseInstance(entry, None)
+                doc_id = intids.queryId(course) if course is not None else None
+                if     doc_id is None or doc_id in seen \
+                    or not scope.includes_course(course, entry):
+                    continue
+                seen.add(doc_id)
+                yield host_site.__name__, doc_id, course
+
+
+def iter_enrollment_documents(course, doc_id, intids):
+    """
+    Yield the intid and object of the course and of its enrollment
+    records, as indexed in the enrollment catalog.
+    """
+    yield doc_id, course
+    enrollments = ICourseEnrollments(course)
+    # pylint: disable=too-many-function-args
+    for record in enrollments.iter_enrollments():
+        record_id = intids.queryId(record)
+        if record_id is not None and record.Principal is not None:
+            yield record_id, record
+
+
+def iter_courses_documents(course, doc_id, intids):
+    """
+    Yield the intid and object of the course and of its catalog entry, as
+    indexed in the courses catalog.
+    """
+    yield doc_id, course
+    entry = ICourseCatalogEntry(course, None)
+    entry_id = intids.queryId(entry) if entry is not None else None
+    if entry_id is not None:
+        yield entry_id, entry
+
+
+def iter_outline_documents(course, unused_doc_id, intids):
+    """
+    Yield the intid and object of the nodes of the course outline, as
+    indexed in the course outline catalog.
+    """
+    stack = [course.Outline] if course.Outline is not None else []
+    while stack:
+        node = stack.pop()
+        node_id = intids.queryId(node)
+        if node_id is not None:
+            yield node_id, node
+        stack.extend(reversed(list(node.values())))
+
+
+def reindex_documents(catalog, docs, scope=None):
+    """
+    Unindex and reindex the given (intid, object) documents that are in
+    scope, returning their number.
+    """
+    count = 0
+    scope = scope or RebuildScope()
+    for doc_id, obj in docs:
+        if not scope.includes(obj):
+            continue
+        catalog.unindex_doc(doc_id)
+        catalog.index_doc(doc_id, obj)
+        queue_metadata(obj, doc_id)
+        count += 1
+    return count
+
+
+def index_course_enrollments(catalog, course, doc_id, intids):
+    """
+    Index the course, its enrollment records and its roles in the given
+    (enrollment) catalog, returning the number of documents indexed.
+    """
+    count = 0
+    for obj_id, obj in iter_enrollment_documents(course, doc_id, intids):
+        # e.g. site and entry ntiid indexes
+        catalog.index_doc(obj_id, obj)
+        queue_metadata(obj, obj_id)
+        count += 1
+    count += index_course_roles(course, catalog, intids)
+    return count
+
+
+def reindex_course_enrollments(catalog, course, doc_id, intids, scope=None):
+    """
+    Reindex the course, its enrollment records and, unless the course is
+    out of the scope (modification time), its roles in the given
+    (enrollment) catalog, returning the number of documents reindexed.
+    """
+    scope = scope or RebuildScope()
+    docs = iter_enrollment_documents(course, doc_id, intids)
+    count = reindex_documents(catalog, docs, scope)
+    if scope.includes(course):
+        count += index_course_roles(course, catalog, intids)
+    return count
+
+
+def index_course_bundle(catalog, course, intids):
+    """
+    Index the content package bundle of the given (non section, content)
+    course in the given (content bundle) catalog.
+    """
+    if      not ICourseSubInstance.providedBy(course) \
+        and IContentCourseInstance.providedBy(course):
+        bundle = course.ContentPackageBundle
+        doc_id = intids.queryId(bundle)
+        if doc_id is not None:
+            catalog.index_doc(doc_id, bundle)
+
+
+def reindex_course_entry(catalog, course, doc_id, intids, scope=None):
+    """
+    Reindex the course and its catalog entry in the given (courses)
+    catalog, and its bundle in the content bundle catalog, returning the
+    number of courses reindexed.
+    """
+    docs = iter_courses_documents(course, doc_id, intids)
+    if reindex_documents(catalog, docs, scope):
+        index_course_bundle(get_contentbundle_catalog(), course, intids)
+    return 1
+
+
+def reindex_course_outline(catalog, course, doc_id, intids, scope=None):
+    """
+    Reindex the outline nodes of the course in the given (course outline)
+    catalog, returning the number of courses reindexed.
+    """
+    docs = iter_outline_documents(course, doc_id, intids)
+    reindex_documents(catalog, docs, scope)
+    return 1
+
+
+def _index_courses(rebuild, limit=None):
+    """
+    Index the courses not in the checkpoint yet into its shadow catalog,
+    stopping (after a whole course) once at least ``limit`` documents are
+    indexed. Return whether every course is indexed.
+    """
+    count = 0
+    intids = component.getUtility(IIntIds)
+    courses = iter_catalog_courses(intids)
+    try:
+        for site_name, doc_id, course in courses:
+            if doc_id in rebuild.courses:
+                continue
+            if limit and count >= limit:
+                return False
+            indexed = index_course_enrollments(rebuild.catalog, course,
+                                               doc_id, intids)
+            rebuild.add(site_name, doc_id, indexed)
+            count += indexed
+    finally:
+        courses.close()
+    return True
+
+
+def plan_site_courses(intids, scope=None):
+    """
+    Return the intids of the courses in scope, by site name.
+    """
+    result = OrderedDict()
+    for site_name, doc_id, unused_course in iter_catalog_courses(intids, scope):
+        result.setdefault(site_name, []).append(doc_id)
+    return result
+
+
+def parallel_reindex(get_catalog, reindex, scope=None,
+                     workers=DEFAULT_WORKERS, retries=DEFAULT_RETRIES):
+    """
+    Reindex the courses in scope, site by site, on a pool of (at most)
+    ``workers`` greenlets. Each site is reindexed in its own transaction
+    (and connection), run by the dataserver transaction runner, by calling
+    ``reindex(catalog, course, doc_id, intids, scope)`` for each of its
+    courses, with the catalog returned by ``get_catalog()``.
+
+    Return the sum of the counts returned by ``reindex``, by site, and
+    the error of each site that failed.
+    """
+    plan = plan_site_courses(component.getUtility(IIntIds), scope)
+    runner = component.getUtility(IDataserverTransactionRunner)
+    # workers queue metadata as the caller does
+    buffer = get_metadata_buffer()
+    metadata = buffer.enabled if buffer is not None else True
+
+    def _reindex_site(site_name, doc_ids):
+        def _run():
+            count = 0
+            catalog = get_catalog()
+            intids = component.getUtility(IIntIds)
+            with coalesced_metadata_queue(metadata):
+                for doc_id in doc_ids:
+                    course = intids.queryObject(doc_id)
+                    if course is not None:
+                        count += reindex(catalog, course, doc_id, intids, scope)
+            return count
+        try:
+            return site_name, runner(_run,
+                                     retries=retries,
+                                     site_names=(site_name,)), None
+        except Exception as e:  # pylint: disable=broad-except
+            logger.exception("Cannot reindex courses in site %s", site_name)
+            return site_name, 0, str(e) or e.__class__.__name__
+
+    items = dict()
+    errors = dict()
+    pool = Pool(max(workers, 1))
+    for site_name, count, error in pool.imap_unordered(lambda x: _reindex_site(*x),
+                                                       plan.items()):
+        items[site_name] = count
+        if error is not None:
+            errors[site_name] = error
+    return items, errors
+
+
+def _doc_ids(index):
+    index = getattr(index, 'index', index)  # e.g. normalization wrappers
+    ids = getattr(index, 'ids', None)
+    if callable(ids):
+        return ids()
+    docs = getattr(index, 'documents_to_values', None)
+    if docs is not None:
+        return docs.keys()
+    logger.warning("Cannot list the documents of index %s", index)
+    return ()
+
+
+def catalog_doc_ids(catalog):
+    """
+    Return the intids of the documents in any index of the given catalog.
+    """
+    result = BTrees.family64.II.TreeSet()
+    for index in catalog.values():
+        result.update(_doc_ids(index))
+    return result
+
+
+def _is_enrollment_document(obj):
+    return ICourseInstance.providedBy(obj) \
+        or (    ICourseInstanceEnrollmentRecord.providedBy(obj)
+            and obj.Principal is not None)
+
+
+def _catch_up(catalog, shadow, intids, modified=()):
+    """
+    Apply to the shadow catalog the changes made while the rebuild ran:
+    index the courses and enrollment records it misses, reindex those
+    ``modified`` (e.g. already indexed courses whose roles changed, or
+    records whose scope changed) and unindex the documents that are gone.
+    Return the number of changes.
+    """
+    family = BTrees.family64
+    live_ids = catalog_doc_ids(catalog)
+    shadow_ids = catalog_doc_ids(shadow)
+    count = 0
+    for doc_id in family.II.difference(live_ids, shadow_ids):
+        obj = intids.queryObject(doc_id)
+        if _is_enrollment_document(obj):
+            shadow.index_doc(doc_id, obj)
+            count += 1
+    for doc_id in modified or ():
+        obj = intids.queryObject(doc_id)
+        if not _is_enrollment_document(obj):
+            continue
+        shadow.unindex_doc(doc_id)
+        shadow.index_doc(doc_id, obj)
+        count += 1
+        if ICourseInstance.providedBy(obj):
+            count += index_course_roles(obj, shadow, intids)
+    for doc_id in family.II.difference(shadow_ids, live_ids):
+        if intids.queryObject(doc_id) is None:
+            shadow.unindex_doc(doc_id)
+            count += 1
+    return count
+
+
+def _swap_attributes(index):
+    for factory, names in SWAPPABLE_INDEXES:
+        if isinstance(index, factory):
+            return names
+    return None
+
+
+def _swap_indexes(catalog, shadow):
+    """
+    Swap the data of the shadow indexes into the live ones. The live index
+    objects (and their registration in the catalog) are kept, so no
+    container events (and reindexing) are fired. Only indexes of the
+    :data:`SWAPPABLE_INDEXES` classes can be swapped; nothing is swapped
+    unless every index can be.
+    """
+    swaps = []
+    for name, index in list(shadow.items()):
+        live = catalog.get(name)
+        names = _swap_attributes(index)
+        if live is None or type(live) is not type(index) or not names:
+            raise TypeError("Cannot swap enrollment catalog index %s" % name)
+        swaps.append((live, index, names))
+    for live, index, names in swaps:
+        for name in names:
+            setattr(live, name, getattr(index, name))
+
+
+def _finish_rebuild(rebuild, catch_up=True):
+    """
+    Swap the shadow indexes of the rebuild into the live catalog, returning
+    the number of documents indexed, by site.
+    """
+    catalog = get_enrollment_catalog()
+    intids = component.getUtility(IIntIds)
+    changes = _catch_up(catalog, rebuild.catalog, intids, rebuild.modified) \
+              if catch_up else 0
+    _swap_indexes(catalog, rebuild.catalog)
+    result = {
+        'Items': dict(rebuild.items),
+        'Total': rebuild.count,
+        'CatchUp': changes,
+        'Elapsed': time.time() - rebuild.started,
+    }
+    logger.info("Enrollment catalog rebuilt (documents=%s) (catch-up=%s) in %.2f(s)",
+                rebuild.count, changes, result['Elapsed'])
+    return result
+
+
+def rebuild_enrollment_catalog():
+    """
+    Rebuild the enrollment catalog within the current transaction,
+    returning the number of documents indexed, by site.
+    """
+    rebuild = CatalogRebuild(create_enrollment_catalog())
+    _index_courses(rebuild)
+    return _finish_rebuild(rebuild, catch_up=False)
+
+
+def start_enrollment_rebuild(restart=False):
+    """
+    Return the checkpoint of the interrupted enrollment catalog rebuild,
+    unless ``restart`` is set, or install a new one.
+    """
+    rebuild = get_enrollment_rebuild()
+    if rebuild is not None and restart:
+        remove_enrollment_rebuild()
+        rebuild = None
+    if rebuild is None:
+        rebuild = CatalogRebuild(create_enrollment_catalog())
+        rebuild.total = sum(1 for _ in iter_catalog_courses(component.getUtility(IIntIds)))
+        get_dataserver_annotations()[ENROLLMENT_REBUILD_KEY] = rebuild
+        logger.info("Starting enrollment catalog rebuild of %s course(s)",
+                    rebuild.total)
+    else:
+        logger.info("Resuming enrollment catalog rebuild (courses=%s/%s)",
+                    len(rebuild.courses), rebuild.total)
+    # modified documents are recorded from now on
+    _set_enrollment_rebuild_flag(True)
+    return rebuild
+
+
+def run_enrollment_catalog_rebuild(job, batch_size=DEFAULT_BATCH_SIZE,
+                                   restart=False, retries=DEFAULT_RETRIES,
+                                   metadata=True):
+    """
+    Run (or resume) a rebuild of the enrollment catalog for the given job,
+    committing each batch of (at least) ``batch_size`` documents with the
+    rebuild checkpoint in its own transaction, and reporting the checkpoint
+    as the job progress. The objects of each batch are queued for metadata
+    indexing at once, unless ``metadata`` is not set. The job must run
+    outside of a transaction.
+    """
+    runner = component.getUtility(IDataserverTransactionRunner)
+    site_names = (job.site,) if job.site else ()
+
+    def _run(func):
+        return runner(func, retries=retries, site_names=site_names)
+
+    def _start():
+        rebuild = start_enrollment_rebuild(restart)
+        rebuild.jobId = job.jobId
+        rebuild.updated = time.time()
+        return rebuild.progress()
+
+    def _step():
+        rebuild = get_enrollment_rebuild()
+        if rebuild is None or rebuild.jobId != job.jobId:
+            raise ValueError("Enrollment catalog rebuild taken over or removed")
+        with coalesced_metadata_queue(metadata):
+            done = _index_courses(rebuild, batch_size)
+        return done, rebuild.progress()
+
+    def _finish():
+        rebuild = get_enrollment_rebuild()
+        result = _finish_rebuild(rebuild)
+        remove_enrollment_rebuild()
+        return result
+
+    job.update(phase=u'Indexing', progress=_run(_start))
+    done = False
+    while not done:
+        done, progress = _run(_step)
+        job.update(progress=progress)
+    job.update(phase=u'Swapping')
+    return _run(_finish)
@@ -13,17 +13,33 @@ import sys
 import time
 import pprint
 import argparse
+import collections
+import multiprocessing
+
+import simplejson as json
 
 from zope import component
 
-from nti.base._compat import text_
+from nti.app.products.courseware_admin.delta import read_manifest
+from nti.app.products.courseware_admin.delta import export_course_delta
+
+from nti.app.products.courseware_admin.exporter import stage_course
+from nti.app.products.courseware_admin.exporter import export_course
+from nti.app.products.courseware_admin.exporter import export_filename
+
+from nti.app.products.courseware_admin.scripts.utils import sync_from_args
+from nti.app.products.courseware_admin.scripts.utils import add_sync_arguments
+from nti.app.products.courseware_admin.scripts.utils import course_package_ntiids
 
-from nti.contentlibrary.interfaces import IContentPackageLibrary
+from nti.app.products.courseware_admin.zipstream import get_zip_writer
+from nti.app.products.courseware_admin.zipstream import write_zip_directory
+
+from nti.base._compat import text_
 
 from nti.contenttypes.courses.interfaces import ICourseCatalog
-from nti.contenttypes.courses.interfaces import ICourseExporter
 from nti.contenttypes.courses.interfaces import ICourseInstance
 from nti.contenttypes.courses.interfaces import ICourseExportFiler
+from nti.contenttypes.courses.interfaces import ICourseCatalogEntry
 
 from nti.dataserver.utils import run_with_dataserver
 
@@ -32,15 +48,10 @@ from nti.dataserver.utils.base_script import create_context
 
 from nti.ntiids.ntiids import find_object_with_ntiid
 
-logger = __import__('logging').getLogger(__name__)
-
+#: Name of the batch export summary manifest
+SUMMARY_NAME = 'export_summary.json'
 
-def _sync_library():
-    try:
-        library = component.queryUtility(IContentPackageLibrary)
-        library.syncContentPackages()
-    except AttributeError:
-        pass
+logger = __import__('logging').getLogger(__name__)
 
 
 def _list(site):
@@ -52,52 +63,176 @@ def _list(site):
     pprint.pprint(sorted(result))
 
 
-def _export(ntiid, site, backup, salt=None, path=None):
-    _sync_library()
-    set_site(site)
-    course = find_object_with_ntiid(ntiid)
-    course = ICourseInstance(course, None)
-    if course is None:
-        raise ValueError("Invalid course")
+def _compression(value):
+    get_zip_writer(value)  # validate
+    return value
 
+
+def _output_path(path):
     path = path or os.getcwd()
     path = os.path.expanduser(path)
     if not os.path.exists(path):
         os.makedirs(path)
     elif not os.path.isdir(path):
         raise ValueError("Invalid output path")
+    return path
+
 
-    # prepare source filer
-    # pylint: disable=too-many-function-args
-    filer = ICourseExportFiler(course)
-    filer.prepare()
+def _export(ntiid, site, backup, salt=None, path=None, manifest=False,
+            delta_from=None, sync=None, compression=None):
+    sync_from_args(sync)
+    set_site(site)
+    course = find_object_with_ntiid(ntiid)
+    course = ICourseInstance(course, None)
+    if course is None:
+        raise ValueError("Invalid course")
+    sync_from_args(sync, course_package_ntiids(course))
+
+    path = _output_path(path)
+    if manifest or delta_from:
+        base = None
+        if delta_from:
+            base = read_manifest(os.path.expanduser(delta_from))
+            if base is None:
+                raise ValueError("Invalid base export manifest")
+        zip_file, _ = export_course_delta(course, base, backup, salt, path,
+                                          compression)
+        logger.info("Course exported to %s", zip_file)
+        return zip_file
+
+    zip_file = export_course(course, backup, salt, path,
+                             compression=compression)
+    logger.info("Course exported to %s", zip_file)
+    return zip_file
 
-    # export course
-    exporter = component.getUtility(ICourseExporter)
-    exporter.export(course, filer, backup=backup, salt=salt)
 
-    # zip contents
-    # pylint: disable=redundant-keyword-arg
-    zip_file = filer.asZip(path=path)
+def _zip_course(root, zip_file, compression=None):
+    """
+    Zip a staged course export; run in a worker process.
+    """
+    start = time.time()
+    size = write_zip_directory(root, zip_file, get_zip_writer(compression))
+    return size, time.time() - start
 
-    # remove all content
-    filer.reset()
 
-    logger.info("Course exported to %s", zip_file)
-    return zip_file
+def _unique_filename(name, names):
+    result = name
+    base, ext = os.path.splitext(name)
+    count = 1
+    while result in names:
+        result = '%s.%s%s' % (base, count, ext)
+        count += 1
+    names.add(result)
+    return result
 
 
-def _process(args):
+def _collect_zip(pending):
+    record, filer, async_result = pending
+    try:
+        record['Size'], record['ZipTime'] = async_result.get()
+        logger.info("Course %s exported to %s", record['NTIID'], record['File'])
+    except Exception as e:  # pylint: disable=broad-except
+        logger.exception("Cannot zip course %s", record['NTIID'])
+        record['Error'] = str(e)
+    finally:
+        filer.reset()
+
+
+def _batch_export(ntiids, site, backup, salt=None, path=None, pool=None,
+                  workers=None, sync=None, compression=None):
+    """
+    Export the given courses (or every course in the site) in this
+    process. Courses are exported in turn while their staging areas are
+    zipped by the pool of worker processes, bounding the number of staged
+    exports waiting to be zipped.
+    """
+    sync_from_args(sync)
+    set_site(site)
+    path = _output_path(path)
+    if not ntiids:
+        catalog = component.getUtility(ICourseCatalog)
+        ntiids = [x.ntiid for x in catalog.iterCatalogEntries()]
+    if getattr(sync, 'sync_course_packages', False):
+        packages = set()
+        for ntiid in ntiids:
+            course = ICourseInstance(find_object_with_ntiid(ntiid), None)
+            if course is not None:
+                packages.update(course_package_ntiids(course))
+        sync_from_args(sync, sorted(packages))
+
+    start = time.time()
+    names = set()
+    records = []
+    pending = collections.deque()
+    max_pending = 2 * (workers or multiprocessing.cpu_count())
+    for ntiid in ntiids:
+        record = {'NTIID': ntiid}
+        records.append(record)
+        filer = None
+        try:
+            course = ICourseInstance(find_object_with_ntiid(ntiid), None)
+            if course is None:
+                raise ValueError("Invalid course")
+            record['Title'] = ICourseCatalogEntry(course).title
+            # pylint: disable=too-many-function-args
+            filer = ICourseExportFiler(course)
+            export_start = time.time()
+            stage_course(course, filer, backup,
+                         salt or (None if backup else str(time.time())))
+            record['ExportTime'] = time.time() - export_start
+            zip_file = os.path.join(path,
+                                    _unique_filename(export_filename(course), names))
+            record['File'] = zip_file
+            async_result = pool.apply_async(_zip_course,
+                                            (filer.path, zip_file, compression))
+            pending.append((record, filer, async_result))
+        except Exception as e:  # pylint: disable=broad-except
+            logger.exception("Cannot export course %s", ntiid)
+            record['Error'] = str(e)
+            if filer is not None:
+                filer.reset()
+        while len(pending) >= max_pending:
+            _collect_zip(pending.popleft())
+    while pending:
+        _collect_zip(pending.popleft())
+
+    elapsed = time.time() - start
+    failed = [x for x in records if 'Error' in x]
+    summary = {
+        'Site': site,
+        'Backup': bool(backup),
+        'Courses': records,
+        'Total': len(records),
+        'Failed': len(failed),
+        'TotalSize': sum(x.get('Size') or 0 for x in records),
+        'Elapsed': elapsed,
+    }
+    summary_file = os.path.join(path, SUMMARY_NAME)
+    with open(summary_file, 'w') as fp:
+        json.dump(summary, fp, indent='\t')
+    logger.info("%s course(s) exported in %.2f(s) (%s failed). Summary in %s",
+                len(records) - len(failed), elapsed, len(failed), summary_file)
+    return summary
+
+
+def _process(args, pool=None):
     site = args.site
     if args.list:
         return _list(site)
+    elif args.batch:
+        ntiids = [text_(x) for x in args.ntiids or ()]
+        return _batch_export(ntiids, site, args.backup, salt=args.salt,
+                             path=args.path, pool=pool, workers=args.workers,
+                             sync=args, compression=args.compression)
     else:
         salt = args.salt
         backup = args.backup
         ntiid = text_(args.ntiid)
         path = args.path or os.getcwd()
         salt = str(time.time()) if not salt and not backup else salt
-        return _export(ntiid, site, backup, salt=salt, path=path)
+        return _export(ntiid, site, backup, salt=salt, path=path,
+                       manifest=args.manifest, delta_from=args.delta_from,
+                       sync=args, compression=args.compression)
 
 
 def main():
@@ -116,6 +251,21 @@ def main():
     arg_parser.add_argument('-t', '--salt',
                             dest='salt',
                             help="Hash salt.")
+    arg_parser.add_argument('-m', '--manifest',
+                            help="Include an export manifest, i.e. a delta base",
+                            action='store_true',
+                            dest='manifest')
+    arg_parser.add_argument('-d', '--delta-from',
+                            dest='delta_from',
+                            help="Export only the changes since the given "
+                                 "manifest archive (or manifest file)")
+    arg_parser.add_argument('-z', '--compression',
+                            dest='compression',
+                            type=_compression,
+                            help="Compression policy: store, deflate, a deflate "
+                                 "level (0-9) or auto, to store files that are "
+                                 "already compressed")
+    add_sync_arguments(arg_parser)
     site_group = arg_parser.add_mutually_exclusive_group()
     site_group.add_argument('-n', '--ntiid',
                             dest='ntiid',
@@ -123,13 +273,27 @@ def main():
     site_group.add_argument('--list',
                             help="List courses", action='store_true',
                             dest='list')
+    site_group.add_argument('--ntiids',
+                            dest='ntiids',
+                            nargs='+',
+                            help="Batch export the given course NTIIDs")
+    site_group.add_argument('--all',
+                            help="Batch export all courses in the site",
+                            action='store_true',
+                            dest='all')
+    arg_parser.add_argument('--workers',
+                            dest='workers',
+                            help="Number of zipping processes in batch mode.",
+                            type=int,
+                            default=None)
     args = arg_parser.parse_args()
 
     env_dir = os.getenv('DATASERVER_DIR')
     if not env_dir or not os.path.exists(env_dir) and not os.path.isdir(env_dir):
         raise IOError("Invalid dataserver environment root directory")
 
-    if not args.list:
+    args.batch = bool(args.ntiids or args.all)
+    if not args.list and not args.batch:
         if not args.ntiid:
             raise ValueError("No course specified")
 
@@ -139,11 +303,18 @@ def main():
     context = create_context(env_dir, with_library=True)
     conf_packages = ('nti.appserver',)
 
-    run_with_dataserver(environment_dir=env_dir,
-                        xmlconfig_packages=conf_packages,
-                        verbose=args.verbose,
-                        context=context,
-                        function=lambda: _process(args))
+    # fork the zipping processes before the dataserver is opened
+    pool = multiprocessing.Pool(args.workers) if args.batch else None
+    try:
+        run_with_dataserver(environment_dir=env_dir,
+                            xmlconfig_packages=conf_packages,
+                            verbose=args.verbose,
+                            context=context,
+                            function=lambda: _process(args, pool))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
     sys.exit(0)
 
 
@@ -10,51 +10,215 @@ from __future__ import absolute_import
 
 import os
 import sys
+import time
 import argparse
+import functools
+
+import simplejson as json
+
+import transaction
 
 from zope import component
 
+from nti.app.products.courseware_admin.dryrun import dry_run
+
 from nti.app.products.courseware_admin.importer import create_course
 from nti.app.products.courseware_admin.importer import import_course
 
+from nti.app.products.courseware_admin.scripts.utils import sync_from_args
+from nti.app.products.courseware_admin.scripts.utils import add_sync_arguments
+from nti.app.products.courseware_admin.scripts.utils import archive_package_ntiids
+
+from nti.app.products.courseware_admin.session import ImportSession
+
+from nti.app.products.courseware_admin.validation import validate_archive
+
 from nti.base._compat import text_
 
-from nti.contentlibrary.interfaces import IContentPackageLibrary
+from nti.contenttypes.courses.interfaces import ICourseInstance
+from nti.contenttypes.courses.interfaces import ICourseCatalogEntry
+
+from nti.dataserver.interfaces import IDataserverTransactionRunner
 
 from nti.dataserver.utils import run_with_dataserver
 
 from nti.dataserver.utils.base_script import set_site
 from nti.dataserver.utils.base_script import create_context
 
+from nti.ntiids.ntiids import find_object_with_ntiid
+
 logger = __import__('logging').getLogger(__name__)
 
 
-def _sync_library():
-    try:
-        library = component.queryUtility(IContentPackageLibrary)
-        library.syncContentPackages()
-    except AttributeError:
-        pass
+def _print_progress(progress):
+    print('Extracted %s/%s member(s), %s/%s byte(s) (%s%%)' %
+          (progress.members_done, progress.members_total,
+           progress.bytes_done, progress.bytes_total,
+           progress.percent))
+
+
+def _batch_entries(path, admin=None):
+    """
+    Return the archives to import from the given directory (every zip
+    archive or directory in it, keyed by its name) or JSON manifest (a
+    list of objects with a ``path`` and either an ``ntiid`` to import
+    into or an ``admin`` level and ``key`` to create).
+    """
+    result = []
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            archive = os.path.join(path, name)
+            key, ext = os.path.splitext(name)
+            if os.path.isdir(archive) or ext.lower() == '.zip':
+                result.append({'path': archive, 'admin': admin, 'key': key})
+    else:
+        with open(path, 'rb') as fp:
+            entries = json.load(fp)
+        root = os.path.dirname(path)
+        for entry in entries:
+            entry = dict(entry)
+            entry['path'] = os.path.join(root, os.path.expanduser(entry['path']))
+            entry.setdefault('admin', admin)
+            result.append(entry)
+    for entry in result:
+        if not entry.get('ntiid') and not (entry.get('admin') and entry.get('key')):
+            raise ValueError("No course or admin level/key for %s" % entry['path'])
+    return result
+
+
+def _archive_size(path):
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    result = 0
+    for dirpath, _, filenames in os.walk(path):
+        result += sum(os.path.getsize(os.path.join(dirpath, x)) for x in filenames)
+    return result
+
+
+def _import_entry(entry, args):
+    deltas = [text_(x) for x in entry.get('deltas') or ()]
+    with ImportSession(text_(entry['path']),
+                       extract=args.extract,
+                       workers=args.workers,
+                       deltas=deltas) as session:
+        sync_from_args(args, archive_package_ntiids(session))
+        if entry.get('ntiid'):
+            course = import_course(text_(entry['ntiid']),
+                                   session,
+                                   writeout=args.writeout,
+                                   lockout=args.lockout,
+                                   clear=args.clear)
+        else:
+            course = create_course(text_(entry['admin']),
+                                   text_(entry['key']),
+                                   archive_path=session,
+                                   writeout=args.writeout,
+                                   lockout=args.lockout,
+                                   clear=args.clear)
+        return ICourseCatalogEntry(course).ntiid
+
+
+def _batch(args):
+    """
+    Import every archive in its own transaction, retrying conflicts and
+    continuing past failures unless ``fail_fast`` is set.
+    """
+    path = os.path.abspath(os.path.expanduser(args.path or os.getcwd()))
+    entries = _batch_entries(path, args.admin)
+    runner = component.getUtility(IDataserverTransactionRunner)
+    site_names = (args.site,)
+    runner(lambda: sync_from_args(args), site_names=site_names)
+
+    start = time.time()
+    failed = imported = total_size = 0
+    for idx, entry in enumerate(entries):
+        archive = entry['path']
+        entry_start = time.time()
+        try:
+            ntiid = runner(functools.partial(_import_entry, entry, args),
+                           retries=args.retries,
+                           sleep=0.1,
+                           site_names=site_names)
+        except Exception:  # pylint: disable=broad-except
+            failed += 1
+            logger.exception("[%s/%s] Cannot import %s",
+                             idx + 1, len(entries), archive)
+            if args.fail_fast:
+                break
+        else:
+            imported += 1
+            total_size += _archive_size(archive)
+            logger.info("[%s/%s] Imported %s into %s in %.2f(s)",
+                        idx + 1, len(entries), archive, ntiid,
+                        time.time() - entry_start)
+
+    elapsed = max(time.time() - start, 0.001)
+    print('Imported %s/%s archive(s) (%s failed) in %.2f(s)' %
+          (imported, len(entries), failed, elapsed))
+    print('Throughput: %.2f course(s)/min, %.2f MB/s' %
+          (imported * 60 / elapsed, total_size / elapsed / (1024 * 1024)))
+    return failed
+
+
+def _validate(args):
+    """
+    Validate the archive without importing it; nothing is committed.
+    """
+    transaction.doom()
+    set_site(args.site)
+    path = os.path.abspath(os.path.expanduser(args.path or os.getcwd()))
+    course = None
+    if args.ntiid:
+        course = ICourseInstance(find_object_with_ntiid(text_(args.ntiid)), None)
+        if course is None:
+            raise ValueError("Invalid course")
+    report = validate_archive(text_(path), course)
+    print(json.dumps(report, indent='\t', sort_keys=True))
+    return report
 
 
 def _process(args):
-    _sync_library()
+    if getattr(args, 'dry_run', False):
+        return _dry_run(args)
+    sync_from_args(args)
     set_site(args.site)
     path = os.path.expanduser(args.path or os.getcwd())
     path = os.path.abspath(path)
-    if hasattr(args, 'ntiid'):
-        import_course(text_(args.ntiid),
-                      text_(path),
-                      writeout=args.writeout,
-                      lockout=args.lockout,
-                      clear=args.clear)
-    else:
-        create_course(text_(args.admin),
-                      text_(args.key),
-                      archive_path=text_(path),
-                      writeout=args.writeout,
-                      lockout=args.lockout,
-                      clear=args.clear)
+    progress = _print_progress if args.verbose or args.progress else None
+    deltas = [os.path.abspath(os.path.expanduser(text_(x)))
+              for x in args.deltas or ()]
+    with ImportSession(text_(path),
+                       extract=args.extract,
+                       progress=progress,
+                       workers=args.workers,
+                       deltas=deltas) as session:
+        sync_from_args(args, archive_package_ntiids(session))
+        if hasattr(args, 'ntiid'):
+            import_course(text_(args.ntiid),
+                          session,
+                          writeout=args.writeout,
+                          lockout=args.lockout,
+                          clear=args.clear)
+        else:
+            create_course(text_(args.admin),
+                          text_(args.key),
+                          archive_path=session,
+                          writeout=args.writeout,
+                          lockout=args.lockout,
+                          clear=args.clear)
+
+
+def _dry_run(args):
+    """
+    Run the import in a transaction that is never committed, without
+    writing out sources, printing the objects that would change.
+    """
+    args.dry_run = args.writeout = False
+    with dry_run() as counter:
+        _process(args)
+    report = counter.toExternalObject()
+    print(json.dumps(report, indent='\t', sort_keys=True))
+    return report
 
 
 def main():
@@ -83,6 +247,25 @@ def main():
                                dest='clear',
                                help="Clear course resources.",
                                action='store_true')
+    parent_parser.add_argument('-x', '--extract',
+                               dest='extract',
+                               help="Extract the archive to disk before importing.",
+                               action='store_true')
+    parent_parser.add_argument('--workers',
+                               dest='workers',
+                               help="Number of extraction threads.",
+                               type=int,
+                               default=None)
+    parent_parser.add_argument('--progress',
+                               dest='progress',
+                               help="Print extraction progress.",
+                               action='store_true')
+    parent_parser.add_argument('-d', '--delta',
+                               dest='deltas',
+                               help="Delta archive to apply, in order (repeatable).",
+                               action='append')
+
+    add_sync_arguments(parent_parser)
 
     subparsers = arg_parser.add_subparsers(help='sub-command help')
 
@@ -95,6 +278,10 @@ def main():
     parser_create.add_argument('-k', '--key',
                                dest='key',
                                help="Course key", required=True)
+    parser_create.add_argument('--dry-run',
+                               dest='dry_run',
+                               help="Report what would change; nothing is committed.",
+                               action='store_true')
 
     # import
     parser_import = subparsers.add_parser('import', help='Import command',
@@ -102,6 +289,35 @@ def main():
     parser_import.add_argument('-n', '--ntiid',
                                dest='ntiid',
                                help="Course NTIID", required=True)
+    parser_import.add_argument('--dry-run',
+                               dest='dry_run',
+                               help="Report what would change; nothing is committed.",
+                               action='store_true')
+
+    # validate
+    parser_validate = subparsers.add_parser('validate', help='Validate command',
+                                            parents=[parent_parser])
+    parser_validate.set_defaults(validate=True)
+    parser_validate.add_argument('-n', '--ntiid',
+                                 dest='ntiid',
+                                 help="Target course NTIID")
+
+    # batch
+    parser_batch = subparsers.add_parser('batch', help='Batch import command',
+                                         parents=[parent_parser])
+    parser_batch.set_defaults(batch=True)
+    parser_batch.add_argument('-a', '--admin',
+                              dest='admin',
+                              help="Default administrative level")
+    parser_batch.add_argument('-r', '--retries',
+                              dest='retries',
+                              help="Transaction retries per archive.",
+                              type=int,
+                              default=3)
+    parser_batch.add_argument('--fail-fast',
+                              dest='fail_fast',
+                              help="Stop on the first failed archive.",
+                              action='store_true')
 
     parsed = arg_parser.parse_args()
     if not parsed.site:
@@ -113,11 +329,26 @@ def main():
     context = create_context(env_dir, with_library=True)
     conf_packages = ('nti.appserver',)
 
+    batch = getattr(parsed, 'batch', False)
+    if getattr(parsed, 'validate', False):
+        function = _validate
+    elif batch:
+        function = _batch
+    else:
+        function = _process
+    reports = []
+    # in batch mode every archive is imported in its own transaction
     run_with_dataserver(environment_dir=env_dir,
                         xmlconfig_packages=conf_packages,
                         verbose=parsed.verbose,
                         context=context,
-                        function=lambda: _process(parsed))
+                        use_transaction_runner=not batch,
+                        function=lambda: reports.append(function(parsed)))
+    if function is _validate and reports and not reports[0]['Valid']:
+        sys.exit(1)
+    if function is _batch and reports and reports[0]:
+        # some archives failed to import
+        sys.exit(1)
     sys.exit(0)
 
 
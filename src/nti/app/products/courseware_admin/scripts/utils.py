@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Content library synchronization shared by the course scripts.
+
+A full library sync is skipped when a fingerprint of the on-disk library
+(the stat data of every file and directory under its root) matches the one
+recorded after the last full sync made by these scripts.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import os
+import hashlib
+
+import simplejson as json
+
+from zope import component
+
+from nti.contentlibrary.interfaces import IEditableContentPackage
+from nti.contentlibrary.interfaces import IContentPackageLibrary
+
+from nti.contentlibrary.synchronize import SynchronizationParams
+
+from nti.contenttypes.courses.common import get_course_packages
+
+BUNDLE_META_NAME = 'bundle_meta_info.json'
+
+FINGERPRINT_NAME = '.course_scripts_library_fingerprint'
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def _library_root(library):
+    enumeration = getattr(library, 'enumeration', None)
+    root = getattr(enumeration, 'root', None)
+    path = getattr(root, 'absolute_path', None)
+    return path if path and os.path.isdir(path) else None
+
+
+def library_fingerprint(library=None):
+    """
+    Return a fingerprint of the on-disk content library, or None if the
+    library is not on disk.
+    """
+    library = component.queryUtility(IContentPackageLibrary) \
+           if library is None else library
+    root = _library_root(library)
+    if root is None:
+        return None
+    result = hashlib.sha1()
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(dirnames + filenames):
+            path = os.path.join(dirpath, name)
+            try:
+                stat = os.stat(path)
+            except OSError:  # pragma: no cover
+                continue
+            data = u'%s|%r|%s\n' % (os.path.relpath(path, root),
+                                    stat.st_mtime, stat.st_size)
+            result.update(data.encode('utf-8'))
+    return result.hexdigest()
+
+
+def fingerprint_file():
+    root = os.getenv('DATASERVER_DIR') or os.getcwd()
+    return os.path.join(root, FINGERPRINT_NAME)
+
+
+def _read_fingerprint(path):
+    try:
+        with open(path, 'r') as fp:
+            return fp.read().strip() or None
+    except (IOError, OSError):
+        return None
+
+
+def _write_fingerprint(path, fingerprint):
+    try:
+        with open(path, 'w') as fp:
+            fp.write(fingerprint)
+    except (IOError, OSError):  # pragma: no cover
+        logger.warning("Cannot record library fingerprint in %s", path)
+
+
+def course_package_ntiids(course):
+    return [x.ntiid for x in get_course_packages(course)
+            if not IEditableContentPackage.providedBy(x)]
+
+
+def archive_package_ntiids(session):
+    """
+    Return the content package ntiids referenced by the course bundle of
+    the given :class:`ImportSession`.
+    """
+    source = session.filer.get(BUNDLE_META_NAME)
+    bundle = json.load(source) if source is not None else None
+    return list((bundle or {}).get('ContentPackages') or ())
+
+
+def sync_library(packages=None, force=False, path=None):
+    """
+    Sync the content library, returning whether a sync was made.
+
+    :param packages: If not None, sync only the given package ntiids.
+    :param force: Sync even when the library fingerprint is unchanged.
+    :param path: The file where the library fingerprint is recorded.
+    """
+    library = component.queryUtility(IContentPackageLibrary)
+    if library is None:
+        return False
+    if packages is not None:
+        if not packages:
+            return False
+        logger.info("Syncing content packages %s", packages)
+        params = SynchronizationParams(ntiids=tuple(packages))
+        library.syncContentPackages(params)
+        return True
+    path = path or fingerprint_file()
+    fingerprint = library_fingerprint(library)
+    if      not force \
+        and fingerprint is not None \
+        and fingerprint == _read_fingerprint(path):
+        logger.info("Content library is unchanged, skipping sync")
+        return False
+    library.syncContentPackages()
+    if fingerprint is not None:
+        _write_fingerprint(path, fingerprint)
+    return True
+
+
+def sync_from_args(args, packages=None):
+    """
+    Sync the library as requested by the :func:`add_sync_arguments` args.
+
+    Scripts call this once before looking up any course, for a full sync,
+    and again with the ``packages`` of their courses, which are synced
+    only with ``--sync-only-packages-for-course``.
+    """
+    if getattr(args, 'no_sync', False):
+        return False
+    if getattr(args, 'sync_course_packages', False):
+        return sync_library(packages) if packages is not None else False
+    if packages is not None:
+        return False
+    return sync_library(force=getattr(args, 'force_sync', False))
+
+
+def add_sync_arguments(parser):
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--no-sync',
+                       dest='no_sync',
+                       help="Do not sync the content library.",
+                       action='store_true')
+    group.add_argument('--force-sync',
+                       dest='force_sync',
+                       help="Sync the content library even if unchanged.",
+                       action='store_true')
+    group.add_argument('--sync-only-packages-for-course',
+                       dest='sync_course_packages',
+                       help="Sync only the packages of the course(s).",
+                       action='store_true')
+    return parser
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import os
+
+import six
+
+import simplejson as json
+
+from zope.cachedescriptors.property import Lazy
+
+from nti.app.products.courseware.utils import EXPORT_HASH_KEY
+from nti.app.products.courseware.utils import COURSE_META_NAME
+
+from nti.app.products.courseware_admin.delta import chain_archives
+
+from nti.app.products.courseware_admin.extraction import extract_archive
+
+from nti.app.products.courseware_admin.filer import close_filer
+from nti.app.products.courseware_admin.filer import get_archive_filer
+
+from nti.app.products.courseware_admin.timing import PhaseTimer
+
+from nti.cabinet.filer import read_source
+from nti.cabinet.filer import DirectoryFiler
+
+from nti.contenttypes.courses import COURSE_EXPORT_HASH_FILE
+
+from nti.contenttypes.courses.creator import delete_directory
+
+logger = __import__('logging').getLogger(__name__)
+
+
+class ImportSession(object):
+    """
+    A course archive opened once and shared by every importer entry point
+    taking part in a single import (e.g. :func:`create_course`,
+    :func:`create_sections` and :func:`import_course`).
+
+    The session owns the archive filer and caches the parsed archive
+    metadata; callers are responsible for closing it. By default zip
+    archives are read in place; with ``extract`` they are extracted to disk
+    once (see :func:`extract_archive`), reporting to ``progress``.
+
+    A chain of ``deltas`` archives (see :mod:`.delta`) may be applied on
+    top of a base archive, in which case the session filer is a
+    :class:`ChainedFiler` over them.
+
+    The importer steps record their timings and counts in the session
+    :class:`PhaseTimer`.
+    """
+
+    #: The :class:`ExtractionProgress` if the archive was extracted
+    extraction = None
+
+    def __init__(self, archive, extract=False, progress=None, workers=None,
+                 deltas=(), timer=None):
+        self.timer = timer if timer is not None else PhaseTimer('import')
+        self.extract = extract
+        self.deltas = tuple(deltas or ())
+        self.workers = workers
+        self.progress = progress
+        if isinstance(archive, six.string_types):
+            self.path = archive
+            self._filer = None
+        else:
+            self.path = getattr(archive, 'path', None)
+            self._filer = archive
+        self._owns_filer = self._filer is None
+
+    def _open(self):
+        if self.extract and not os.path.isdir(self.path):
+            self.extraction = extract_archive(self.path,
+                                              workers=self.workers,
+                                              progress=self.progress)
+            self._filer = DirectoryFiler(self.extraction.path)
+        else:
+            self._filer = get_archive_filer(self.path)
+        if self.deltas:
+            filers = [self._filer]
+            try:
+                filers.extend(get_archive_filer(x) for x in self.deltas)
+                self._filer = chain_archives(filers)
+            except Exception:
+                for filer in filers:
+                    close_filer(filer)
+                self._filer = None
+                raise
+
+    @property
+    def filer(self):
+        if self._filer is None:
+            with self.timer.phase('OpenArchive'):
+                self._open()
+        return self._filer
+
+    @Lazy
+    def meta(self):
+        """
+        The parsed course meta-info of the archive, or None.
+        """
+        source = self.filer.get(COURSE_META_NAME)
+        return json.load(source) if source else None
+
+    @Lazy
+    def export_hash(self):
+        result = (self.meta or {}).get(EXPORT_HASH_KEY)
+        if not result:
+            # Backwards compatibility
+            source = self.filer.get(COURSE_EXPORT_HASH_FILE)
+            result = read_source(source) if source else None
+        return result or None
+
+    def close(self):
+        if self._owns_filer and self._filer is not None:
+            close_filer(self._filer)
+            self._filer = None
+        if self.extraction is not None:
+            delete_directory(self.extraction.root)
+            self.extraction = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *unused_args):
+        self.close()
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.path)
+
+
+def get_import_session(archive, deltas=()):
+    """
+    Return a tuple of an :class:`ImportSession` for the given archive path,
+    filer or session (and chain of delta archives) and whether it was
+    created (and must be closed) by the caller.
+    """
+    if isinstance(archive, ImportSession):
+        if deltas and tuple(deltas) != archive.deltas:
+            raise ValueError("Cannot apply deltas to an open import session")
+        return archive, False
+    return ImportSession(archive, deltas=deltas), True
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+A content-addressed, on-disk staging area for uploaded import archives.
+
+Uploads are hashed while they are written to disk and kept under
+``root/<sha256>/<filename>``, so a repeated upload (e.g. an import retried
+after a timeout) reuses the staged archive, and its extraction, rather
+than writing it again.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+
+from zope import interface
+
+from nti.app.products.courseware_admin.extraction import extract_archive
+
+from nti.app.products.courseware_admin.interfaces import ICourseImportStaging
+
+#: Default maximum age (in seconds) of a staged upload
+DEFAULT_MAX_AGE = 24 * 60 * 60
+
+#: Read size when staging uploads
+BUFFER_SIZE = 1024 * 1024
+
+EXTRACTED_NAME = '.extracted'
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def _iter_chunks(source, buffer_size=BUFFER_SIZE):
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    if hasattr(source, 'read'):
+        while True:
+            data = source.read(buffer_size)
+            if not data:
+                break
+            yield data
+    else:
+        yield source.data
+
+
+@interface.implementer(ICourseImportStaging)
+class ImportStaging(object):
+    """
+    Stage uploads under ``root``, which (and the maximum age of entries)
+    may be set with the ``COURSE_IMPORT_STAGING_DIR`` and
+    ``COURSE_IMPORT_STAGING_MAX_AGE`` environment variables.
+    """
+
+    def __init__(self, root=None, max_age=None):
+        self.root = root \
+                 or os.getenv('COURSE_IMPORT_STAGING_DIR') \
+                 or os.path.join(tempfile.gettempdir(), 'nti_course_imports')
+        self.max_age = max_age \
+                    or int(os.getenv('COURSE_IMPORT_STAGING_MAX_AGE') or DEFAULT_MAX_AGE)
+
+    def _makedirs(self, path):
+        try:
+            os.makedirs(path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+
+    def stage(self, source, filename):
+        self._makedirs(self.root)
+        self.evict()
+        digest = hashlib.sha256()
+        fd, tmp_file = tempfile.mkstemp(dir=self.root, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                for data in _iter_chunks(source):
+                    digest.update(data)
+                    fp.write(data)
+            entry_dir = os.path.join(self.root, digest.hexdigest())
+            path = os.path.join(entry_dir, filename)
+            if os.path.exists(path):
+                logger.info("Reusing staged upload %s", path)
+            else:
+                self._makedirs(entry_dir)
+                os.rename(tmp_file, path)
+                tmp_file = None
+                logger.info("Upload staged to %s", path)
+            # age entries from their last use
+            os.utime(entry_dir, None)
+            return path
+        finally:
+            if tmp_file is not None and os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+    def __contains__(self, path):
+        path = os.path.abspath(path)
+        root = os.path.abspath(self.root) + os.sep
+        return path.startswith(root) and os.path.isfile(path)
+
+    def extract(self, path, workers=None, progress=None):
+        entry_dir = os.path.dirname(os.path.abspath(path))
+        target = os.path.join(entry_dir, EXTRACTED_NAME)
+        if not os.path.isdir(target):
+            tmp_dir = tempfile.mkdtemp(dir=entry_dir)
+            extract_archive(path, tmp_dir, workers, progress)
+            try:
+                os.rename(tmp_dir, target)
+            except OSError:
+                # extracted concurrently
+                shutil.rmtree(tmp_dir, True)
+        else:
+            logger.info("Reusing extracted upload %s", target)
+        names = os.listdir(target)
+        if len(names) == 1 and os.path.isdir(os.path.join(target, names[0])):
+            return os.path.join(target, names[0])
+        return target
+
+    def evict(self):
+        now = time.time()
+        names = os.listdir(self.root) if os.path.isdir(self.root) else ()
+        for name in names:
+            entry_dir = os.path.join(self.root, name)
+            try:
+                mtime = os.path.getmtime(entry_dir)
+            except OSError:  # pragma: no cover
+                continue
+            if now - mtime > self.max_age:
+                logger.info("Evicting staged upload %s", entry_dir)
+                if os.path.isdir(entry_dir):
+                    shutil.rmtree(entry_dir, True)
+                else:
+                    os.remove(entry_dir)
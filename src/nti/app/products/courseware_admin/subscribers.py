@@ -15,9 +15,16 @@ from zope import component
 from zope.intid.interfaces import IIntIds
 
 from zope.lifecycleevent.interfaces import IObjectCreatedEvent
+from zope.lifecycleevent.interfaces import IObjectRemovedEvent
+from zope.lifecycleevent.interfaces import IObjectModifiedEvent
 
 from nti.app.products.courseware_admin.hostpolicy import get_site_provider
 
+from nti.app.products.courseware_admin.index import sync_export_hash
+from nti.app.products.courseware_admin.index import unindex_export_hash
+
+from nti.app.products.courseware_admin.rebuild import record_enrollment_change
+
 from nti.assessment.interfaces import ALL_ASSIGNMENT_MIME_TYPES
 
 from nti.base._compat import text_
@@ -29,6 +36,7 @@ from nti.contenttypes.courses.interfaces import ICreatedCourse
 from nti.contenttypes.courses.interfaces import ICourseInstance
 from nti.contenttypes.courses.interfaces import ICourseSubInstance
 from nti.contenttypes.courses.interfaces import ICourseCatalogEntry
+from nti.contenttypes.courses.interfaces import ICourseInstanceEnrollmentRecord
 
 from nti.contenttypes.courses.interfaces import NTIID_ENTRY_TYPE
 
@@ -81,3 +89,24 @@ def _enable_default_assignments_as_required(course, unused_event=None):
             # pylint: disable=no-member
             policy = ICompletableItemDefaultRequiredPolicy(context)
             policy.add_mime_types([text_(x) for x in ALL_ASSIGNMENT_MIME_TYPES])
+
+
+@component.adapter(ICourseInstance, IObjectRemovedEvent)
+def _on_course_instance_removed(course, unused_event=None):
+    unindex_export_hash(course)
+
+
+@component.adapter(ICourseInstance, IObjectCreatedEvent)
+def _sync_course_export_hash(course, unused_event=None):
+    sync_export_hash(course)
+
+
+@component.adapter(ICourseInstance, IObjectModifiedEvent)
+def _on_course_instance_modified(course, unused_event=None):
+    sync_export_hash(course)
+    record_enrollment_change(course)
+
+
+@component.adapter(ICourseInstanceEnrollmentRecord, IObjectModifiedEvent)
+def _on_enrollment_record_modified(record, unused_event=None):
+    record_enrollment_change(record)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import has_entries
+from hamcrest import assert_that
+
+import unittest
+
+import transaction
+
+from zope.lifecycleevent import ObjectAddedEvent
+from zope.lifecycleevent import ObjectRemovedEvent
+from zope.lifecycleevent import ObjectModifiedEvent
+
+from nti.app.products.courseware_admin.dryrun import dry_run
+from nti.app.products.courseware_admin.dryrun import get_change_counter
+from nti.app.products.courseware_admin.dryrun import _count_object_event
+
+
+class Lesson(object):
+    __name__ = __parent__ = None
+
+
+class Asset(object):
+    __name__ = __parent__ = None
+
+
+class TestDryRun(unittest.TestCase):
+
+    def tearDown(self):
+        transaction.abort()
+
+    def test_dry_run(self):
+        lesson, asset = Lesson(), Asset()
+        with dry_run() as counter:
+            assert_that(transaction.isDoomed(), is_(True))
+            _count_object_event(lesson, ObjectAddedEvent(lesson))
+            _count_object_event(lesson, ObjectModifiedEvent(lesson))
+            _count_object_event(asset, ObjectModifiedEvent(asset))
+            _count_object_event(asset, ObjectModifiedEvent(asset))
+        assert_that(get_change_counter(), is_(None))
+        # not counted
+        _count_object_event(asset, ObjectRemovedEvent(asset))
+        assert_that(counter.toExternalObject(),
+                    has_entries('Created', {'Lesson': 1},
+                                'Updated', {'Asset': 1},
+                                'Removed', {},
+                                'Totals', has_entries('Created', 1, 'Updated', 1),
+                                'Events', 4))
@@ -8,10 +8,13 @@ from __future__ import absolute_import
 # pylint: disable=protected-access,too-many-public-methods
 
 from hamcrest import is_
+from hamcrest import none
 from hamcrest import is_in
 from hamcrest import is_not
 from hamcrest import not_none
 from hamcrest import has_item
+from hamcrest import has_entry
+from hamcrest import has_entries
 from hamcrest import has_length
 from hamcrest import assert_that
 from hamcrest import greater_than
@@ -25,8 +28,14 @@ import tempfile
 
 from zope import component
 
+from nti.app.products.courseware.resources.interfaces import ICourseRootFolder
+
+from nti.app.products.courseware.resources.model import CourseContentFile
+
 from nti.app.products.courseware.tests import PersistentInstructedCourseApplicationTestLayer
 
+from nti.app.products.courseware_admin.cache import get_course_export_version
+
 from nti.app.products.courseware.utils import EXPORT_HASH_KEY
 from nti.app.products.courseware.utils import COURSE_META_NAME
 
@@ -36,8 +45,11 @@ from nti.app.testing.decorators import WithSharedApplicationMockDS
 
 from nti.cabinet.mixins import get_file_size
 
+from nti.contenttypes.courses.interfaces import ICourseInstance
 from nti.contenttypes.courses.interfaces import ICourseSectionExporter
 
+from nti.dataserver.tests import mock_dataserver
+
 from nti.ntiids.ntiids import find_object_with_ntiid
 
 
@@ -87,6 +99,9 @@ class TestCourseExport(ApplicationLayerTest):
         href = '/dataserver2/CourseAdmin/@@ExportCourse'
         data = {'ntiid': self.entry_ntiid}
         res = self.testapp.post_json(href, data)
+        assert_that(res.headers, has_entries('Server-Timing', not_none(),
+                                             'X-Export-StagedBytes', not_none(),
+                                             'X-Export-CompressionRatio', not_none()))
         tmp_dir = tempfile.mkdtemp()
         try:
             path = tmp_dir + "/exported.zip"
@@ -122,3 +137,64 @@ class TestCourseExport(ApplicationLayerTest):
         finally:
             shutil.rmtree(tmp_dir, True)
             shutil.rmtree(tmp_dir2, True)
+
+        # Export jobs are served from the artifact cache
+        href = '/dataserver2/CourseAdmin/@@ExportCourseJob'
+        data = {'ntiid': self.entry_ntiid,
+                'salt': '000000000'}
+        res = self.testapp.post_json(href, data, status=202)
+        assert_that(res.json_body, has_entry('State', 'Success'))
+        job_id = res.json_body['JobId']
+
+        res = self.testapp.get(href, params={'JobId': job_id})
+        assert_that(res.json_body, has_entries('State', 'Success',
+                                               'Cached', True,
+                                               'Size', greater_than(0),
+                                               'href', not_none()))
+
+        res = self.testapp.get(res.json_body['href'])
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = tmp_dir + "/exported.zip"
+            with open(path, "wb") as fp:
+                for data in res.app_iter:
+                    fp.write(data)
+            assert_that(_get_export_hash(path), is_(hash1))
+        finally:
+            shutil.rmtree(tmp_dir, True)
+
+        self.testapp.get(href, params={'JobId': 'unknown'}, status=404)
+
+    @WithSharedApplicationMockDS(testapp=False, users=False)
+    def test_export_version(self):
+        with mock_dataserver.mock_db_trans(self.ds):
+            course = ICourseInstance(self.catalog_entry())
+            version = get_course_export_version(course)
+            assert_that(get_course_export_version(course, True),
+                        is_not(version))
+            # root folder files are exported
+            syllabus = CourseContentFile()
+            syllabus.filename = syllabus.name = u"version.pdf"
+            syllabus.data = b'pdftext'
+            ICourseRootFolder(course).add(syllabus)
+            assert_that(get_course_export_version(course), is_not(version))
+
+    @WithSharedApplicationMockDS(testapp=True, users=True)
+    def test_stream_export_course(self):
+        href = '/dataserver2/CourseAdmin/@@ExportCourse'
+        data = {'ntiid': self.entry_ntiid, 'stream': True}
+        res = self.testapp.post_json(href, data)
+        assert_that(res.content_type, is_('application/zip'))
+        assert_that(res.headers, has_entry('Server-Timing', not_none()))
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = tmp_dir + "/exported.zip"
+            with open(path, "wb") as fp:
+                for data in res.app_iter:
+                    fp.write(data)
+            assert_that(zipfile.is_zipfile(path), is_(True))
+            export_zip = zipfile.ZipFile(path)
+            assert_that(export_zip.testzip(), is_(none()))
+            assert_that(export_zip.namelist(), has_item(COURSE_META_NAME))
+        finally:
+            shutil.rmtree(tmp_dir, True)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import has_length
+from hamcrest import assert_that
+from hamcrest import has_property
+from hamcrest import greater_than_or_equal_to
+
+import os
+import shutil
+import zipfile
+import tempfile
+import unittest
+
+from nti.app.products.courseware_admin.extraction import extract_archive
+
+
+class TestExtraction(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'archive.zip')
+        with zipfile.ZipFile(self.path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('course/Sections/', b'')
+            for idx in range(10):
+                archive.writestr('course/file_%s.txt' % idx, b'x' * 1000 * idx)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, True)
+
+    def test_extract(self):
+        reports = []
+        state = extract_archive(self.path, workers=3, progress=reports.append)
+        try:
+            assert_that(state, has_property('members_done', 10))
+            assert_that(state, has_property('bytes_done', 45000))
+            assert_that(state, has_property('percent', 100.0))
+            assert_that(reports, has_length(greater_than_or_equal_to(1)))
+            assert_that(os.path.basename(state.path), is_('course'))
+            assert_that(os.path.isdir(os.path.join(state.path, 'Sections')),
+                        is_(True))
+            with open(os.path.join(state.path, 'file_3.txt'), 'rb') as fp:
+                assert_that(fp.read(), is_(b'x' * 3000))
+        finally:
+            shutil.rmtree(state.root, True)
+
+    def test_invalid_member(self):
+        path = os.path.join(self.tmp_dir, 'evil.zip')
+        with zipfile.ZipFile(path, 'w') as archive:
+            archive.writestr('../evil.txt', b'evil')
+        with self.assertRaises(IOError):
+            extract_archive(path)
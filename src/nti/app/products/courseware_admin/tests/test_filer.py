@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import none
+from hamcrest import is_not
+from hamcrest import contains
+from hamcrest import assert_that
+from hamcrest import has_property
+does_not = is_not
+
+import os
+import shutil
+import zipfile
+import tempfile
+import unittest
+
+from nti.app.products.courseware_admin.filer import ArchiveFiler
+from nti.app.products.courseware_admin.filer import ChainedFiler
+from nti.app.products.courseware_admin.filer import get_archive_filer
+
+
+class TestArchiveFiler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'archive.zip')
+        with zipfile.ZipFile(self.path, 'w') as archive:
+            archive.writestr('course/course_meta_info.json', b'{"a": 1}')
+            archive.writestr('course/Sections/001/bundle.json', b'{}')
+            archive.writestr('course/Sections/002/', b'')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, True)
+
+    def test_filer(self):
+        filer = get_archive_filer(self.path)
+        try:
+            assert_that(filer, is_(ArchiveFiler))
+            assert_that(filer.list(),
+                        contains('Sections', 'course_meta_info.json'))
+            assert_that(filer.list('Sections'),
+                        contains('Sections/001', 'Sections/002'))
+            assert_that(filer.is_bucket('Sections/002'), is_(True))
+            assert_that(filer.is_bucket('course_meta_info.json'), is_(False))
+            assert_that(filer.contains('bundle.json', 'Sections/001'), is_(True))
+            assert_that(filer.get('missing.json'), is_(none()))
+
+            source = filer.get('course_meta_info.json')
+            assert_that(source, has_property('name', 'course_meta_info.json'))
+            assert_that(source, has_property('contentType', 'application/json'))
+            assert_that(source.read(), is_(b'{"a": 1}'))
+            assert_that(source.data, is_(b'{"a": 1}'))
+        finally:
+            filer.close()
+        # nothing extracted
+        assert_that(os.listdir(self.tmp_dir), contains('archive.zip'))
+
+    def test_seek(self):
+        with open(self.path, 'rb') as fp:
+            data = fp.read()
+        with zipfile.ZipFile(self.path, 'a') as archive:
+            archive.writestr('course/nested.zip', data)
+        filer = get_archive_filer(self.path)
+        try:
+            source = filer.get('nested.zip')
+            assert_that(source.read(2), is_(b'PK'))
+            source.seek(0, 2)
+            assert_that(source.tell(), is_(source.length))
+            source.seek(-source.length, 1)
+            assert_that(source.read(2), is_(b'PK'))
+            # members can be opened as zip archives themselves
+            nested = zipfile.ZipFile(source)
+            assert_that(nested.read('course/course_meta_info.json'),
+                        is_(b'{"a": 1}'))
+            source.close()
+            assert_that(source.read(2), is_(b'PK'))
+        finally:
+            filer.close()
+        # nothing extracted
+        assert_that(os.listdir(self.tmp_dir), contains('archive.zip'))
+
+    def test_invalid(self):
+        path = os.path.join(self.tmp_dir, 'bad.zip')
+        with open(path, 'wb') as fp:
+            fp.write(b'not a zip')
+        with self.assertRaises(IOError):
+            get_archive_filer(path)
+
+    def test_chained(self):
+        delta = os.path.join(self.tmp_dir, 'delta.zip')
+        with zipfile.ZipFile(delta, 'w') as archive:
+            archive.writestr('course_meta_info.json', b'{"a": 2}')
+            archive.writestr('Sections/003/bundle.json', b'{}')
+        keys = ('course_meta_info.json', 'Sections/003/bundle.json')
+        filer = ChainedFiler([get_archive_filer(self.path),
+                              get_archive_filer(delta)],
+                             keys)
+        try:
+            assert_that(filer.list('Sections'), contains('Sections/003'))
+            assert_that(filer.get('course_meta_info.json').read(),
+                        is_(b'{"a": 2}'))
+            # removed since the base
+            assert_that(filer.get('Sections/001/bundle.json'), is_(none()))
+        finally:
+            filer.close()
+
+        with self.assertRaises(IOError):
+            ChainedFiler([get_archive_filer(delta)], ('missing.json',))
@@ -10,10 +10,13 @@ from __future__ import absolute_import
 from hamcrest import is_
 from hamcrest import none
 from hamcrest import is_in
+from hamcrest import not_none
+from hamcrest import has_entry
 from hamcrest import is_not
 from hamcrest import has_length
 from hamcrest import assert_that
 from hamcrest import has_property
+from hamcrest import contains_string
 from hamcrest import greater_than_or_equal_to
 does_not = is_not
 
@@ -38,8 +41,15 @@ from nti.app.products.courseware.tests import PersistentInstructedCourseApplicat
 
 from nti.app.products.courseware_admin.exporter import export_course
 
+from nti.app.products.courseware_admin.extraction import ExtractionProgress
+
 from nti.app.products.courseware_admin.importer import create_course
 
+from nti.app.products.courseware_admin.validation import validate_archive
+
+from nti.app.products.courseware_admin.views.import_views import IMPORT_STEPS
+from nti.app.products.courseware_admin.views.import_views import ImportProgress
+
 from nti.app.contentfolder.utils import to_external_cf_io_href
 
 from nti.app.testing.application_webtest import ApplicationLayerTest
@@ -118,6 +128,42 @@ class TestCourseImport(ApplicationLayerTest):
         data = {'admin': 'Fall2015', 'key': 'Bleach', 'path': path}
         self.testapp.post_json(href, data, status=200)
 
+    @WithSharedApplicationMockDS(testapp=True, users=True)
+    @fudge.patch('nti.app.products.courseware_admin.views.import_views.spawn_job')
+    def test_async_import(self, mock_spawn):
+        mock_spawn.is_callable().returns(None)
+        path = os.getcwd()
+        href = '/dataserver2/CourseAdmin/@@ImportCourse'
+        data = {'ntiid': self.entry_ntiid, 'path': path, 'async': 'true'}
+        res = self.testapp.post_json(href, data, status=202)
+        assert_that(res.json_body, has_entry('State', 'Pending'))
+        assert_that(res.json_body, has_entry('JobId', not_none()))
+        assert_that(res.location, contains_string('@@ImportCourseJob'))
+
+        href = '/dataserver2/CourseAdmin/@@ImportCourseJob'
+        self.testapp.get(href, params={'JobId': 'unknown'}, status=404)
+
+    def test_import_progress(self):
+        class Job(object):
+            progress = None
+
+            def update(self, **kwargs):
+                self.__dict__.update(kwargs)
+
+        job = Job()
+        progress = ImportProgress(job, IMPORT_STEPS)
+        progress.step(u'Importing')
+        assert_that(job, has_property('phase', 'Importing'))
+        assert_that(job.progress, has_entry('Step', 2))
+        assert_that(job.progress, has_entry('TotalSteps', len(IMPORT_STEPS)))
+        # extraction progress is kept with the step
+        progress.extracted(ExtractionProgress(2, 10))
+        assert_that(job.progress, has_entry('Step', 2))
+        assert_that(job.progress,
+                    has_entry('Extraction', has_entry('TotalBytes', 10)))
+        # no job to report to
+        ImportProgress().step(u'Importing')
+
     def _add_file(self, context):
         course = ICourseInstance(context)
         folder = ICourseRootFolder(course)
@@ -155,6 +201,14 @@ class TestCourseImport(ApplicationLayerTest):
                             has_property('creator', is_(self.default_username)))
                 assert_that(course, validly_provides(ICreatedCourse))
 
+                # Validation reports the duplicate, unless importing over it
+                report = validate_archive(archive)
+                assert_that(report, has_entry('Valid', False))
+                assert_that(report, has_entry('Duplicates', has_length(1)))
+                report = validate_archive(archive, course)
+                assert_that(report, has_entry('Valid', True))
+                assert_that(report, has_entry('Errors', has_length(0)))
+
                 # Cannot create a new course with same import
                 with assert_raises(DuplicateImportFromExportException):
                     course = create_course(u"Anime", u"Bleach_key", archive,
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import has_length
+from hamcrest import assert_that
+from hamcrest import has_entries
+from hamcrest import same_instance
+
+import unittest
+
+import fudge
+
+from zope import component
+from zope import interface
+from zope import lifecycleevent
+
+from zope.lifecycleevent.interfaces import IObjectModifiedEvent
+
+from nti.app.products.courseware_admin.importer import create_sections
+from nti.app.products.courseware_admin.importer import lockout_course
+from nti.app.products.courseware_admin.importer import get_section_previews
+from nti.app.products.courseware_admin.importer import restore_section_previews
+
+from nti.app.products.courseware_admin.session import ImportSession
+
+from nti.contenttypes.courses.interfaces import ICourseCatalogEntry
+
+from nti.recorder.interfaces import IRecordable
+
+
+@interface.implementer(IRecordable)
+class Lesson(object):
+
+    def __init__(self, locked=False):
+        self.locked = locked
+
+    def isLocked(self):
+        return self.locked
+
+    def lock(self):
+        self.locked = True
+
+
+class TestLockout(unittest.TestCase):
+
+    def setUp(self):
+        self.events = []
+        self.lessons = [Lesson(), Lesson(True), Lesson()]
+        component.getGlobalSiteManager().registerHandler(self._modified,
+                                                         (IObjectModifiedEvent,))
+
+    def tearDown(self):
+        component.getGlobalSiteManager().unregisterHandler(self._modified,
+                                                           (IObjectModifiedEvent,))
+
+    def _modified(self, event):
+        # objects are locked before any event is sent
+        assert_that([x.isLocked() for x in self.lessons], is_([True] * 3))
+        self.events.append(event.object)
+
+    @fudge.patch('nti.app.products.courseware_admin.importer._iter_lockout_objects')
+    def test_lockout(self, mock_iter):
+        lessons = self.lessons + [self.lessons[0], None]
+        mock_iter.is_callable().returns(lessons)
+        result = lockout_course(object())
+        assert_that(result, has_entries('Total', 3,
+                                        'Locked', 2))
+        assert_that([x.isLocked() for x in self.lessons], is_([True] * 3))
+        # a single event for each object whose lock state changed
+        assert_that(self.events, is_([self.lessons[0], self.lessons[2]]))
+
+
+@interface.implementer(ICourseCatalogEntry)
+class Section(object):
+    """
+    A section that is its own catalog entry.
+    """
+
+    def __init__(self, preview=None):
+        if preview is not None:
+            self.PreviewRawValue = preview
+
+    def _get_preview(self):
+        return getattr(self, 'PreviewRawValue', None)
+
+    def _set_preview(self, value):
+        self.PreviewRawValue = value
+
+    def _del_preview(self):
+        self.__dict__.pop('PreviewRawValue', None)
+
+    Preview = property(_get_preview, _set_preview, _del_preview)
+
+
+class Course(object):
+
+    def __init__(self, **sections):
+        self.SubInstances = dict(sections)
+
+
+class Filer(object):
+
+    path = None
+
+    def __init__(self, names):
+        self.names = names
+
+    def is_bucket(self, unused_name):
+        return True
+
+    def list(self, bucket):
+        return ['%s/%s' % (bucket, x) for x in self.names]
+
+    def key_name(self, key):
+        return key.split('/')[-1]
+
+
+class TestSections(unittest.TestCase):
+
+    def setUp(self):
+        self.events = []
+        component.getGlobalSiteManager().registerHandler(self._modified,
+                                                         (IObjectModifiedEvent,))
+
+    def tearDown(self):
+        component.getGlobalSiteManager().unregisterHandler(self._modified,
+                                                           (IObjectModifiedEvent,))
+
+    def _modified(self, event):
+        self.events.append(event.object)
+
+    @fudge.patch('nti.app.products.courseware_admin.importer.create_course_subinstance')
+    def test_create_sections(self, mock_create):
+        def _create(course, name, *unused_args, **unused_kwargs):
+            section = course.SubInstances[name] = Section()
+            lifecycleevent.modified(course)
+            lifecycleevent.modified(section)
+            lifecycleevent.modified(section)
+        mock_create.is_callable().calls(_create)
+        existing = Section(True)
+        course = Course(**{'001': existing})
+        session = ImportSession(Filer(['001', '002', '003']))
+        result = create_sections(course, session)
+        # existing sections are kept
+        assert_that(course.SubInstances['001'], is_(same_instance(existing)))
+        assert_that(result, has_length(2))
+        assert_that(sorted(course.SubInstances), is_(['001', '002', '003']))
+        assert_that(session.timer.counts, has_entries('Created', 2,
+                                                      'Notified', 3))
+        # a single event for each modified object, once every section exists
+        assert_that(self.events, is_([course,
+                                      course.SubInstances['002'],
+                                      course.SubInstances['003']]))
+
+    def test_restore_section_previews(self):
+        course = Course(**{'001': Section(True), '002': Section(False)})
+        previews = get_section_previews(course)
+        assert_that(previews, is_({'001': True, '002': False}))
+        # the import overwrote an existing section state and added sections
+        course.SubInstances['002'].Preview = True
+        course.SubInstances['003'] = Section(True)
+        course.SubInstances['004'] = Section(True)
+        notified = restore_section_previews(course, previews, None)
+        values = dict((k, getattr(v, 'PreviewRawValue', None))
+                      for k, v in course.SubInstances.items())
+        # existing sections keep their state, new ones inherit the course one
+        assert_that(values, is_({'001': True, '002': False,
+                                 '003': None, '004': None}))
+        # section and entry, for each changed section
+        assert_that(notified, is_(6))
+        assert_that(self.events, has_length(6))
+
+        del self.events[:]
+        previews = get_section_previews(course)
+        course.SubInstances['005'] = Section()
+        notified = restore_section_previews(course, previews, False)
+        assert_that(course.SubInstances['005'].PreviewRawValue, is_(False))
+        assert_that(notified, is_(2))
+        assert_that(self.events,
+                    is_([course.SubInstances['005']] * 2))
@@ -9,6 +9,8 @@ from __future__ import absolute_import
 
 from hamcrest import is_
 from hamcrest import is_not
+from hamcrest import none
+from hamcrest import instance_of
 from hamcrest import has_entry
 from hamcrest import assert_that
 from hamcrest import greater_than
@@ -47,3 +49,79 @@ class TestIndexViews(ApplicationLayerTest):
         res = self.testapp.post_json(href, status=200)
         assert_that(res.json_body,
                     has_entry('Total', is_(greater_than(0))))
+
+    @WithSharedApplicationMockDS(testapp=True, users=True)
+    def test_scoped_rebuilds(self):
+        href = '/dataserver2/CourseAdmin/@@RebuildCoursesCatalog'
+        self.testapp.post(href, params={'since': 'yesterday'}, status=422)
+        res = self.testapp.post(href, params={'site': 'platform.ou.edu'},
+                                status=200)
+        assert_that(res.json_body,
+                    has_entry('Total', is_(greater_than(0))))
+        res = self.testapp.post(href, params={'site': 'unknown.site'},
+                                status=200)
+        assert_that(res.json_body, has_entry('Total', 0))
+
+        href = '/dataserver2/CourseAdmin/@@RebuildEnrollmentCatalog'
+        res = self.testapp.post(href, params={'since': '4102444800'},
+                                status=200)
+        assert_that(res.json_body, has_entry('Total', 0))
+
+        href = '/dataserver2/CourseAdmin/@@RebuildCourseOutlineCatalog'
+        res = self.testapp.post(href, params={'ntiid': 'unknown'},
+                                status=200)
+        assert_that(res.json_body, has_entry('Total', 0))
+
+    @WithSharedApplicationMockDS(testapp=True, users=True)
+    def test_parallel_rebuilds(self):
+        href = '/dataserver2/CourseAdmin/@@RebuildCoursesCatalog'
+        self.testapp.post(href, params={'parallel': 'true', 'workers': '0'},
+                          status=422)
+        res = self.testapp.post(href, params={'parallel': 'true', 'workers': '2'},
+                                status=200)
+        assert_that(res.json_body, has_entry('Items', instance_of(dict)))
+        assert_that(res.json_body, has_entry('Total', instance_of(int)))
+
+    @WithSharedApplicationMockDS(testapp=True, users=True)
+    def test_verify_catalogs(self):
+        for name in ('VerifyCoursesCatalog',
+                     'VerifyEnrollmentCatalog',
+                     'VerifyCourseOutlineCatalog'):
+            href = '/dataserver2/CourseAdmin/@@%s' % name
+            self.testapp.post(href, params={'limit': 'x'}, status=422)
+            res = self.testapp.post(href, params={'repair': 'true'},
+                                    status=200)
+            assert_that(res.json_body,
+                        has_entry('Checked', is_(greater_than(0))))
+            # nothing left to repair
+            res = self.testapp.post(href, status=200)
+            assert_that(res.json_body,
+                        has_entry('Missing', has_entry('Total', 0)))
+            assert_that(res.json_body,
+                        has_entry('Stale', has_entry('Total', 0)))
+            assert_that(res.json_body,
+                        has_entry('Orphaned', has_entry('Total', 0)))
+
+    @WithSharedApplicationMockDS(testapp=True, users=True)
+    def test_rebuild_enrollment_catalog_job(self):
+        href = '/dataserver2/CourseAdmin/@@RebuildEnrollmentCatalog'
+        self.testapp.post(href, params={'async': 'true', 'batchSize': 'x'},
+                          status=422)
+        res = self.testapp.post(href, params={'async': 'true', 'batchSize': '10'},
+                                status=202)
+        assert_that(res.json_body, has_entry('JobId', is_not(none())))
+        assert_that(res.json_body, has_entry('href', is_not(none())))
+
+        href = '/dataserver2/CourseAdmin/@@RebuildEnrollmentCatalogJob'
+        self.testapp.get(href, params={'JobId': 'unknown'}, status=404)
+
+    @WithSharedApplicationMockDS(testapp=True, users=True)
+    def test_export_hash_index(self):
+        href = '/dataserver2/CourseAdmin/@@RebuildExportHashIndex'
+        res = self.testapp.post_json(href, status=200)
+        assert_that(res.json_body, has_entry('Total', instance_of(int)))
+
+        href = '/dataserver2/CourseAdmin/@@CoursesForExportHash'
+        self.testapp.get(href, status=422)
+        res = self.testapp.get(href, params={'hash': 'unknown'}, status=200)
+        assert_that(res.json_body, has_entry('Total', 0))
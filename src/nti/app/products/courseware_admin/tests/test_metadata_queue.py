@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import none
+from hamcrest import assert_that
+
+import unittest
+
+from zope import component
+
+from zope.intid.interfaces import IIntIds
+
+from nti.app.products.courseware_admin import metadata_queue
+
+from nti.app.products.courseware_admin.metadata_queue import queue_metadata
+from nti.app.products.courseware_admin.metadata_queue import get_metadata_buffer
+from nti.app.products.courseware_admin.metadata_queue import coalesced_metadata_queue
+
+
+class IntIds(object):
+
+    def __init__(self, objects):
+        self.objects = objects
+
+    def queryId(self, obj):
+        for doc_id, value in self.objects.items():
+            if value is obj:
+                return doc_id
+        return None
+
+    def queryObject(self, unused_doc_id):
+        raise AssertionError("Buffered objects are not resolved again")
+
+
+class TestMetadataQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.queued = []
+        self.batches = []
+        self.objects = dict((x, object()) for x in range(1, 6))
+        self.intids = IntIds(self.objects)
+        component.getGlobalSiteManager().registerUtility(self.intids, IIntIds)
+        self._queue_add = metadata_queue.metadata_queue_add
+        metadata_queue.metadata_queue_add = self.queued.append
+        self._queue_ids = metadata_queue.queue_metadata_ids
+        metadata_queue.queue_metadata_ids = self._add_batch
+
+    def tearDown(self):
+        metadata_queue.metadata_queue_add = self._queue_add
+        metadata_queue.queue_metadata_ids = self._queue_ids
+        component.getGlobalSiteManager().unregisterUtility(self.intids, IIntIds)
+
+    def _add_batch(self, doc_ids):
+        self.batches.append(list(doc_ids))
+        return len(doc_ids)
+
+    def test_coalesced(self):
+        with coalesced_metadata_queue(batch_size=3) as buffer:
+            for doc_id in (1, 2, 1, 2):
+                queue_metadata(self.objects[doc_id], doc_id)
+            assert_that(self.batches, is_([]))
+            # flushed in a single call once the batch is full
+            queue_metadata(self.objects[3])
+            assert_that(self.batches, is_([[1, 2, 3]]))
+            assert_that(buffer.size, is_(0))
+            # each batch is deduplicated on its own
+            queue_metadata(self.objects[4], 4)
+            queue_metadata(self.objects[1], 1)
+            queue_metadata(self.objects[4], 4)
+        assert_that(get_metadata_buffer(), is_(none()))
+        assert_that(buffer.count, is_(5))
+        assert_that(self.batches, is_([[1, 2, 3], [1, 4]]))
+        assert_that(self.queued, is_([]))
+
+    def test_skipped(self):
+        with coalesced_metadata_queue(enabled=False) as buffer:
+            queue_metadata(self.objects[1], 1)
+        assert_that(self.queued, is_([]))
+        assert_that(buffer.dropped, is_(1))
+        # not buffered
+        queue_metadata(self.objects[2], 2)
+        assert_that(self.queued, is_([self.objects[2]]))
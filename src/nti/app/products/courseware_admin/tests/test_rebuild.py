@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import assert_that
+from hamcrest import same_instance
+
+import time
+import unittest
+
+from zope import interface
+
+from zc.catalog.index import ValueIndex
+
+from nti.app.products.courseware_admin.rebuild import _catch_up
+from nti.app.products.courseware_admin.rebuild import _swap_indexes
+from nti.app.products.courseware_admin.rebuild import CatalogRebuild
+from nti.app.products.courseware_admin.rebuild import STALE_REBUILD_TIMEOUT
+
+from nti.contenttypes.courses.interfaces import ICourseInstanceEnrollmentRecord
+
+
+class Catalog(object):
+
+    __parent__ = None
+
+    def __init__(self, docs=None):
+        self.docs = dict(docs or {})
+
+    def values(self):
+        return [self]
+
+    def ids(self):
+        return sorted(self.docs)
+
+    def index_doc(self, doc_id, obj):
+        self.docs[doc_id] = obj.scope
+
+    def unindex_doc(self, doc_id):
+        self.docs.pop(doc_id, None)
+
+
+@interface.implementer(ICourseInstanceEnrollmentRecord)
+class Record(object):
+
+    Principal = u'ichigo'
+
+    def __init__(self, scope):
+        self.scope = scope
+
+
+class IntIds(object):
+
+    def __init__(self, objects):
+        self.objects = objects
+
+    def queryObject(self, doc_id):
+        return self.objects.get(doc_id)
+
+
+class TestCatalogRebuild(unittest.TestCase):
+
+    def test_stale(self):
+        rebuild = CatalogRebuild(Catalog())
+        assert_that(rebuild.is_stale(), is_(False))
+        rebuild.updated = time.time() - STALE_REBUILD_TIMEOUT - 1
+        assert_that(rebuild.is_stale(), is_(True))
+        # a checkpoint is a heartbeat
+        rebuild.add(u'platform.ou.edu', 1, 10)
+        assert_that(rebuild.is_stale(), is_(False))
+        assert_that(rebuild.progress()['Documents'], is_(10))
+
+    def test_catch_up(self):
+        # record 1 changed scope, 2 was added and 3 removed meanwhile
+        records = {1: Record(u'ForCredit'), 2: Record(u'Public'),
+                   4: Record(u'Public')}
+        live = Catalog({1: u'ForCredit', 2: u'Public', 4: u'Public'})
+        shadow = Catalog({1: u'Public', 3: u'Public', 4: u'Public'})
+        changes = _catch_up(live, shadow, IntIds(records), modified=[1])
+        assert_that(changes, is_(3))
+        assert_that(shadow.docs, is_({1: u'ForCredit', 2: u'Public',
+                                      4: u'Public'}))
+
+    def test_swap(self):
+        live = {'scope': ValueIndex()}
+        shadow = {'scope': ValueIndex()}
+        live['scope'].index_doc(1, u'Public')
+        shadow['scope'].index_doc(1, u'ForCredit')
+        shadow['scope'].index_doc(2, u'Public')
+        index = live['scope']
+        _swap_indexes(live, shadow)
+        # the live index is kept
+        assert_that(live['scope'], is_(same_instance(index)))
+        assert_that(dict(index.documents_to_values),
+                    is_({1: u'ForCredit', 2: u'Public'}))
+        # nothing is swapped unless every index can be
+        shadow = {'scope': ValueIndex(), 'other': Catalog()}
+        shadow['scope'].index_doc(3, u'Public')
+        live['other'] = Catalog()
+        with self.assertRaises(TypeError):
+            _swap_indexes(live, shadow)
+        assert_that(sorted(index.documents_to_values), is_([1, 2]))
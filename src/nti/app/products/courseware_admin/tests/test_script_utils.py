@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import none
+from hamcrest import is_not
+from hamcrest import assert_that
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from zope import component
+
+from nti.app.products.courseware_admin.scripts.utils import sync_library
+from nti.app.products.courseware_admin.scripts.utils import library_fingerprint
+
+from nti.contentlibrary.interfaces import IContentPackageLibrary
+
+
+class Library(object):
+
+    def __init__(self, root):
+        self.syncs = 0
+        self.root = type('Root', (object,), {'absolute_path': root})()
+        self.enumeration = self
+
+    def syncContentPackages(self, *unused_args):
+        self.syncs += 1
+
+
+class TestLibrarySync(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.package = os.path.join(self.root, 'package', 'content')
+        os.makedirs(self.package)
+        self._write('index.html', 'index')
+        self.library = Library(self.root)
+        component.getGlobalSiteManager().registerUtility(self.library,
+                                                         IContentPackageLibrary)
+
+    def tearDown(self):
+        component.getGlobalSiteManager().unregisterUtility(self.library,
+                                                           IContentPackageLibrary)
+        shutil.rmtree(self.root, True)
+
+    def _write(self, name, data):
+        with open(os.path.join(self.package, name), 'w') as fp:
+            fp.write(data)
+
+    def test_fingerprint(self):
+        fingerprint = library_fingerprint(self.library)
+        assert_that(library_fingerprint(self.library), is_(fingerprint))
+        # files nested below the package top level count
+        self._write('index.html', 'changed')
+        assert_that(library_fingerprint(self.library), is_not(fingerprint))
+        assert_that(library_fingerprint(Library('/does/not/exist')), is_(none()))
+
+    def test_sync(self):
+        path = os.path.join(tempfile.mkdtemp(), 'fingerprint')
+        try:
+            assert_that(sync_library(path=path), is_(True))
+            # unchanged
+            assert_that(sync_library(path=path), is_(False))
+            assert_that(self.library.syncs, is_(1))
+            assert_that(sync_library(force=True, path=path), is_(True))
+            self._write('page.html', 'page')
+            assert_that(sync_library(path=path), is_(True))
+            assert_that(self.library.syncs, is_(3))
+            # package syncs do not use the fingerprint
+            assert_that(sync_library(packages=(), path=path), is_(False))
+        finally:
+            shutil.rmtree(os.path.dirname(path), True)
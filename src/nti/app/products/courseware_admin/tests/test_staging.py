@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import is_in
+from hamcrest import is_not
+from hamcrest import has_length
+from hamcrest import assert_that
+does_not = is_not
+
+import os
+import time
+import shutil
+import zipfile
+import tempfile
+import unittest
+
+from io import BytesIO
+
+from nti.app.products.courseware_admin.staging import ImportStaging
+
+
+class TestImportStaging(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.staging = ImportStaging(os.path.join(self.tmp_dir, 'staging'),
+                                     max_age=60)
+        data = BytesIO()
+        with zipfile.ZipFile(data, 'w') as archive:
+            archive.writestr('course/course_meta_info.json', b'{}')
+        self.data = data.getvalue()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, True)
+
+    def test_stage(self):
+        path = self.staging.stage(BytesIO(self.data), 'course.zip')
+        assert_that(path, is_in(self.staging))
+        assert_that(os.path.basename(path), is_('course.zip'))
+        # same upload reuses the staged copy
+        assert_that(self.staging.stage(BytesIO(self.data), 'course.zip'),
+                    is_(path))
+        assert_that(os.listdir(self.staging.root), has_length(1))
+
+        extracted = self.staging.extract(path)
+        assert_that(os.path.basename(extracted), is_('course'))
+        assert_that(self.staging.extract(path), is_(extracted))
+
+        # expire
+        entry_dir = os.path.dirname(path)
+        old = time.time() - 120
+        os.utime(entry_dir, (old, old))
+        self.staging.evict()
+        assert_that(os.path.exists(path), is_(False))
+        assert_that(os.path.join(self.tmp_dir, 'other'),
+                    does_not(is_in(self.staging)))
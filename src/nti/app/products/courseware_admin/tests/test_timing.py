@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import has_key
+from hamcrest import has_entry
+from hamcrest import has_entries
+from hamcrest import assert_that
+from hamcrest import greater_than_or_equal_to
+
+import unittest
+
+from nti.app.products.courseware_admin.timing import PhaseTimer
+
+
+class TestPhaseTimer(unittest.TestCase):
+
+    def test_timer(self):
+        timer = PhaseTimer('import')
+        for _ in range(2):
+            with timer.phase('Process'):
+                timer.count('Created')
+        timer.count('Locked', 3)
+        ext = timer.report(course='tag:nextthought.com,2011-10:NTI-CourseInfo-Bleach')
+        assert_that(ext, has_entries('Counts', has_entries('Created', 2, 'Locked', 3),
+                                     'Phases', has_key('Process'),
+                                     'Elapsed', greater_than_or_equal_to(0)))
+        # finished
+        assert_that(timer.toExternalObject(),
+                    has_entry('Elapsed', is_(ext['Elapsed'])))
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import none
+from hamcrest import has_entries
+from hamcrest import assert_that
+from hamcrest import calling
+from hamcrest import raises
+
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+import unittest
+
+from nti.app.products.courseware_admin.uploads import ChunkedUploads
+from nti.app.products.courseware_admin.uploads import UploadOffsetError
+from nti.app.products.courseware_admin.uploads import UploadChecksumError
+
+
+class TestChunkedUploads(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.uploads = ChunkedUploads(os.path.join(self.tmp_dir, 'uploads'),
+                                      max_age=60)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, True)
+
+    def test_upload(self):
+        data = b'0123456789'
+        checksum = hashlib.sha256(data).hexdigest()
+        status = self.uploads.create('course.zip', len(data),
+                                     creator='ichigo', checksum=checksum)
+        upload_id = status['UploadId']
+        assert_that(status, has_entries('Offset', 0, 'Complete', False))
+        assert_that(self.uploads.path(upload_id), is_(none()))
+
+        chunk = data[:4]
+        status = self.uploads.write(upload_id, 0, chunk,
+                                    hashlib.sha256(chunk).hexdigest())
+        assert_that(status, has_entries('Offset', 4, 'Complete', False))
+        # resend or skip
+        assert_that(calling(self.uploads.write).with_args(upload_id, 0, chunk),
+                    raises(UploadOffsetError))
+        assert_that(calling(self.uploads.write).with_args(upload_id, 8, b'89'),
+                    raises(UploadOffsetError))
+        assert_that(calling(self.uploads.write).with_args(upload_id, 4, b'45', 'bad'),
+                    raises(UploadChecksumError))
+
+        status = self.uploads.write(upload_id, 4, data[4:])
+        assert_that(status, has_entries('Offset', 10, 'Complete', True))
+        path = self.uploads.path(upload_id)
+        assert_that(os.path.basename(path), is_('course.zip'))
+        with open(path, 'rb') as fp:
+            assert_that(fp.read(), is_(data))
+
+        # expire
+        old = time.time() - 120
+        os.utime(os.path.join(self.uploads.root, upload_id, 'data'), (old, old))
+        self.uploads.evict()
+        assert_that(self.uploads.get(upload_id), is_(none()))
+
+    def test_archive_checksum(self):
+        status = self.uploads.create('course.zip', 2, checksum='bad')
+        upload_id = status['UploadId']
+        assert_that(calling(self.uploads.write).with_args(upload_id, 0, b'ab'),
+                    raises(UploadChecksumError))
+        # starts over
+        assert_that(self.uploads.get(upload_id), has_entries('Offset', 0))
+        assert_that(self.uploads.get('../etc'), is_(none()))
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import none
+from hamcrest import raises
+from hamcrest import calling
+from hamcrest import contains
+from hamcrest import assert_that
+
+import os
+import shutil
+import zipfile
+import tempfile
+import unittest
+
+from io import BytesIO
+
+from nti.app.products.courseware_admin.zipstream import ZIP_STORED
+
+from nti.app.products.courseware_admin.zipstream import ZipStreamWriter
+from nti.app.products.courseware_admin.zipstream import AutoZipStreamWriter
+
+from nti.app.products.courseware_admin.zipstream import get_zip_writer
+from nti.app.products.courseware_admin.zipstream import iter_zip_directory
+from nti.app.products.courseware_admin.zipstream import write_zip_directory
+
+
+class TestZipStream(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.tmp_dir, 'Sections', '001'))
+        with open(os.path.join(self.tmp_dir, 'course.json'), 'wb') as fp:
+            fp.write(b'{"course": 1}' * 100)
+        with open(os.path.join(self.tmp_dir, 'Sections', '001', 'data.bin'), 'wb') as fp:
+            fp.write(os.urandom(4096))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, True)
+
+    def _archive(self, writer=None):
+        data = b''.join(iter_zip_directory(self.tmp_dir, writer))
+        return zipfile.ZipFile(BytesIO(data))
+
+    def test_directory(self):
+        archive = self._archive()
+        assert_that(archive.namelist(),
+                    contains('course.json', 'Sections/001/data.bin'))
+        assert_that(archive.testzip(), is_(none()))
+        assert_that(archive.read('course.json'), is_(b'{"course": 1}' * 100))
+
+    def test_stored(self):
+        archive = self._archive(ZipStreamWriter(compression=ZIP_STORED))
+        assert_that(archive.testzip(), is_(none()))
+        assert_that([x.compress_type for x in archive.infolist()],
+                    contains(zipfile.ZIP_STORED, zipfile.ZIP_STORED))
+
+    def test_auto(self):
+        writer = get_zip_writer('auto')
+        assert_that(writer, is_(AutoZipStreamWriter))
+        archive = self._archive(writer)
+        assert_that(archive.testzip(), is_(none()))
+        # random data is stored
+        assert_that([x.compress_type for x in archive.infolist()],
+                    contains(zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED))
+
+    def test_policies(self):
+        assert_that(get_zip_writer('store').compression, is_(ZIP_STORED))
+        assert_that(get_zip_writer('1').level, is_(1))
+        assert_that(get_zip_writer('deflate:9').level, is_(9))
+        assert_that(calling(get_zip_writer).with_args('10'),
+                    raises(ValueError))
+
+    def test_unknown_size(self):
+        writer = ZipStreamWriter()
+        chunks = list(writer.iter_stream('data.txt', BytesIO(b'data' * 10)))
+        chunks.extend(writer.iter_close())
+        archive = zipfile.ZipFile(BytesIO(b''.join(chunks)))
+        assert_that(archive.testzip(), is_(none()))
+        assert_that(archive.read('data.txt'), is_(b'data' * 10))
+
+    def test_write_file(self):
+        fd, path = tempfile.mkstemp(suffix='.zip')
+        os.close(fd)
+        try:
+            size = write_zip_directory(self.tmp_dir, path)
+            assert_that(size, is_(os.path.getsize(path)))
+            with zipfile.ZipFile(path) as archive:
+                assert_that(archive.testzip(), is_(none()))
+        finally:
+            os.remove(path)
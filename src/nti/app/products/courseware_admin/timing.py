@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Phase-level timing of the course import and export pipelines.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import time
+
+from collections import OrderedDict
+
+from contextlib import contextmanager
+
+from perfmetrics import statsd_client
+
+#: Prefix of the metrics sent for timed operations
+METRICS_PREFIX = 'nti.courseware_admin'
+
+logger = __import__('logging').getLogger(__name__)
+
+
+class PhaseTimer(object):
+    """
+    Accumulates the wall-clock time spent in the named phases of an
+    operation (e.g. ``import``), along with named counters and values
+    (e.g. sizes). A phase entered more than once accumulates its time;
+    phases may be nested, in which case the time of the inner phase is also
+    part of the outer one.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self.finished = None
+        self.phases = OrderedDict()
+        self.counts = OrderedDict()
+        self.values = OrderedDict()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.time()
+        try:
+            yield self
+        finally:
+            self.add(name, time.time() - start)
+
+    def add(self, name, elapsed):
+        self.phases[name] = self.phases.get(name, 0) + elapsed
+
+    def count(self, name, value=1):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def gauge(self, name, value):
+        self.values[name] = value
+
+    def finish(self):
+        if self.finished is None:
+            self.finished = time.time()
+        return self
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+    def log(self, **kwargs):
+        """
+        Write the timings as a single log line, with the given context
+        (e.g. the course) if any.
+        """
+        items = ['%s=%s' % x for x in sorted(kwargs.items())]
+        items.extend('%s=%.3fs' % x for x in self.phases.items())
+        items.extend('%s=%s' % x for x in self.counts.items())
+        items.extend('%s=%s' % x for x in self.values.items())
+        logger.info("Course %s timings (elapsed=%.3fs) %s",
+                    self.name, self.elapsed, ' '.join(items))
+
+    def send_metrics(self, prefix=METRICS_PREFIX):
+        """
+        Send the phase timings (in ms), counters and values to statsd, if
+        configured.
+        """
+        client = statsd_client()
+        if client is None:
+            return
+        prefix = '%s.%s' % (prefix, self.name)
+        client.timing(prefix, self.elapsed * 1000)
+        for name, elapsed in self.phases.items():
+            client.timing('%s.%s' % (prefix, name), elapsed * 1000)
+        for name, value in self.counts.items():
+            client.incr('%s.%s' % (prefix, name), value)
+        for name, value in self.values.items():
+            client.gauge('%s.%s' % (prefix, name), value)
+
+    def report(self, **kwargs):
+        """
+        Finish, log and send the metrics of the timer, returning its
+        external form.
+        """
+        self.finish()
+        self.log(**kwargs)
+        self.send_metrics()
+        return self.toExternalObject()
+
+    def toExternalObject(self, *unused_args, **unused_kwargs):
+        return {
+            'Phases': dict(self.phases),
+            'Counts': dict(self.counts),
+            'Values': dict(self.values),
+            'Elapsed': self.elapsed,
+        }
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Resumable, chunked uploads of course archives.
+
+An upload is created with the archive name and size; its chunks are then
+written in order, each one with its byte offset and checksum, until the
+archive is complete. An interrupted upload resumes from its current
+offset. Upload state is kept on disk, under ``root/<upload id>/``.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import os
+import time
+import uuid
+import shutil
+import hashlib
+import tempfile
+
+import simplejson as json
+
+from zope import interface
+
+from nti.app.products.courseware_admin.interfaces import ICourseArchiveUploads
+
+#: Default maximum age (in seconds) of an upload since its last chunk
+DEFAULT_MAX_AGE = 24 * 60 * 60
+
+#: Read size when verifying uploads
+BUFFER_SIZE = 1024 * 1024
+
+META_NAME = 'upload.json'
+DATA_NAME = 'data'
+ARCHIVE_NAME = 'archive'
+
+logger = __import__('logging').getLogger(__name__)
+
+
+class UploadError(ValueError):
+    pass
+
+
+class UploadOffsetError(UploadError):
+    """
+    A chunk does not start at the current upload offset.
+    """
+
+    def __init__(self, offset):
+        super(UploadOffsetError, self).__init__("Invalid chunk offset")
+        self.offset = offset
+
+
+class UploadChecksumError(UploadError):
+    """
+    A chunk, or the assembled archive, does not match its checksum.
+    """
+
+
+def _digest(data=None, path=None):
+    result = hashlib.sha256()
+    if path is not None:
+        with open(path, 'rb') as fp:
+            while True:
+                chunk = fp.read(BUFFER_SIZE)
+                if not chunk:
+                    break
+                result.update(chunk)
+    else:
+        result.update(data)
+    return result.hexdigest()
+
+
+@interface.implementer(ICourseArchiveUploads)
+class ChunkedUploads(object):
+    """
+    Keep uploads under ``root``, which (and the maximum age of an upload)
+    may be set with the ``COURSE_IMPORT_UPLOADS_DIR`` and
+    ``COURSE_IMPORT_UPLOADS_MAX_AGE`` environment variables.
+    """
+
+    def __init__(self, root=None, max_age=None):
+        self.root = root \
+                 or os.getenv('COURSE_IMPORT_UPLOADS_DIR') \
+                 or os.path.join(tempfile.gettempdir(), 'nti_course_uploads')
+        self.max_age = max_age \
+                    or int(os.getenv('COURSE_IMPORT_UPLOADS_MAX_AGE') or DEFAULT_MAX_AGE)
+
+    def _upload_dir(self, upload_id):
+        # upload ids are hex uuids
+        if not upload_id or not all(x in '0123456789abcdef' for x in upload_id):
+            return None
+        return os.path.join(self.root, upload_id)
+
+    def _status(self, upload_dir, meta):
+        data = os.path.join(upload_dir, DATA_NAME)
+        result = dict(meta)
+        result['Offset'] = offset = os.path.getsize(data)
+        result['Complete'] = offset == meta['Size']
+        return result
+
+    def create(self, filename, size, creator=None, checksum=None):
+        self.evict()
+        upload_id = uuid.uuid4().hex
+        upload_dir = os.path.join(self.root, upload_id)
+        os.makedirs(upload_dir)
+        meta = {
+            'UploadId': upload_id,
+            'Filename': filename,
+            'Size': int(size),
+            'Checksum': checksum,
+            'Creator': creator,
+            'CreatedTime': time.time(),
+        }
+        with open(os.path.join(upload_dir, META_NAME), 'w') as fp:
+            json.dump(meta, fp)
+        open(os.path.join(upload_dir, DATA_NAME), 'wb').close()
+        return self._status(upload_dir, meta)
+
+    def get(self, upload_id):
+        upload_dir = self._upload_dir(upload_id)
+        meta_file = os.path.join(upload_dir, META_NAME) if upload_dir else None
+        if not meta_file or not os.path.exists(meta_file):
+            return None
+        with open(meta_file, 'r') as fp:
+            meta = json.load(fp)
+        return self._status(upload_dir, meta)
+
+    def write(self, upload_id, offset, data, checksum=None):
+        status = self.get(upload_id)
+        if status is None:
+            raise KeyError(upload_id)
+        if offset != status['Offset']:
+            raise UploadOffsetError(status['Offset'])
+        if offset + len(data) > status['Size']:
+            raise UploadError("Chunk past the end of the upload")
+        if checksum and checksum.lower() != _digest(data):
+            raise UploadChecksumError("Chunk checksum mismatch")
+        upload_dir = self._upload_dir(upload_id)
+        with open(os.path.join(upload_dir, DATA_NAME), 'r+b') as fp:
+            fp.seek(offset)
+            fp.write(data)
+        status = self._status(upload_dir, status)
+        if status['Complete'] and status.get('Checksum'):
+            path = os.path.join(upload_dir, DATA_NAME)
+            if status['Checksum'].lower() != _digest(path=path):
+                # start over
+                open(path, 'wb').close()
+                raise UploadChecksumError("Archive checksum mismatch")
+        return status
+
+    def path(self, upload_id):
+        status = self.get(upload_id)
+        if status is None or not status['Complete']:
+            return None
+        upload_dir = self._upload_dir(upload_id)
+        archive_dir = os.path.join(upload_dir, ARCHIVE_NAME)
+        path = os.path.join(archive_dir, status['Filename'])
+        if not os.path.exists(path):
+            # name the archive once assembled
+            if not os.path.isdir(archive_dir):
+                os.makedirs(archive_dir)
+            os.link(os.path.join(upload_dir, DATA_NAME), path)
+        return path
+
+    def remove(self, upload_id):
+        upload_dir = self._upload_dir(upload_id)
+        if upload_dir and os.path.isdir(upload_dir):
+            shutil.rmtree(upload_dir, True)
+
+    def evict(self):
+        now = time.time()
+        names = os.listdir(self.root) if os.path.isdir(self.root) else ()
+        for name in names:
+            upload_dir = os.path.join(self.root, name)
+            data = os.path.join(upload_dir, DATA_NAME)
+            try:
+                mtime = os.path.getmtime(data if os.path.exists(data) else upload_dir)
+            except OSError:  # pragma: no cover
+                continue
+            if now - mtime > self.max_age:
+                logger.info("Evicting course archive upload %s", name)
+                shutil.rmtree(upload_dir, True)
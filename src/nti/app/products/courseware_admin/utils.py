@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+from zope import component
+
+from zope.annotation.interfaces import IAnnotations
+
+from nti.contenttypes.courses.interfaces import ICourseInstance
+
+from nti.contenttypes.presentation.interfaces import INTILessonOverview
+from nti.contenttypes.presentation.interfaces import IItemAssetContainer
+
+from nti.dataserver.interfaces import IDataserver
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def iter_lesson_assets(lesson):
+    """
+    Iterate the given lesson (or asset) and, depth first, all of its
+    contained assets.
+    """
+    stack = [lesson] if lesson is not None else []
+    while stack:
+        asset = stack.pop()
+        yield asset
+        if IItemAssetContainer.providedBy(asset):
+            stack.extend(reversed(asset.Items or ()))
+
+
+def iter_outline_objects(context):
+    """
+    Iterate (iteratively, depth first) the outline nodes of the given
+    course, each followed by its lesson overview assets.
+    """
+    course = ICourseInstance(context)
+    stack = [course.Outline] if course.Outline is not None else []
+    while stack:
+        node = stack.pop()
+        yield node
+        for asset in iter_lesson_assets(INTILessonOverview(node, None)):
+            yield asset
+        stack.extend(reversed(list(node.values())))
+
+
+def get_dataserver_annotations():
+    """
+    Return the annotations of the dataserver folder, where course admin
+    state (e.g. indexes) is installed, if available.
+    """
+    dataserver = component.queryUtility(IDataserver)
+    folder = getattr(dataserver, 'dataserver_folder', None)
+    return IAnnotations(folder, None)
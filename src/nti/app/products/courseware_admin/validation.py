@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pre-flight validation of course archives.
+
+Archives are read in place through an :class:`ImportSession`; nothing is
+extracted, created or modified.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import time
+
+from nti.app.products.courseware.utils import COURSE_META_NAME
+
+from nti.app.products.courseware_admin.index import get_courses_for_export_hash
+
+from nti.app.products.courseware_admin.session import get_import_session
+
+from nti.contenttypes.courses.interfaces import SECTIONS
+
+from nti.contenttypes.courses.interfaces import ICourseInstance
+from nti.contenttypes.courses.interfaces import ICourseCatalogEntry
+
+from nti.externalization.internalization import find_factory_for
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def _problem(code, message, **kwargs):
+    result = {'code': code, 'message': message}
+    result.update(kwargs)
+    return result
+
+
+def _check_meta(session, report):
+    try:
+        meta = session.meta
+    except Exception as e:  # pylint: disable=broad-except
+        report['Errors'].append(_problem('InvalidCourseMeta',
+                                         u'Cannot parse %s: %s' % (COURSE_META_NAME, e)))
+        return None
+    if not meta:
+        report['Errors'].append(_problem('MissingCourseMeta',
+                                         u'Archive has no %s.' % COURSE_META_NAME))
+    return meta
+
+
+def _check_factory(meta, report):
+    try:
+        factory = find_factory_for(meta)
+    except Exception:  # pylint: disable=broad-except
+        logger.debug("Cannot find course factory", exc_info=True)
+        report['Errors'].append(_problem('ImportCourseTypeUnsupportedError',
+                                         u'Unsupported course type.',
+                                         MimeType=meta.get('MimeType')))
+        return
+    if factory is None:
+        # courses are then created with the default factory
+        report['Warnings'].append(_problem('DefaultCourseType',
+                                           u'Unknown course type, creating a default course.',
+                                           MimeType=meta.get('MimeType')))
+    else:
+        report['Factory'] = getattr(factory, '__name__', None) or repr(factory)
+
+
+def _export_hash(session):
+    try:
+        return session.export_hash
+    except Exception:  # pylint: disable=broad-except
+        # invalid meta, already reported
+        return None
+
+
+def _check_export_hash(session, course, report, validate=True):
+    export_hash = report['ExportHash'] = _export_hash(session)
+    if not export_hash:
+        # imports always require one
+        report['Errors'].append(_problem('InvalidCourseArchiveException',
+                                         u'Archive has no export hash.'))
+        return
+    if not validate:
+        return
+    courses = get_courses_for_export_hash(export_hash) or ()
+    duplicates = [ICourseCatalogEntry(x).ntiid for x in courses if x is not course]
+    report['Duplicates'] = duplicates
+    if duplicates:
+        report['Errors'].append(_problem('DuplicateImportFromExportError',
+                                         u'Archive already imported.',
+                                         Courses=duplicates))
+
+
+def _check_sections(session, report):
+    filer = session.filer
+    sections = report['Sections'] = []
+    if not filer.is_bucket(SECTIONS):
+        return
+    for key in filer.list(SECTIONS):
+        name = filer.key_name(key)
+        if filer.is_bucket(key):
+            sections.append(name)
+        else:
+            report['Warnings'].append(_problem('InvalidSection',
+                                               u'Ignoring section file %s.' % name))
+
+
+def validate_archive(archive, context=None, validate_export_hash=True):
+    """
+    Validate the given archive path, filer or :class:`ImportSession` for
+    an import, into the given course if any, returning a report.
+    """
+    now = time.time()
+    course = ICourseInstance(context, None)
+    report = {
+        'Valid': False,
+        'Errors': [],
+        'Warnings': [],
+    }
+    session, created = get_import_session(archive)
+    try:
+        try:
+            session.filer  # pylint: disable=pointless-statement
+        except (IOError, OSError) as e:
+            report['Errors'].append(_problem('InvalidCourseArchiveException',
+                                             u'Cannot open archive: %s' % e))
+        else:
+            meta = _check_meta(session, report)
+            if meta:
+                _check_factory(meta, report)
+            _check_export_hash(session, course, report, validate_export_hash)
+            _check_sections(session, report)
+    finally:
+        if created:
+            session.close()
+    report['Valid'] = not report['Errors']
+    report['Elapsed'] = time.time() - now
+    return report
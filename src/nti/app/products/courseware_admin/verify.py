@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Consistency checks of the course catalogs (indexes) against the objects
+they index.
+
+A check walks the same documents as a rebuild (see
+:mod:`nti.app.products.courseware_admin.rebuild`), reindexing each one in
+place and comparing its indexed values before and after. Indexes do not
+change for documents that are up to date, so a check that repairs only
+writes the differences; otherwise its transaction is doomed.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import time
+
+import BTrees
+
+import six
+
+import transaction
+
+from zope import component
+
+from zope.intid.interfaces import IIntIds
+
+from nti.app.products.courseware_admin.metadata_queue import queue_metadata
+
+from nti.app.products.courseware_admin.rebuild import RebuildScope
+from nti.app.products.courseware_admin.rebuild import catalog_doc_ids
+from nti.app.products.courseware_admin.rebuild import iter_catalog_courses
+
+MISSING = u'Missing'
+STALE = u'Stale'
+ORPHANED = u'Orphaned'
+
+#: Maximum number of documents of each kind listed in a report
+DEFAULT_REPORT_LIMIT = 100
+
+logger = __import__('logging').getLogger(__name__)
+
+
+class CatalogReport(object):
+    """
+    The documents of a catalog that are missing (not indexed), stale
+    (indexed with outdated values) or orphaned (indexed, but gone from the
+    object graph); only the first ``limit`` documents of each kind are
+    listed.
+    """
+
+    def __init__(self, limit=DEFAULT_REPORT_LIMIT, repair=False):
+        self.limit = limit
+        self.repair = repair
+        self.checked = 0
+        self.started = time.time()
+        self.counts = dict((x, 0) for x in (MISSING, STALE, ORPHANED))
+        self.items = dict((x, []) for x in (MISSING, STALE, ORPHANED))
+
+    def add(self, kind, doc_id, obj, indexes=None):
+        self.counts[kind] += 1
+        if len(self.items[kind]) < self.limit:
+            item = {
+                'DocId': doc_id,
+                'Class': type(obj).__name__ if obj is not None else None,
+                'NTIID': getattr(obj, 'ntiid', None),
+            }
+            if indexes:
+                item['Indexes'] = indexes
+            self.items[kind].append(item)
+
+    def toExternalObject(self, *unused_args, **unused_kwargs):
+        result = {
+            'Checked': self.checked,
+            'Repaired': self.repair,
+            'Elapsed': time.time() - self.started,
+        }
+        for kind, count in self.counts.items():
+            result[kind] = {'Total': count, 'Items': self.items[kind]}
+        return result
+
+
+def _snapshot(value):
+    # e.g. the (mutable) sets of set indexes
+    if      value is not None \
+        and not isinstance(value, six.string_types + (bytes,)) \
+        and hasattr(value, '__iter__'):
+        return tuple(value)
+    return value
+
+
+def _indexed_value(index, doc_id):
+    index = getattr(index, 'index', index)  # e.g. normalization wrappers
+    docs = getattr(index, 'documents_to_values', None)
+    if docs is not None:
+        return _snapshot(docs.get(doc_id))
+    # otherwise, only whether the document is indexed
+    ids = getattr(index, 'ids', None)
+    if callable(ids):
+        return True if doc_id in ids() else None
+    return None
+
+
+def _indexed_values(catalog, doc_id):
+    return dict((name, _indexed_value(index, doc_id))
+                for name, index in catalog.items())
+
+
+def verify_catalog(catalog, documents, scope=None, repair=False,
+                   limit=DEFAULT_REPORT_LIMIT):
+    """
+    Check the given catalog against the documents returned by calling
+    ``documents(course, doc_id, intids)`` for every course in scope (see
+    :func:`.iter_catalog_courses`), returning a :class:`CatalogReport`.
+    Unless the scope is limited, indexed documents that are gone, or that
+    are of a kind the sources yield but were not yielded, are orphaned.
+    Unless ``repair`` is set, the current transaction is doomed.
+    """
+    if not repair:
+        transaction.doom()
+    scope = scope or RebuildScope()
+    intids = component.getUtility(IIntIds)
+    report = CatalogReport(limit, repair)
+    indexed = catalog_doc_ids(catalog)
+    seen = BTrees.family64.II.TreeSet()
+    source_types = set()
+    for unused_site, course_id, course in iter_catalog_courses(intids, scope):
+        for doc_id, obj in documents(course, course_id, intids):
+            if doc_id in seen or not scope.includes(obj):
+                continue
+            seen.add(doc_id)
+            source_types.add(type(obj))
+            report.checked += 1
+            before = _indexed_values(catalog, doc_id)
+            catalog.index_doc(doc_id, obj)
+            after = _indexed_values(catalog, doc_id)
+            if doc_id not in indexed:
+                if not any(x is not None for x in after.values()):
+                    continue
+                report.add(MISSING, doc_id, obj)
+            elif before != after:
+                names = sorted(k for k, v in after.items() if before.get(k) != v)
+                report.add(STALE, doc_id, obj, names)
+            else:
+                continue
+            if repair:
+                queue_metadata(obj, doc_id)
+    if not scope:
+        for doc_id in BTrees.family64.II.difference(indexed, seen):
+            obj = intids.queryObject(doc_id)
+            if obj is None or type(obj) in source_types:
+                report.add(ORPHANED, doc_id, obj)
+                if repair:
+                    catalog.unindex_doc(doc_id)
+    logger.info("Verified catalog %s (checked=%s) (repair=%s) %s",
+                getattr(catalog, '__name__', catalog), report.checked,
+                repair, report.counts)
+    return report
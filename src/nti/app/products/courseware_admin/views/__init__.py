@@ -11,13 +11,20 @@ from __future__ import absolute_import
 from nti.app.products.courseware_admin import VIEW_VENDOR_INFO
 from nti.app.products.courseware_admin import VIEW_COURSE_ROLES
 from nti.app.products.courseware_admin import VIEW_EXPORT_COURSE
+from nti.app.products.courseware_admin import VIEW_EXPORT_COURSE_JOB
 from nti.app.products.courseware_admin import VIEW_IMPORT_COURSE
 from nti.app.products.courseware_admin import VIEW_COURSE_EDITORS
 from nti.app.products.courseware_admin import VIEW_COURSE_INSTRUCTORS
 from nti.app.products.courseware_admin import VIEW_COURSE_ADMINS
 from nti.app.products.courseware_admin import VIEW_EXPLICTLY_ADMINISTERED_COURSES
 from nti.app.products.courseware_admin import VIEW_ADMIN_IMPORT_COURSE
+from nti.app.products.courseware_admin import VIEW_IMPORT_COURSE_JOB
+from nti.app.products.courseware_admin import VIEW_VALIDATE_COURSE_ARCHIVE
+from nti.app.products.courseware_admin import VIEW_IMPORT_UPLOADS
+from nti.app.products.courseware_admin import VIEW_REBUILD_ENROLLMENT_CATALOG_JOB
 from nti.app.products.courseware_admin import VIEW_ASSESSMENT_POLICIES
+from nti.app.products.courseware_admin import VIEW_DOWNLOAD_COURSE_EXPORT
+from nti.app.products.courseware_admin import VIEW_ADMIN_EXPORT_COURSE_JOB
 from nti.app.products.courseware_admin import VIEW_COURSE_ADMIN_LEVELS
 from nti.app.products.courseware_admin import VIEW_COURSE_REMOVE_EDITORS
 from nti.app.products.courseware_admin import VIEW_COURSE_SUGGESTED_TAGS
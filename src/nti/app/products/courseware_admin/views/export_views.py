@@ -12,12 +12,17 @@ import os
 import time
 import shutil
 import tempfile
+import functools
+
+from pyramid import httpexceptions as hexc
 
 from pyramid.view import view_config
 from pyramid.view import view_defaults
 
 from requests.structures import CaseInsensitiveDict
 
+from zope import component
+
 from nti.app.base.abstract_views import AbstractAuthenticatedView
 
 from nti.app.externalization.view_mixins import ModeledContentUploadRequestUtilsMixin
@@ -25,44 +30,280 @@ from nti.app.externalization.view_mixins import ModeledContentUploadRequestUtils
 from nti.app.products.courseware.views import raise_error
 from nti.app.products.courseware.views import CourseAdminPathAdapter
 
+from nti.app.products.courseware_admin import MessageFactory as _
+
+from nti.app.products.courseware_admin.decorators import course_admin_adapter_path
+
+from nti.app.products.courseware_admin.exporter import stream_course
 from nti.app.products.courseware_admin.exporter import export_course
+from nti.app.products.courseware_admin.exporter import export_filename
+
+from nti.app.products.courseware_admin.interfaces import ICourseExportArtifactCache
+
+from nti.app.products.courseware_admin.jobs import JOB_SUCCESS
+
+from nti.app.products.courseware_admin.jobs import CourseAdminJob
+
+from nti.app.products.courseware_admin.jobs import get_job
+from nti.app.products.courseware_admin.jobs import save_job
+from nti.app.products.courseware_admin.jobs import spawn_job
+
+from nti.app.products.courseware_admin.timing import PhaseTimer
+
+from nti.app.products.courseware_admin.zipstream import get_zip_writer
 
 from nti.app.products.courseware_admin.views import VIEW_EXPORT_COURSE
+from nti.app.products.courseware_admin.views import VIEW_EXPORT_COURSE_JOB
+from nti.app.products.courseware_admin.views import VIEW_DOWNLOAD_COURSE_EXPORT
+from nti.app.products.courseware_admin.views import VIEW_ADMIN_EXPORT_COURSE_JOB
 
 from nti.app.products.courseware_admin.views.view_mixins import parse_course
 
 from nti.common.string import is_true
 
+from nti.contenttypes.courses.common import get_course_site_name
+
 from nti.contenttypes.courses.interfaces import INonExportable
 from nti.contenttypes.courses.interfaces import ICourseInstance
 from nti.contenttypes.courses.interfaces import ICourseCatalogEntry
 
 from nti.dataserver import authorization as nauth
 
+from nti.dataserver.authorization import is_admin_or_content_admin
+
+from nti.externalization.interfaces import LocatedExternalDict
+
+from nti.ntiids.ntiids import find_object_with_ntiid
+
+EXPORT_JOB = u'CourseExport'
+
 logger = __import__('logging').getLogger(__name__)
 
 
-def _export_course_response(context, backup, salt, response):
+def _check_exportable(context):
     course = ICourseInstance(context)
     if INonExportable.providedBy(course):
         raise_error({
                 'message': _(u'Cannot export non-exportable course instance.'),
                 'code': 'NonExportableCourseError',
             })
+    return course
+
+
+def _export_archive(context, backup, salt, cache=True, timer=None,
+                    compression=None):
+    """
+    Return the path of an export archive for the given course, served from
+    the export artifact cache when possible. Only exports with a stable
+    export hash (i.e. with a salt or for backup) are cached, by
+    compression policy.
+    """
+    key = None
+    course = ICourseInstance(context)
+    artifacts = component.getUtility(ICourseExportArtifactCache)
+    if cache and (backup or salt):
+        key = artifacts.key(course, backup, salt, compression)
+        zip_file = artifacts.get(key)
+        if zip_file:
+            logger.info('Serving cached course export %s', zip_file)
+            return zip_file
     path = tempfile.mkdtemp()
     try:
-        zip_file = export_course(context, backup, salt, path)
-        filename = os.path.split(zip_file)[1]
-        response.content_encoding = 'identity'
-        response.content_type = 'application/zip; charset=UTF-8'
-        content_disposition = 'attachment; filename="%s"' % filename
-        response.content_disposition = str(content_disposition)
-        response.body_file = open(zip_file, "rb")
-        return response
+        zip_file = export_course(context, backup, salt, path, timer,
+                                 compression)
+        if key:
+            zip_file = artifacts.put(key, zip_file)
+        else:
+            # keep the file open past the temp dir removal
+            zip_file = open(zip_file, "rb")
+        return zip_file
     finally:
         shutil.rmtree(path, True)
 
 
+def _set_zip_headers(filename, response):
+    response.content_encoding = 'identity'
+    response.content_type = 'application/zip; charset=UTF-8'
+    content_disposition = 'attachment; filename="%s"' % filename
+    response.content_disposition = str(content_disposition)
+
+
+def _zip_response(zip_file, response):
+    if not hasattr(zip_file, 'read'):
+        zip_file = open(zip_file, "rb")
+    _set_zip_headers(os.path.split(zip_file.name)[1], response)
+    response.body_file = zip_file
+    return response
+
+
+def _set_timing_headers(timer, response):
+    """
+    Report the export phases (in ms) in a ``Server-Timing`` header, and its
+    sizes in ``X-Export-*`` headers.
+    """
+    if timer.phases:
+        response.headers['Server-Timing'] = str(', '.join(
+            '%s;dur=%.1f' % (name, elapsed * 1000)
+            for name, elapsed in timer.phases.items()))
+    for name, value in timer.values.items():
+        response.headers[str('X-Export-%s' % name)] = str(value)
+
+
+def _stream_course_response(context, backup, salt, response, timer,
+                            compression=None):
+    """
+    Stream the course archive as it is zipped; with no content length the
+    response is sent with chunked transfer encoding.
+    """
+    app_iter = stream_course(context, backup, salt, timer, compression)
+    _set_zip_headers(export_filename(context), response)
+    _set_timing_headers(timer, response)
+    response.app_iter = app_iter
+    return response
+
+
+def _check_compression(compression):
+    try:
+        get_zip_writer(compression)
+    except ValueError:
+        raise_error({
+            'message': _(u'Invalid compression policy.'),
+            'code': 'InvalidCompression',
+        })
+    return compression
+
+
+def _export_course_response(context, backup, salt, response, cache=True,
+                            stream=False, compression=None):
+    course = _check_exportable(context)
+    compression = _check_compression(compression)
+    timer = PhaseTimer('export')
+    if stream:
+        # timings are reported once streamed
+        return _stream_course_response(context, backup, salt, response, timer,
+                                       compression)
+    zip_file = _export_archive(context, backup, salt, cache, timer,
+                               compression)
+    if timer.phases:
+        _set_timing_headers(timer, response)
+        timer.report(course=ICourseCatalogEntry(course).ntiid)
+    return _zip_response(zip_file, response)
+
+
+def _export_job(job, ntiid, params, site_name=None):
+    """
+    Run a background course export job, recording the artifact cache key
+    of the archive in its result.
+    """
+    context = find_object_with_ntiid(ntiid)
+    course = ICourseInstance(context)
+    backup = params.get('backup')
+    # a salt is needed for the archive to be found again
+    salt = params.get('salt') or str(job.created)
+    compression = params.get('compression')
+    artifacts = component.getUtility(ICourseExportArtifactCache)
+    job.update(phase=u'Exporting')
+    timer = PhaseTimer('export')
+    zip_file = _export_archive(course, backup, salt, timer=timer,
+                               compression=compression)
+    if hasattr(zip_file, 'read'):  # pragma: no cover
+        zip_file.close()
+        zip_file = zip_file.name
+    return {
+        'Key': artifacts.key(course, backup, salt, compression),
+        'Salt': salt,
+        'Filename': os.path.basename(zip_file),
+        'Size': os.path.getsize(zip_file),
+        'Timings': timer.report(course=ntiid, site=site_name),
+    }
+
+
+class ExportJobMixin(object):
+    """
+    Start a background export job for a course. The archive is built in the
+    export artifact cache, from where it is served by the
+    :class:`DownloadCourseExportView`.
+    """
+
+    def _start_export_job(self, context, backup, salt, compression=None):
+        course = _check_exportable(context)
+        compression = _check_compression(compression)
+        entry = ICourseCatalogEntry(course)
+        site_name = get_course_site_name(course)
+        params = {'ntiid': entry.ntiid,
+                  'backup': bool(backup),
+                  'salt': salt,
+                  'compression': compression}
+        # pylint: disable=no-member
+        job = CourseAdminJob(EXPORT_JOB,
+                             creator=self.remoteUser.username,
+                             site=site_name,
+                             params=params)
+        artifacts = component.getUtility(ICourseExportArtifactCache)
+        key = artifacts.key(course, backup, salt, compression) \
+              if backup or salt else None
+        zip_file = artifacts.get(key) if key else None
+        if zip_file:
+            # nothing to do, serve the cached archive
+            now = time.time()
+            job.state = JOB_SUCCESS
+            job.started = job.finished = now
+            job.result = {
+                'Key': key,
+                'Salt': salt,
+                'Cached': True,
+                'Filename': os.path.basename(zip_file),
+                'Size': os.path.getsize(zip_file),
+            }
+            save_job(job)
+        else:
+            func = functools.partial(_export_job,
+                                     ntiid=entry.ntiid,
+                                     params=dict(params),
+                                     site_name=site_name)
+            spawn_job(job, func, side_effect_free=True)
+        href = '%s/@@%s?JobId=%s' % (course_admin_adapter_path(self.request),
+                                     VIEW_ADMIN_EXPORT_COURSE_JOB,
+                                     job.jobId)
+        self.request.response.status_int = 202
+        self.request.response.location = href
+        result = LocatedExternalDict(job.toExternalObject())
+        result['href'] = href
+        return result
+
+
+def _rebuild_job_archive(job):
+    """
+    Build the archive of a completed export job again, e.g. when the job ran
+    on a node that does not share the export artifact cache. Returns None
+    if the course has changed since the job ran.
+    """
+    result = job.result or {}
+    context = find_object_with_ntiid(job.params['ntiid'])
+    course = ICourseInstance(context, None)
+    if course is None:
+        return None
+    backup = job.params.get('backup')
+    salt = result.get('Salt')
+    compression = job.params.get('compression')
+    artifacts = component.getUtility(ICourseExportArtifactCache)
+    if artifacts.key(course, backup, salt, compression) != result.get('Key'):
+        return None
+    logger.info('Rebuilding archive of course export job %s', job.jobId)
+    return _export_archive(course, backup, salt, compression=compression)
+
+
+def _get_export_job(request, user):
+    values = CaseInsensitiveDict(request.params)
+    job = get_job(values.get('JobId') or values.get('id'))
+    if      job is None \
+        or job.kind != EXPORT_JOB \
+        or (    job.creator != user.username
+            and not is_admin_or_content_admin(user)):
+        raise hexc.HTTPNotFound()
+    return job
+
+
 @view_config(context=ICourseInstance)
 @view_config(context=ICourseCatalogEntry)
 @view_defaults(route_name='objects.generic.traversal',
@@ -76,8 +317,30 @@ class CourseExportView(AbstractAuthenticatedView):
         values = CaseInsensitiveDict(self.request.params)
         backup = is_true(values.get('backup'))
         salt = values.get('salt')
+        cache = not is_true(values.get('refresh'))
+        stream = is_true(values.get('stream'))
+        compression = values.get('compression')
         return _export_course_response(self.context, backup, salt,
-                                       self.request.response)
+                                       self.request.response, cache,
+                                       stream, compression)
+
+
+@view_config(context=ICourseInstance)
+@view_config(context=ICourseCatalogEntry)
+@view_defaults(route_name='objects.generic.traversal',
+               renderer='rest',
+               request_method='POST',
+               name=VIEW_EXPORT_COURSE_JOB,
+               permission=nauth.ACT_CONTENT_EDIT)
+class CourseExportJobView(AbstractAuthenticatedView,
+                          ExportJobMixin):
+
+    def __call__(self):
+        values = CaseInsensitiveDict(self.request.params)
+        backup = is_true(values.get('backup'))
+        salt = values.get('salt')
+        compression = values.get('compression')
+        return self._start_export_job(self.context, backup, salt, compression)
 
 
 @view_config(route_name='objects.generic.traversal',
@@ -99,6 +362,66 @@ class AdminExportCourseView(AbstractAuthenticatedView,
         values = self.readInput()
         context = parse_course(values, self.request)
         backup = is_true(values.get('backup'))
-        salt = values.get('salt') or str(time.time())
+        salt = values.get('salt')
+        cache = not is_true(values.get('refresh'))
+        stream = is_true(values.get('stream'))
+        compression = values.get('compression')
         return _export_course_response(context, backup, salt,
-                                       self.request.response)
+                                       self.request.response, cache,
+                                       stream, compression)
+
+
+@view_config(context=CourseAdminPathAdapter)
+@view_defaults(route_name='objects.generic.traversal',
+               renderer='rest',
+               name=VIEW_ADMIN_EXPORT_COURSE_JOB,
+               permission=nauth.ACT_CONTENT_EDIT)
+class AdminExportCourseJobView(AdminExportCourseView,
+                               ExportJobMixin):
+    """
+    POST to start a course export job; GET (with a ``JobId``) to poll it.
+    """
+
+    def __call__(self):
+        if self.request.method == 'GET':
+            # pylint: disable=no-member
+            job = _get_export_job(self.request, self.remoteUser)
+            result = LocatedExternalDict(job.toExternalObject())
+            if job.state == JOB_SUCCESS:
+                result.update(job.result or {})
+                result['href'] = '%s/@@%s?JobId=%s' % (course_admin_adapter_path(self.request),
+                                                       VIEW_DOWNLOAD_COURSE_EXPORT,
+                                                       job.jobId)
+            return result
+        values = self.readInput()
+        context = parse_course(values, self.request)
+        backup = is_true(values.get('backup'))
+        salt = values.get('salt')
+        compression = values.get('compression')
+        return self._start_export_job(context, backup, salt, compression)
+
+
+@view_config(context=CourseAdminPathAdapter)
+@view_defaults(route_name='objects.generic.traversal',
+               renderer='rest',
+               request_method='GET',
+               name=VIEW_DOWNLOAD_COURSE_EXPORT,
+               permission=nauth.ACT_CONTENT_EDIT)
+class DownloadCourseExportView(AbstractAuthenticatedView):
+    """
+    Download the archive of a completed export job. Archives not found in
+    the export artifact cache of this node are built again, unless the
+    course has changed since.
+    """
+
+    def __call__(self):
+        # pylint: disable=no-member
+        job = _get_export_job(self.request, self.remoteUser)
+        if job.state != JOB_SUCCESS:
+            raise hexc.HTTPConflict()
+        artifacts = component.getUtility(ICourseExportArtifactCache)
+        zip_file = artifacts.get((job.result or {}).get('Key')) \
+                or _rebuild_job_archive(job)
+        if not zip_file:
+            raise hexc.HTTPGone()
+        return _zip_response(zip_file, self.request.response)
@@ -10,13 +10,17 @@ from __future__ import absolute_import
 
 import os
 import time
-import tempfile
+import functools
+
+from pyramid import httpexceptions as hexc
 
 from pyramid.view import view_config
 from pyramid.view import view_defaults
 
 from requests.structures import CaseInsensitiveDict
 
+import six
+
 from zope import component
 
 from zope.component.hooks import getSite
@@ -37,19 +41,42 @@ from nti.app.products.courseware.views import CourseAdminPathAdapter
 
 from nti.app.products.courseware_admin import MessageFactory as _
 
+from nti.app.products.courseware_admin.decorators import course_admin_adapter_path
+
+from nti.app.products.courseware_admin.dryrun import dry_run
+
+from nti.app.products.courseware_admin.extraction import log_progress
+
 from nti.app.products.courseware_admin.importer import create_course
 from nti.app.products.courseware_admin.importer import import_course
 from nti.app.products.courseware_admin.importer import create_sections
+from nti.app.products.courseware_admin.importer import get_section_previews
+from nti.app.products.courseware_admin.importer import restore_section_previews
+
+from nti.app.products.courseware_admin.interfaces import ICourseImportStaging
+from nti.app.products.courseware_admin.interfaces import ICourseArchiveUploads
+
+from nti.app.products.courseware_admin.jobs import JOB_SUCCESS
+
+from nti.app.products.courseware_admin.jobs import CourseAdminJob
+
+from nti.app.products.courseware_admin.jobs import get_job
+from nti.app.products.courseware_admin.jobs import spawn_job
+
+from nti.app.products.courseware_admin.session import ImportSession
+
+from nti.app.products.courseware_admin.validation import validate_archive
 
 from nti.app.products.courseware_admin.views import VIEW_IMPORT_COURSE
+from nti.app.products.courseware_admin.views import VIEW_IMPORT_COURSE_JOB
 from nti.app.products.courseware_admin.views import VIEW_ADMIN_IMPORT_COURSE
+from nti.app.products.courseware_admin.views import VIEW_VALIDATE_COURSE_ARCHIVE
 
-from nti.cabinet.filer import transfer_to_native_file
+from nti.app.products.courseware_admin.views.upload_views import get_upload
 
 from nti.common.string import is_true
 from nti.common.string import is_false
 
-from nti.contenttypes.courses.creator import delete_directory
 from nti.contenttypes.courses.creator import install_admin_level
 
 from nti.contenttypes.courses.interfaces import ICourseCatalog
@@ -78,9 +105,241 @@ from nti.site.site import get_component_hierarchy_names
 
 NTIID = StandardExternalFields.NTIID
 
+IMPORT_JOB = u'CourseImport'
+
 logger = __import__('logging').getLogger(__name__)
 
 
+#: The steps of a background import into an existing course
+IMPORT_STEPS = (u'CreatingSections', u'Importing', u'RestoringPreviews',
+                u'Notifying')
+
+#: The steps of a background import creating a new course
+CREATE_STEPS = (u'Creating', u'Notifying')
+
+
+class ImportProgress(object):
+    """
+    Reports the steps of a course import to the background job running it,
+    if any, as the job phase and progress.
+    """
+
+    def __init__(self, job=None, steps=()):
+        self.job = job
+        self.steps = tuple(steps)
+
+    def step(self, phase):
+        logger.info('Course import step %s', phase)
+        if self.job is None:
+            return
+        progress = dict(self.job.progress or {})
+        if phase in self.steps:
+            progress['Step'] = self.steps.index(phase) + 1
+        progress['TotalSteps'] = len(self.steps)
+        self.job.update(phase=phase, progress=progress)
+
+    def extracted(self, state):
+        """
+        Report the :class:`.ExtractionProgress` of the archive, as it is
+        being extracted.
+        """
+        log_progress(state)
+        if self.job is None:
+            return
+        progress = dict(self.job.progress or {})
+        progress['Extraction'] = state.toExternalObject()
+        self.job.update(progress=progress)
+
+
+def _get_import_session(values, path, progress=log_progress):
+    """
+    Open the archive for all the importer steps. Archives are read in
+    place unless the caller asks them to be extracted to disk.
+    """
+    extract = is_true(values.get('extract'))
+    staging = component.getUtility(ICourseImportStaging)
+    if extract and path in staging:
+        # staged uploads are extracted once and kept with the upload
+        path = staging.extract(path, progress=progress)
+        extract = False
+    return ImportSession(path, extract=extract, progress=progress)
+
+
+def _set_extraction_progress(session, result):
+    if session.extraction is not None:
+        result['Extraction'] = session.extraction.toExternalObject()
+
+
+def _restore_previews(course, previews, preview_raw_value, timer):
+    """
+    Restore the preview state of the course after an import: existing
+    sections keep their own state while new sections take the course one.
+    """
+    course = ICourseInstance(course)
+    entry = ICourseCatalogEntry(course)
+    with timer.phase('PreviewState'):
+        if preview_raw_value is not None:
+            entry.Preview = preview_raw_value
+        else:
+            delattr(entry, 'Preview')
+        notified = restore_section_previews(course, previews, preview_raw_value)
+    timer.count('Notified', notified)
+
+
+def _update_entry_title(course, prefix=None):
+    entry = ICourseCatalogEntry(course, None)
+    if entry is not None and prefix:
+        max_length = ICourseCatalogEntry['title'].max_length
+        old_title = entry.title or ''
+        entry.title = '%s%s' % (prefix, old_title[:max_length-len(prefix)])
+        notify(ObjectModifiedFromExternalEvent(entry))
+
+
+def _import_course(ntiid, session, writeout=True,
+                   lockout=False, clear=False, validate_export_hash=True):
+    context = find_object_with_ntiid(ntiid)
+    course = ICourseInstance(context, None)
+    if course is None:
+        raise_error({
+            'message': _(u"Invalid course."),
+            'code': 'InvalidCourse',
+        })
+    return import_course(ntiid,
+                         session,
+                         writeout,
+                         lockout,
+                         clear=clear,
+                         validate_export_hash=validate_export_hash)
+
+
+def _create_course(admin, key, session, writeout=True, lockout=False,
+                   clear=False, site=None, validate_export_hash=True,
+                   creator=None):
+    if not admin:
+        raise_error({
+            'message': _(u"No administrative level specified."),
+            'code': 'MissingAdminLevel',
+        })
+    if not key:
+        raise_error({
+            'message': _(u"No course key specified."),
+            'code': 'MissingCourseKey',
+        })
+
+    sites = get_component_hierarchy_names()
+    if site and site not in sites:
+        raise_error({
+            'message': _(u"Invalid site."),
+            'code': 'InvalidSite',
+        })
+    elif not site:
+        site = getSite().__name__
+
+    catalog = None
+    site = get_host_site(site)
+    with current_site(site):
+        adm_levels = component.queryUtility(ICourseCatalog)
+        if adm_levels is not None:
+            if admin not in adm_levels:
+                install_admin_level(admin, adm_levels, site, writeout, False)
+            catalog = adm_levels
+
+    if catalog is None:
+        raise_error({
+            'message': _(u"Invalid administrative level."),
+            'code': 'InvalidAdminLevel',
+        })
+    logger.info('Importing course (key=%s) (admin=%s) (path=%s) (lockout=%s) (clear=%s) (writeout=%s) (site=%s) (validate_export_hash=%s)',
+                key, admin, session.path, lockout, clear, writeout, site.__name__,
+                validate_export_hash)
+    return create_course(admin, key, session, catalog, writeout,
+                         lockout, clear, creator,
+                         validate_export_hash=validate_export_hash)
+
+
+def _do_import_course(values, path, creator=None, validate_export_hash=True,
+                      prefix=None, progress=None):
+    """
+    Import the archive at the given path into the course with the given
+    ``ntiid``, or create a new course from it, reporting each step to
+    ``progress`` (an :class:`ImportProgress`). Nothing is read from the
+    request, so that this may run in a background job.
+    """
+    session = None
+    now = time.time()
+    progress = progress if progress is not None else ImportProgress()
+    result = LocatedExternalDict()
+    params = result['Params'] = {}
+    try:
+        ntiid = values.get('ntiid')
+        clear = is_true(values.get('clear'))
+        # Default to true
+        writeout = is_true(values.get('writeout') or values.get('save', 'true'))
+        lockout = is_true(   values.get('lock')
+                          or values.get('lockout')
+                          or 'True')
+        session = _get_import_session(values, path, progress.extracted)
+        timer = session.timer
+        if ntiid:
+            params[NTIID] = ntiid
+            context = find_object_with_ntiid(ntiid)
+            course = ICourseInstance(context, None)
+            entry = ICourseCatalogEntry(course, None)
+            preview_raw_value = getattr(entry, 'PreviewRawValue', None)
+            # We have a course, but want to create any sections given to us.
+            previews = get_section_previews(course)
+
+            progress.step(u'CreatingSections')
+            create_sections(course, session, writeout)
+
+            progress.step(u'Importing')
+            course = _import_course(ntiid, session, writeout,
+                                    lockout, clear=clear,
+                                    validate_export_hash=validate_export_hash)
+            progress.step(u'RestoringPreviews')
+            _restore_previews(course, previews, preview_raw_value, timer)
+        else:
+            site = values.get('site')
+            params['Key'] = key = values.get('key')
+            params['Admin'] = admin = values.get('admin')
+            progress.step(u'Creating')
+            course = _create_course(admin, key, session, writeout,
+                                    lockout, clear, site,
+                                    validate_export_hash=validate_export_hash,
+                                    creator=creator)
+
+        progress.step(u'Notifying')
+        with timer.phase('Notify'):
+            notify(ObjectModifiedFromExternalEvent(course))
+            _update_entry_title(course, prefix)
+        timer.count('Notified')
+        _set_extraction_progress(session, result)
+        result['Course'] = course
+        result['Timings'] = timer.report(course=ICourseCatalogEntry(course).ntiid)
+        result['Elapsed'] = time.time() - now
+    except Exception as e:
+        logger.exception("Cannot import/create course")
+        raise e
+    finally:
+        if session is not None:
+            session.close()
+    return result
+
+
+def _import_job(job, values, path, creator=None, validate_export_hash=True,
+                prefix=None):
+    """
+    Run a background course import job, recording the ntiid of the course
+    in its result.
+    """
+    steps = IMPORT_STEPS if values.get('ntiid') else CREATE_STEPS
+    result = _do_import_course(values, path, creator, validate_export_hash,
+                               prefix, ImportProgress(job, steps))
+    course = result.pop('Course')
+    result['Course'] = ICourseCatalogEntry(course).ntiid
+    return dict(result)
+
+
 class CourseImportMixin(AbstractAuthenticatedView,
                         ModeledContentUploadRequestUtilsMixin):
 
@@ -106,10 +365,26 @@ class CourseImportMixin(AbstractAuthenticatedView,
             validate_export_hash = not is_false(values.get('validate_export_hash'))
         return validate_export_hash
 
-    def _get_source_paths(self, values):
-        tmp_path = None
+    def _get_source_path(self, values):
         path = values.get('path')
-        if path and not os.path.exists(path):
+        upload = values.get('upload') or values.get('UploadId')
+        if upload:
+            # an archive assembled from a chunked upload
+            status = get_upload(upload, self.remoteUser)
+            if status is None:
+                raise_error({
+                    'message': _(u"Invalid upload."),
+                    'code': 'InvalidUpload',
+                })
+            if not status['Complete']:
+                raise_error({
+                    'message': _(u"Upload is not complete."),
+                    'code': 'IncompleteUpload',
+                    'Offset': status['Offset'],
+                })
+            uploads = component.getUtility(ICourseArchiveUploads)
+            path = uploads.path(upload)
+        elif path and not os.path.exists(path):
             raise_error({
                 'message': _(u"Invalid path."),
                 'code': 'InvalidPath',
@@ -126,56 +401,39 @@ class CourseImportMixin(AbstractAuthenticatedView,
                     'message': _(u"No archive source uploaded."),
                     'code': 'InvalidSource',
                 })
-            tmp_path = tempfile.mkdtemp()
-            path = os.path.join(tmp_path, filename)
-            transfer_to_native_file(source, path)
-            logger.info("Source data saved to %s", path)
+            staging = component.getUtility(ICourseImportStaging)
+            path = staging.stage(source, filename)
         elif not path:
             raise_error({
                 'message': _(u"No archive source specified."),
                 'code': 'NoSourceSpecified',
             })
-        return path, tmp_path
-
-    def _section_course_preview_raw_values(self, existing_sections):
-        _res = []
-        for sub_instance in existing_sections or ():
-            entry = ICourseCatalogEntry(sub_instance)
-            _res.append((getattr(entry, 'PreviewRawValue', None), entry, sub_instance))
-        return _res
-
-    def _recover_existing_section_preview_raw_values(self, preview_raw_values, do_notify=True):
-        for raw_val, sub_entry, sub_instance in preview_raw_values or ():
-            if raw_val is not None:
-                sub_entry.Preview = raw_val
-            else:
-                delattr(sub_entry, 'Preview')
-
-            if do_notify:
-                notify(ObjectModifiedFromExternalEvent(sub_instance))
-                notify(ObjectModifiedFromExternalEvent(sub_entry))
-
-    def _set_new_section_preview_raw_values(self, new_sections, preview_raw_value=None, do_notify=True):
-        for sub_instance in new_sections:
-            sub_entry = ICourseCatalogEntry(sub_instance)
-            if preview_raw_value is not None:
-                sub_entry.Preview = preview_raw_value
-            else:
-                delattr(sub_entry, 'Preview')
-
-            notify(ObjectModifiedFromExternalEvent(sub_instance))
-            notify(ObjectModifiedFromExternalEvent(sub_entry))
+        return path
+
+    def _is_dry_run(self, values):
+        return is_true(values.get('dry_run') or values.get('dryrun'))
+
+    def _dry_run(self, func, values, *args):
+        """
+        Run the given import function without writing out sources, in a
+        doomed transaction, adding the objects it changes to its result.
+        """
+        values = CaseInsensitiveDict(values)
+        values['writeout'] = 'false'
+        with dry_run() as counter:
+            result = func(values, *args)
+        course = result.pop('Course', None)
+        if course is not None:
+            # the course may not outlive the transaction
+            result[NTIID] = ICourseCatalogEntry(course).ntiid
+        result['DryRun'] = counter.toExternalObject()
+        return result
 
     def _do_call(self):
         pass
 
     def _update_entry_title(self, course, prefix=None):
-        entry = ICourseCatalogEntry(course, None)
-        if entry is not None and prefix:
-            max_length = ICourseCatalogEntry['title'].max_length
-            old_title = entry.title or ''
-            entry.title = '%s%s' % (prefix, old_title[:max_length-len(prefix)])
-            notify(ObjectModifiedFromExternalEvent(entry))
+        _update_entry_title(course, prefix)
 
     def __call__(self):
         endInteraction()
@@ -213,57 +471,54 @@ class CourseImportMixin(AbstractAuthenticatedView,
                permission=nauth.ACT_CONTENT_EDIT)
 class CourseImportView(CourseImportMixin):
 
-    def _do_call(self):
-        tmp_path = None
+    def _do_import(self, values):
         now = time.time()
-        values = self.readInput()
         result = LocatedExternalDict()
         course = ICourseInstance(self.context)
         entry = ICourseCatalogEntry(self.context)
-        try:
-            path, tmp_path = self._get_source_paths(values)
-            clear = is_true(values.get('clear'))
-            # Default to true
-            writeout = is_true(values.get('writeout') or values.get('save', 'true'))
-            lockout = is_true(values.get('lock') or values.get('lockout'))
-            validate_export_hash = self._get_validate_export_hash(values)
-            preview_raw_value = getattr(entry, 'PreviewRawValue', None)
-            path = os.path.abspath(path)
-            # We have a course, but want to create an sections given to us.
-            # If a section course exists, keep its original preview state,
-            # otherwise its preview state should come from parent.
-            existing_sections = set([x for x in course.SubInstances.values()])
-            existing_section_preview_raw_values = self._section_course_preview_raw_values(existing_sections)
-
-            create_sections(course, path, writeout)
-
-            new_sections = [x for x in course.SubInstances.values() if x not in existing_sections]
+        path = self._get_source_path(values)
+        clear = is_true(values.get('clear'))
+        # Default to true
+        writeout = is_true(values.get('writeout') or values.get('save', 'true'))
+        lockout = is_true(values.get('lock') or values.get('lockout'))
+        validate_export_hash = self._get_validate_export_hash(values)
+        preview_raw_value = getattr(entry, 'PreviewRawValue', None)
+        path = os.path.abspath(path)
+        # We have a course, but want to create an sections given to us.
+        # If a section course exists, keep its original preview state,
+        # otherwise its preview state should come from parent.
+        previews = get_section_previews(course)
+
+        # open the archive once for all the importer steps
+        with _get_import_session(values, path) as session:
+            create_sections(course, session, writeout)
 
             import_course(entry.ntiid,
-                          path,
+                          session,
                           writeout,
                           lockout,
                           clear=clear,
                           validate_export_hash=validate_export_hash)
-            if preview_raw_value is not None:
-                entry.Preview = preview_raw_value
-            else:
-                delattr(entry, 'Preview')
-
-            self._recover_existing_section_preview_raw_values(existing_section_preview_raw_values)
-
-            self._set_new_section_preview_raw_values(new_sections=new_sections,
-                                                     preview_raw_value=preview_raw_value)
+            _set_extraction_progress(session, result)
+        timer = session.timer
+        _restore_previews(course, previews, preview_raw_value, timer)
 
-            result['Elapsed'] = time.time() - now
-            course = ICourseInstance(self.context)
-            result['Course'] = course
+        course = ICourseInstance(self.context)
+        result['Course'] = course
+        with timer.phase('Notify'):
             notify(ObjectModifiedFromExternalEvent(course))
             self._update_entry_title(course, prefix=self.copy_title_prefix(values))
-        finally:
-            delete_directory(tmp_path)
+        timer.count('Notified')
+        result['Timings'] = timer.report(course=entry.ntiid)
+        result['Elapsed'] = time.time() - now
         return result
 
+    def _do_call(self):
+        values = self.readInput()
+        if self._is_dry_run(values):
+            return self._dry_run(self._do_import, values)
+        return self._do_import(values)
+
 
 @view_config(context=CourseAdminPathAdapter)
 @view_defaults(route_name='objects.generic.traversal',
@@ -273,125 +528,118 @@ class CourseImportView(CourseImportMixin):
                permission=nauth.ACT_CONTENT_EDIT)
 class ImportCourseView(CourseImportMixin):
 
-    def _import_course(self, ntiid, path, writeout=True,
-                       lockout=False, clear=False, validate_export_hash=True):
-        context = find_object_with_ntiid(ntiid)
-        course = ICourseInstance(context, None)
-        if course is None:
-            raise_error({
-                'message': _(u"Invalid course."),
-                'code': 'InvalidCourse',
-            })
-        return import_course(ntiid,
-                             path,
-                             writeout,
-                             lockout,
-                             clear=clear,
-                             validate_export_hash=validate_export_hash)
-
-    def _create_course(self, admin, key, path, writeout=True,
-                       lockout=False, clear=False, site=None, validate_export_hash=True):
-        if not admin:
-            raise_error({
-                'message': _(u"No administrative level specified."),
-                'code': 'MissingAdminLevel',
-            })
-        if not key:
-            raise_error({
-                'message': _(u"No course key specified."),
-                'code': 'MissingCourseKey',
-            })
+    def _do_import(self, values, path, creator=None, validate_export_hash=True):
+        return _do_import_course(values, path, creator, validate_export_hash,
+                                 prefix=self.copy_title_prefix(values))
 
-        sites = get_component_hierarchy_names()
-        if site and site not in sites:
-            raise_error({
-                'message': _(u"Invalid site."),
-                'code': 'InvalidSite',
-            })
-        elif not site:
-            site = getSite().__name__
-
-        catalog = None
-        site = get_host_site(site)
-        with current_site(site):
-            adm_levels = component.queryUtility(ICourseCatalog)
-            if adm_levels is not None:
-                if admin not in adm_levels:
-                    install_admin_level(admin, adm_levels, site, writeout, False)
-                catalog = adm_levels
-
-        if catalog is None:
-            raise_error({
-                'message': _(u"Invalid administrative level."),
-                'code': 'InvalidAdminLevel',
-            })
-        logger.info('Importing course (key=%s) (admin=%s) (path=%s) (lockout=%s) (clear=%s) (writeout=%s) (site=%s) (validate_export_hash=%s)',
-                    key, admin, path, lockout, clear, writeout, site.__name__,
-                    validate_export_hash)
+    def _do_async_import(self, values, path, validate_export_hash):
+        """
+        Run the import in a background greenlet, returning the job to poll.
+        Everything the job needs is taken from the request beforehand.
+        """
         # pylint: disable=no-member
-        return create_course(admin, key, path, catalog, writeout,
-                             lockout, clear, self.remoteUser.username,
-                             validate_export_hash=validate_export_hash)
+        creator = self.remoteUser.username
+        params = dict((k, v) for k, v in values.items()
+                      if isinstance(v, six.string_types))
+        job = CourseAdminJob(IMPORT_JOB, creator=creator,
+                             site=getSite().__name__, params=params)
+        func = functools.partial(_import_job,
+                                 values=CaseInsensitiveDict(values),
+                                 path=path,
+                                 creator=creator,
+                                 validate_export_hash=validate_export_hash,
+                                 prefix=self.copy_title_prefix(values))
+        spawn_job(job, func)
+        href = '%s/@@%s?JobId=%s' % (course_admin_adapter_path(self.request),
+                                     VIEW_IMPORT_COURSE_JOB,
+                                     job.jobId)
+        self.request.response.status_int = 202
+        self.request.response.location = href
+        result = LocatedExternalDict(job.toExternalObject())
+        result['href'] = href
+        return result
 
     def _do_call(self):
-        tmp_path = None
-        now = time.time()
         values = self.readInput()
-        result = LocatedExternalDict()
-        params = result['Params'] = {}
-        try:
-            ntiid = values.get('ntiid')
-            path, tmp_path = self._get_source_paths(values)
-            path = os.path.abspath(path)
-            clear = is_true(values.get('clear'))
-            # Default to true
-            writeout = is_true(values.get('writeout') or values.get('save', 'true'))
-            validate_export_hash = self._get_validate_export_hash(values)
-            lockout = is_true(   values.get('lock')
-                              or values.get('lockout')
-                              or 'True')
-            if ntiid:
-                params[NTIID] = ntiid
-                context = find_object_with_ntiid(ntiid)
-                course = ICourseInstance(context, None)
-                entry = ICourseCatalogEntry(course, None)
-                preview_raw_value = getattr(entry, 'PreviewRawValue', None)
-                # We have a course, but want to create any sections given to us.
-                existing_sections = set([x for x in course.SubInstances.values()])
-                existing_section_preview_raw_values = self._section_course_preview_raw_values(existing_sections)
-
-                create_sections(course, path, writeout)
-
-                new_sections = [x for x in course.SubInstances.values() if x not in existing_sections]
-
-                course = self._import_course(ntiid, path, writeout,
-                                             lockout, clear=clear,
-                                             validate_export_hash=validate_export_hash)
-                if preview_raw_value is not None:
-                    entry.Preview = preview_raw_value
-                else:
-                    delattr(entry, 'Preview')
-
-                self._recover_existing_section_preview_raw_values(existing_section_preview_raw_values)
-
-                self._set_new_section_preview_raw_values(new_sections=new_sections,
-                                                         preview_raw_value=preview_raw_value)
-            else:
-                site = values.get('site')
-                params['Key'] = key = values.get('key')
-                params['Admin'] = admin = values.get('admin')
-                course = self._create_course(admin, key, path, writeout,
-                                             lockout, clear, site,
-                                             validate_export_hash=validate_export_hash)
+        path = os.path.abspath(self._get_source_path(values))
+        validate_export_hash = self._get_validate_export_hash(values)
+        if self._is_dry_run(values):
+            # pylint: disable=no-member
+            return self._dry_run(self._do_import, values, path,
+                                 self.remoteUser.username,
+                                 validate_export_hash)
+        if is_true(values.get('async')):
+            return self._do_async_import(values, path, validate_export_hash)
+        # pylint: disable=no-member
+        return self._do_import(values, path,
+                               self.remoteUser.username,
+                               validate_export_hash)
 
-            notify(ObjectModifiedFromExternalEvent(course))
-            self._update_entry_title(course, prefix=self.copy_title_prefix(values))
-            result['Course'] = course
-            result['Elapsed'] = time.time() - now
-        except Exception as e:
-            logger.exception("Cannot import/create course")
-            tmp_path = None
-            raise e
-        finally:
-            delete_directory(tmp_path)
+
+@view_config(context=CourseAdminPathAdapter)
+@view_defaults(route_name='objects.generic.traversal',
+               renderer='rest',
+               request_method='GET',
+               name=VIEW_IMPORT_COURSE_JOB,
+               permission=nauth.ACT_CONTENT_EDIT)
+class ImportCourseJobView(AbstractAuthenticatedView):
+    """
+    Return the state of a background course import job; once the job
+    succeeds its ``Course`` and ``Elapsed`` are returned.
+
+    params:
+        JobId - the job identifier
+    """
+
+    def __call__(self):
+        values = CaseInsensitiveDict(self.request.params)
+        job = get_job(values.get('JobId') or values.get('id'))
+        # pylint: disable=no-member
+        if      job is None \
+            or job.kind != IMPORT_JOB \
+            or (    job.creator != self.remoteUser.username
+                and not is_admin_or_content_admin(self.remoteUser)):
+            raise hexc.HTTPNotFound()
+        result = LocatedExternalDict(job.toExternalObject())
+        if job.state == JOB_SUCCESS:
+            job_result = job.result or {}
+            entry = find_object_with_ntiid(job_result.get('Course') or '')
+            result['Course'] = ICourseInstance(entry, None)
+            for name, value in job_result.items():
+                if name != 'Course':
+                    result[name] = value
         return result
+
+
+@view_config(context=CourseAdminPathAdapter)
+@view_defaults(route_name='objects.generic.traversal',
+               renderer='rest',
+               request_method='POST',
+               name=VIEW_VALIDATE_COURSE_ARCHIVE,
+               permission=nauth.ACT_CONTENT_EDIT)
+class ValidateCourseArchiveView(CourseImportMixin):
+    """
+    Validate an uploaded (or on disk) course archive without importing it,
+    returning a report of its errors and warnings.
+
+    params:
+        ntiid - the course the archive would be imported into, if any
+        path - the archive path, if not uploaded
+        upload - the id of a completed chunked upload, if any
+    """
+
+    def _do_call(self):
+        values = self.readInput()
+        path = self._get_source_path(values)
+        course = None
+        ntiid = values.get('ntiid')
+        if ntiid:
+            course = ICourseInstance(find_object_with_ntiid(ntiid), None)
+            if course is None:
+                raise_error({
+                    'message': _(u"Invalid course."),
+                    'code': 'InvalidCourse',
+                })
+        report = validate_archive(os.path.abspath(path), course,
+                                  self._get_validate_export_hash(values))
+        return LocatedExternalDict(report)
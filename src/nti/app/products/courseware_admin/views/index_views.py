@@ -8,204 +8,448 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import absolute_import
 
+import time
+
+from pyramid import httpexceptions as hexc
+
 from pyramid.view import view_config
 from pyramid.view import view_defaults
 
+from requests.structures import CaseInsensitiveDict
+
 from zope import component
 
-from zope.component.hooks import site as current_site
+from zope.component.hooks import getSite
 
 from zope.intid.interfaces import IIntIds
 
 from nti.app.base.abstract_views import AbstractAuthenticatedView
 
+from nti.app.products.courseware.views import raise_error
 from nti.app.products.courseware.views import CourseAdminPathAdapter
 
-from nti.contentlibrary.index import get_contentbundle_catalog
+from nti.app.products.courseware_admin import MessageFactory as _
+
+from nti.app.products.courseware_admin.decorators import course_admin_adapter_path
+
+from nti.app.products.courseware_admin.index import rebuild_export_hash_index
+from nti.app.products.courseware_admin.index import get_courses_for_export_hash
+
+from nti.app.products.courseware_admin.jobs import JOB_FAILED
+from nti.app.products.courseware_admin.jobs import JOB_SUCCESS
+from nti.app.products.courseware_admin.jobs import CourseAdminJob
+from nti.app.products.courseware_admin.jobs import get_job
+from nti.app.products.courseware_admin.jobs import spawn_job
+
+from nti.app.products.courseware_admin.metadata_queue import coalesced_metadata_queue
+
+from nti.app.products.courseware_admin.rebuild import DEFAULT_WORKERS
+from nti.app.products.courseware_admin.rebuild import DEFAULT_BATCH_SIZE
+from nti.app.products.courseware_admin.rebuild import RebuildScope
+from nti.app.products.courseware_admin.rebuild import reindex_course_entry
+from nti.app.products.courseware_admin.rebuild import iter_catalog_courses
+from nti.app.products.courseware_admin.rebuild import iter_outline_documents
+from nti.app.products.courseware_admin.rebuild import iter_courses_documents
+from nti.app.products.courseware_admin.rebuild import iter_enrollment_documents
+from nti.app.products.courseware_admin.rebuild import get_enrollment_rebuild
+from nti.app.products.courseware_admin.rebuild import rebuild_enrollment_catalog
+from nti.app.products.courseware_admin.rebuild import reindex_course_outline
+from nti.app.products.courseware_admin.rebuild import reindex_course_enrollments
+from nti.app.products.courseware_admin.rebuild import parallel_reindex
+from nti.app.products.courseware_admin.rebuild import run_enrollment_catalog_rebuild
+
+from nti.app.products.courseware_admin.verify import DEFAULT_REPORT_LIMIT
+from nti.app.products.courseware_admin.verify import verify_catalog
+
+from nti.app.products.courseware_admin.views import VIEW_REBUILD_ENROLLMENT_CATALOG_JOB
+
+from nti.common.string import is_true
 
 from nti.contenttypes.courses.index import get_courses_catalog
 from nti.contenttypes.courses.index import get_enrollment_catalog
 from nti.contenttypes.courses.index import get_course_outline_catalog
 
-from nti.contenttypes.courses.interfaces import ICourseCatalog
-from nti.contenttypes.courses.interfaces import ICourseInstance
-from nti.contenttypes.courses.interfaces import ICourseEnrollments
-from nti.contenttypes.courses.interfaces import ICourseSubInstance
-from nti.contenttypes.courses.interfaces import IContentCourseInstance
+from nti.contenttypes.courses.interfaces import ICourseCatalogEntry
 
 from nti.dataserver import authorization as nauth
 
 from nti.externalization.interfaces import LocatedExternalDict
 from nti.externalization.interfaces import StandardExternalFields
 
-from nti.metadata import queue_add as metadata_queue_add
-
-from nti.site.hostpolicy import get_all_host_sites
-from nti.contenttypes.courses.utils import index_course_roles
-
 ITEMS = StandardExternalFields.ITEMS
 TOTAL = StandardExternalFields.TOTAL
 ITEM_COUNT = StandardExternalFields.ITEM_COUNT
 
+ENROLLMENT_REBUILD_JOB = u'EnrollmentCatalogRebuild'
+
 logger = __import__('logging').getLogger(__name__)
 
 
+class CatalogRebuildMixin(AbstractAuthenticatedView):
+    """
+    Base of the catalog rebuild views, which may be scoped with the
+    following (optional) params:
+
+        site - the host site name(s) to rebuild
+        ntiid - the catalog entry (or course) ntiid(s) to rebuild
+        since - the time (seconds since the epoch) after which the objects
+            to reindex were modified
+
+    A scoped rebuild only unindexes and reindexes the matching documents.
+
+    With ``parallel`` set, sites are reindexed in place on a pool of
+    (``workers``) greenlets, each site in its own transaction; the catalog
+    is not cleared, so orphaned entries are kept (see the verification
+    views).
+
+    Reindexed objects are queued for metadata indexing in batches, without
+    duplicates, unless ``skipMetadata`` is set.
+    """
+
+    #: Return the catalog to rebuild
+    catalog = None
+
+    #: Reindex the documents of a course in scope in the given catalog,
+    #: ``reindex_course(catalog, course, doc_id, intids, scope)``,
+    #: returning their count
+    reindex_course = None
+
+    def _get_names(self, *keys):
+        result = set()
+        for key in keys:
+            for value in self.request.params.getall(key):
+                result.update(x.strip() for x in value.split(',') if x.strip())
+        return result
+
+    def _get_since(self):
+        values = CaseInsensitiveDict(self.request.params)
+        since = values.get('since')
+        if not since:
+            return None
+        try:
+            return float(since)
+        except ValueError:
+            raise_error({
+                'message': _(u"Invalid modification time."),
+                'code': 'InvalidSince',
+            })
+
+    def _get_scope(self):
+        return RebuildScope(sites=self._get_names('site', 'sites'),
+                            ntiids=self._get_names('ntiid', 'ntiids'),
+                            since=self._get_since())
+
+    def _get_workers(self, values):
+        try:
+            result = int(values.get('workers') or DEFAULT_WORKERS)
+            assert result > 0
+        except (AssertionError, ValueError):
+            raise_error({
+                'message': _(u"Invalid number of workers."),
+                'code': 'InvalidWorkers',
+            })
+        return result
+
+    def _queue_metadata(self, values):
+        return not is_true(values.get('skipMetadata') or values.get('skip_metadata'))
+
+    def _clear(self, catalog):
+        for index in list(catalog.values()):
+            index.clear()
+
+    def _reindex(self, scope):
+        intids = component.getUtility(IIntIds)
+        catalog = self.catalog()
+        if not scope:
+            self._clear(catalog)
+        items = dict()
+        for site_name, doc_id, course in iter_catalog_courses(intids, scope):
+            count = self.reindex_course(catalog, course, doc_id, intids, scope)
+            items[site_name] = items.get(site_name, 0) + count
+        return items
+
+    def _rebuild(self, values, scope):
+        errors = None
+        with coalesced_metadata_queue(self._queue_metadata(values)):
+            if is_true(values.get('parallel')):
+                items, errors = parallel_reindex(self.catalog,
+                                                 self.reindex_course,
+                                                 scope,
+                                                 self._get_workers(values))
+            else:
+                items = self._reindex(scope)
+        result = LocatedExternalDict()
+        result[ITEMS] = items
+        result[ITEM_COUNT] = result[TOTAL] = sum(items.values())
+        if errors:
+            result['Errors'] = errors
+        return result
+
+    def __call__(self):
+        values = CaseInsensitiveDict(self.request.params)
+        return self._rebuild(values, self._get_scope())
+
+
 @view_config(context=CourseAdminPathAdapter)
 @view_defaults(route_name='objects.generic.traversal',
                renderer='rest',
                request_method='POST',
                name="RebuildEnrollmentCatalog",
                permission=nauth.ACT_NTI_ADMIN)
-class RebuildEnrollmentCatalogView(AbstractAuthenticatedView):
+class RebuildEnrollmentCatalogView(CatalogRebuildMixin):
+    """
+    Rebuild the enrollment catalog into shadow indexes, which are then
+    swapped into the live catalog; a scoped (or parallel) rebuild reindexes
+    the matching courses, enrollment records and roles in place.
+
+    params:
+        async - run a full rebuild as a background job, committing it in
+            batches; an interrupted rebuild is resumed, as is a rebuild
+            whose checkpoint went stale (i.e. whose job died)
+        batchSize - the (minimum) number of documents per batch
+        restart - discard the checkpoint of an interrupted (or stale)
+            rebuild
+    """
+
+    def _get_batch_size(self, values):
+        try:
+            result = int(values.get('batchSize') or values.get('batch_size')
+                         or DEFAULT_BATCH_SIZE)
+            assert result > 0
+        except (AssertionError, ValueError):
+            raise_error({
+                'message': _(u"Invalid batch size."),
+                'code': 'InvalidBatchSize',
+            })
+        return result
+
+    def _start_job(self, values):
+        batch_size = self._get_batch_size(values)
+        restart = is_true(values.get('restart'))
+        metadata = self._queue_metadata(values)
+        rebuild = get_enrollment_rebuild()
+        running = get_job(rebuild.jobId) if rebuild is not None else None
+        if running is not None and not running.done:
+            if not rebuild.is_stale():
+                raise_error({
+                    'message': _(u"An enrollment catalog rebuild is in progress."),
+                    'code': 'RebuildInProgress',
+                    'JobId': running.jobId,
+                }, factory=hexc.HTTPConflict)
+            # its job died, take the rebuild over
+            logger.warning("Taking over stale enrollment catalog rebuild %s",
+                           running)
+            running.update(state=JOB_FAILED,
+                           error={'message': u'Job stalled', 'code': 'JobStalled'},
+                           finished=time.time())
+        # pylint: disable=no-member
+        job = CourseAdminJob(ENROLLMENT_REBUILD_JOB,
+                             creator=self.remoteUser.username,
+                             site=getSite().__name__,
+                             params={'batchSize': batch_size,
+                                     'restart': restart,
+                                     'metadata': metadata})
+
+        def _rebuild(job):
+            return run_enrollment_catalog_rebuild(job, batch_size, restart,
+                                                  metadata=metadata)
+
+        spawn_job(job, _rebuild, transactional=False)
+        href = '%s/@@%s?JobId=%s' % (course_admin_adapter_path(self.request),
+                                     VIEW_REBUILD_ENROLLMENT_CATALOG_JOB,
+                                     job.jobId)
+        self.request.response.status_int = 202
+        self.request.response.location = href
+        result = LocatedExternalDict(job.toExternalObject())
+        result['href'] = href
+        return result
+
+    catalog = staticmethod(get_enrollment_catalog)
+
+    reindex_course = staticmethod(reindex_course_enrollments)
 
     def __call__(self):
-        intids = component.getUtility(IIntIds)
-        # clear indexes
-        catalog = get_enrollment_catalog()
-        for index in list(catalog.values()):
-            index.clear()
-        # reindex
-        total = 0
-        seen = set()
-        items = dict()
-        for host_site in get_all_host_sites():  # check all sites
-            with current_site(host_site):
-                library = component.queryUtility(ICourseCatalog)
-                if library is None or library.isEmpty():
-                    continue
-                count = 0
-                for entry in library.iterCatalogEntries():
-                    course = ICourseInstance(entry)
-                    doc_id = intids.queryId(course)
-                    if doc_id is None or doc_id in seen:
-                        continue
-                    seen.add(doc_id)
-                    # make sure course is indexed
-                    # e.g. site and entry ntiid indexes
-                    catalog.index_doc(doc_id, course)
-                    metadata_queue_add(course)
-                    count += 1
-                    # index enrollments
-                    enrollments = ICourseEnrollments(course)
-                    # pylint: disable=too-many-function-args
-                    for record in enrollments.iter_enrollments():
-                        record_id = intids.queryId(record)
-                        if record_id is None or record.Principal is None:
-                            continue
-                        catalog.index_doc(record_id, record)
-                        metadata_queue_add(record)
-                        count += 1
-                    # index course roles
-                    count += index_course_roles(course, catalog, intids)
-                items[host_site.__name__] = count
-                total += count
+        values = CaseInsensitiveDict(self.request.params)
+        scope = self._get_scope()
+        if scope or is_true(values.get('parallel')):
+            return self._rebuild(values, scope)
+        if is_true(values.get('async')):
+            return self._start_job(values)
+        with coalesced_metadata_queue(self._queue_metadata(values)):
+            rebuild = rebuild_enrollment_catalog()
         result = LocatedExternalDict()
-        result[ITEMS] = items
-        result[ITEM_COUNT] = result[TOTAL] = total
+        result[ITEMS] = rebuild['Items']
+        result[ITEM_COUNT] = result[TOTAL] = rebuild['Total']
+        result['Elapsed'] = rebuild['Elapsed']
         return result
 
 
 @view_config(context=CourseAdminPathAdapter)
 @view_defaults(route_name='objects.generic.traversal',
                renderer='rest',
-               request_method='POST',
-               name="RebuildCoursesCatalog",
+               request_method='GET',
+               name=VIEW_REBUILD_ENROLLMENT_CATALOG_JOB,
                permission=nauth.ACT_NTI_ADMIN)
-class RebuildCoursesCatalogView(AbstractAuthenticatedView):
+class RebuildEnrollmentCatalogJobView(AbstractAuthenticatedView):
+    """
+    Return the state of a background enrollment catalog rebuild; its
+    ``Progress`` while it runs and its ``Items`` and ``Total`` once done.
 
-    def index_bundle(self, catalog, course, intids):
-        if      not ICourseSubInstance.providedBy(course) \
-            and IContentCourseInstance.providedBy(course):
-            bundle = course.ContentPackageBundle
-            doc_id = intids.queryId(bundle)
-            if doc_id is not None:
-                catalog.index_doc(doc_id, bundle)
+    params:
+        JobId - the job identifier
+    """
 
     def __call__(self):
-        intids = component.getUtility(IIntIds)
-        # clear indexes
-        catalog = get_courses_catalog()
-        for index in list(catalog.values()):
-            index.clear()
-        # reindex
-        seen = set()
-        items = dict()
-        bundle_catalog = get_contentbundle_catalog()
-        for host_site in get_all_host_sites():  # check all sites
-            with current_site(host_site):
-                library = component.queryUtility(ICourseCatalog)
-                count = 0
-                for entry in library.iterCatalogEntries():
-                    course = ICourseInstance(entry)
-                    doc_id = intids.queryId(course)
-                    if doc_id is None or doc_id in seen:
-                        continue
-                    count += 1
-                    seen.add(doc_id)
-                    # index course
-                    catalog.index_doc(doc_id, course)
-                    metadata_queue_add(course)
-                    # index entry
-                    metadata_queue_add(entry)
-                    doc_id = intids.queryId(entry)
-                    if doc_id is not None:
-                        catalog.index_doc(doc_id, entry)
-                    # index bundle
-                    self.index_bundle(bundle_catalog, course, intids)
-                items[host_site.__name__] = count
-        result = LocatedExternalDict()
-        result[ITEMS] = items
-        result[ITEM_COUNT] = result[TOTAL] = len(seen)
+        values = CaseInsensitiveDict(self.request.params)
+        job = get_job(values.get('JobId') or values.get('id'))
+        if job is None or job.kind != ENROLLMENT_REBUILD_JOB:
+            raise hexc.HTTPNotFound()
+        result = LocatedExternalDict(job.toExternalObject())
+        if job.state == JOB_SUCCESS:
+            result.update(job.result or {})
         return result
 
 
+@view_config(context=CourseAdminPathAdapter)
+@view_defaults(route_name='objects.generic.traversal',
+               renderer='rest',
+               request_method='POST',
+               name="RebuildCoursesCatalog",
+               permission=nauth.ACT_NTI_ADMIN)
+class RebuildCoursesCatalogView(CatalogRebuildMixin):
+
+    catalog = staticmethod(get_courses_catalog)
+
+    reindex_course = staticmethod(reindex_course_entry)
+
+
 @view_config(context=CourseAdminPathAdapter)
 @view_defaults(route_name='objects.generic.traversal',
                renderer='rest',
                request_method='POST',
                name="RebuildCourseOutlineCatalog",
                permission=nauth.ACT_NTI_ADMIN)
-class RebuildCourseOutlineCatalogView(AbstractAuthenticatedView):
+class RebuildCourseOutlineCatalogView(CatalogRebuildMixin):
+
+    catalog = staticmethod(get_course_outline_catalog)
+
+    reindex_course = staticmethod(reindex_course_outline)
+
 
-    def _index_nodes(self, course, catalog, intids):
+class CatalogVerifyMixin(CatalogRebuildMixin):
+    """
+    Base of the catalog verification views, which report the documents
+    of a catalog that are missing, stale or orphaned; they may be scoped
+    as the rebuild views (orphans are only looked for when unscoped).
 
-        def recur(node):
-            if node is None:
-                return
-            doc_id = intids.queryId(node)
-            if doc_id is not None:
-                catalog.index_doc(doc_id, node)
-                metadata_queue_add(node)
-            for child in node.values():
-                recur(child)
+    params:
+        repair - fix (only) the differences found
+        limit - the maximum number of documents listed of each kind
+    """
 
-        recur(course.Outline)
+    #: Return the (intid, object) documents of a course
+    documents = None
 
     def __call__(self):
-        intids = component.getUtility(IIntIds)
-        # clear indexes
-        catalog = get_course_outline_catalog()
-        for index in list(catalog.values()):
-            index.clear()
-        # reindex
-        seen = set()
-        items = dict()
-        for host_site in get_all_host_sites():  # check all sites
-            with current_site(host_site):
-                library = component.queryUtility(ICourseCatalog)
-                if library is None or library.isEmpty():
-                    continue
-                count = 0
-                for entry in library.iterCatalogEntries():
-                    course = ICourseInstance(entry)
-                    doc_id = intids.queryId(course)
-                    if doc_id is None or doc_id in seen:
-                        continue
-                    count += 1
-                    seen.add(doc_id)
-                    self._index_nodes(course, catalog, intids)
-                items[host_site.__name__] = count
+        values = CaseInsensitiveDict(self.request.params)
+        try:
+            limit = int(values.get('limit') or DEFAULT_REPORT_LIMIT)
+            assert limit >= 0
+        except (AssertionError, ValueError):
+            raise_error({
+                'message': _(u"Invalid limit."),
+                'code': 'InvalidLimit',
+            })
+        with coalesced_metadata_queue(self._queue_metadata(values)):
+            report = verify_catalog(self.catalog(), self.documents,
+                                    scope=self._get_scope(),
+                                    repair=is_true(values.get('repair')),
+                                    limit=limit)
+        return LocatedExternalDict(report.toExternalObject())
+
+
+@view_config(context=CourseAdminPathAdapter)
+@view_defaults(route_name='objects.generic.traversal',
+               renderer='rest',
+               request_method='POST',
+               name="VerifyCoursesCatalog",
+               permission=nauth.ACT_NTI_ADMIN)
+class VerifyCoursesCatalogView(CatalogVerifyMixin):
+
+    documents = staticmethod(iter_courses_documents)
+
+    catalog = staticmethod(get_courses_catalog)
+
+
+@view_config(context=CourseAdminPathAdapter)
+@view_defaults(route_name='objects.generic.traversal',
+               renderer='rest',
+               request_method='POST',
+               name="VerifyEnrollmentCatalog",
+               permission=nauth.ACT_NTI_ADMIN)
+class VerifyEnrollmentCatalogView(CatalogVerifyMixin):
+    """
+    Verify the courses and enrollment records of the enrollment catalog;
+    course roles are not verified.
+    """
+
+    documents = staticmethod(iter_enrollment_documents)
+
+    catalog = staticmethod(get_enrollment_catalog)
+
+
+@view_config(context=CourseAdminPathAdapter)
+@view_defaults(route_name='objects.generic.traversal',
+               renderer='rest',
+               request_method='POST',
+               name="VerifyCourseOutlineCatalog",
+               permission=nauth.ACT_NTI_ADMIN)
+class VerifyCourseOutlineCatalogView(CatalogVerifyMixin):
+
+    documents = staticmethod(iter_outline_documents)
+
+    catalog = staticmethod(get_course_outline_catalog)
+
+
+@view_config(context=CourseAdminPathAdapter)
+@view_defaults(route_name='objects.generic.traversal',
+               renderer='rest',
+               request_method='POST',
+               name="RebuildExportHashIndex",
+               permission=nauth.ACT_NTI_ADMIN)
+class RebuildExportHashIndexView(AbstractAuthenticatedView):
+
+    def __call__(self):
+        now = time.time()
+        total = rebuild_export_hash_index()
         result = LocatedExternalDict()
-        result[ITEMS] = items
-        result[ITEM_COUNT] = result[TOTAL] = len(seen)
+        result[ITEM_COUNT] = result[TOTAL] = total
+        result['Elapsed'] = time.time() - now
+        return result
+
+
+@view_config(context=CourseAdminPathAdapter)
+@view_defaults(route_name='objects.generic.traversal',
+               renderer='rest',
+               request_method='GET',
+               name="CoursesForExportHash",
+               permission=nauth.ACT_NTI_ADMIN)
+class CoursesForExportHashView(AbstractAuthenticatedView):
+    """
+    Return the catalog entries of the courses imported from an archive
+    with the given ``hash``.
+    """
+
+    def __call__(self):
+        values = CaseInsensitiveDict(self.request.params)
+        export_hash = values.get('hash') or values.get('export_hash')
+        if not export_hash:
+            raise_error({
+                'message': _(u'Must specify an export hash.'),
+                'code': 'MissingExportHash',
+            })
+        courses = get_courses_for_export_hash(export_hash) or ()
+        result = LocatedExternalDict()
+        items = result[ITEMS] = [ICourseCatalogEntry(x) for x in courses]
+        result[ITEM_COUNT] = result[TOTAL] = len(items)
         return result
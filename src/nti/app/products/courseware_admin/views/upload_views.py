@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Resumable, chunked uploads of course archives.
+
+A client creates an upload, PUTs its chunks in order and then imports the
+assembled archive by passing its ``upload`` id to ``@@ImportCourse`` (or
+``@@Import``/``@@ValidateCourseArchive``). After an interruption, a GET
+returns the ``Offset`` to resume from.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import re
+import os
+
+from pyramid import httpexceptions as hexc
+
+from pyramid.view import view_config
+from pyramid.view import view_defaults
+
+from requests.structures import CaseInsensitiveDict
+
+from zope import component
+
+from nti.app.base.abstract_views import AbstractAuthenticatedView
+
+from nti.app.products.courseware.views import raise_error
+from nti.app.products.courseware.views import CourseAdminPathAdapter
+
+from nti.app.products.courseware_admin import MessageFactory as _
+
+from nti.app.products.courseware_admin.interfaces import ICourseArchiveUploads
+
+from nti.app.products.courseware_admin.uploads import UploadError
+from nti.app.products.courseware_admin.uploads import UploadOffsetError
+from nti.app.products.courseware_admin.uploads import UploadChecksumError
+
+from nti.app.products.courseware_admin.views import VIEW_IMPORT_UPLOADS
+
+from nti.dataserver import authorization as nauth
+
+from nti.dataserver.authorization import is_admin_or_content_admin
+
+from nti.externalization.interfaces import LocatedExternalDict
+
+from nti.namedfile.file import safe_filename
+
+CONTENT_RANGE = re.compile(r'^bytes\s+(\d+)-(\d+)/(\d+|\*)$')
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def get_upload(upload_id, user):
+    """
+    Return the status of the given upload if it was created by the given
+    user, or the user is an admin.
+    """
+    uploads = component.getUtility(ICourseArchiveUploads)
+    status = uploads.get(upload_id) if upload_id else None
+    if      status is not None \
+        and status.get('Creator') != getattr(user, 'username', user) \
+        and not is_admin_or_content_admin(user):
+        status = None
+    return status
+
+
+class UploadMixin(AbstractAuthenticatedView):
+
+    @property
+    def _params(self):
+        return CaseInsensitiveDict(self.request.params)
+
+    def _get_upload(self):
+        values = self._params
+        upload_id = values.get('UploadId') or values.get('upload') or values.get('id')
+        status = get_upload(upload_id, self.remoteUser)
+        if status is None:
+            raise hexc.HTTPNotFound()
+        return status
+
+    def _to_external(self, status):
+        result = LocatedExternalDict(status)
+        result['href'] = '%s?UploadId=%s' % (self.request.path, status['UploadId'])
+        return result
+
+
+@view_config(context=CourseAdminPathAdapter)
+@view_defaults(route_name='objects.generic.traversal',
+               renderer='rest',
+               request_method='POST',
+               name=VIEW_IMPORT_UPLOADS,
+               permission=nauth.ACT_CONTENT_EDIT)
+class CreateUploadView(UploadMixin):
+    """
+    Start a chunked upload of a course archive.
+
+    params:
+        filename - the archive name
+        size - the archive size in bytes
+        checksum - the sha256 (hex) of the archive, optional
+    """
+
+    def __call__(self):
+        values = self._params
+        filename = safe_filename(os.path.split(values.get('filename') or '')[1])
+        if not filename:
+            raise_error({
+                'message': _(u"Invalid archive name."),
+                'code': 'InvalidFilename',
+            })
+        try:
+            size = int(values.get('size'))
+            assert size > 0
+        except (AssertionError, TypeError, ValueError):
+            raise_error({
+                'message': _(u"Invalid archive size."),
+                'code': 'InvalidSize',
+            })
+        uploads = component.getUtility(ICourseArchiveUploads)
+        status = uploads.create(filename, size,
+                                creator=self.remoteUser.username,
+                                checksum=values.get('checksum'))
+        logger.info("Course archive upload %s (%s bytes) created by %s",
+                    status['UploadId'], size, self.remoteUser)
+        self.request.response.status_int = 201
+        return self._to_external(status)
+
+
+@view_config(context=CourseAdminPathAdapter)
+@view_defaults(route_name='objects.generic.traversal',
+               renderer='rest',
+               request_method='GET',
+               name=VIEW_IMPORT_UPLOADS,
+               permission=nauth.ACT_CONTENT_EDIT)
+class UploadStatusView(UploadMixin):
+    """
+    Return the state of a chunked upload, e.g. the ``Offset`` to resume from.
+
+    params:
+        UploadId - the upload identifier
+    """
+
+    def __call__(self):
+        return self._to_external(self._get_upload())
+
+
+@view_config(context=CourseAdminPathAdapter)
+@view_defaults(route_name='objects.generic.traversal',
+               renderer='rest',
+               request_method='PUT',
+               name=VIEW_IMPORT_UPLOADS,
+               permission=nauth.ACT_CONTENT_EDIT)
+class UploadChunkView(UploadMixin):
+    """
+    Write the request body as the next chunk of an upload. The chunk offset
+    is given by the ``Content-Range`` header (or the ``offset`` param) and
+    its sha256 by the ``X-Chunk-Checksum`` header (or the ``checksum`` param).
+
+    params:
+        UploadId - the upload identifier
+    """
+
+    def _get_offset(self, status):
+        values = self._params
+        content_range = self.request.headers.get('Content-Range')
+        if content_range:
+            match = CONTENT_RANGE.match(content_range.strip())
+            if      match is None \
+                or int(match.group(2)) - int(match.group(1)) + 1 != len(self.request.body) \
+                or match.group(3) not in ('*', str(status['Size'])):
+                raise_error({
+                    'message': _(u"Invalid content range."),
+                    'code': 'InvalidContentRange',
+                })
+            return int(match.group(1))
+        try:
+            return int(values.get('offset') or 0)
+        except ValueError:
+            raise_error({
+                'message': _(u"Invalid chunk offset."),
+                'code': 'InvalidOffset',
+            })
+
+    def __call__(self):
+        status = self._get_upload()
+        upload_id = status['UploadId']
+        offset = self._get_offset(status)
+        checksum = self.request.headers.get('X-Chunk-Checksum') \
+                or self._params.get('checksum')
+        uploads = component.getUtility(ICourseArchiveUploads)
+        try:
+            status = uploads.write(upload_id, offset, self.request.body, checksum)
+        except UploadOffsetError as e:
+            raise_error({
+                'message': _(u"Chunk does not start at the upload offset."),
+                'code': 'InvalidOffset',
+                'Offset': e.offset,
+            }, factory=hexc.HTTPConflict)
+        except UploadChecksumError:
+            raise_error({
+                'message': _(u"Checksum mismatch."),
+                'code': 'ChecksumMismatch',
+                'Offset': uploads.get(upload_id)['Offset'],
+            })
+        except UploadError as e:
+            raise_error({
+                'message': str(e),
+                'code': 'InvalidChunk',
+            })
+        if status['Complete']:
+            logger.info("Course archive upload %s completed", upload_id)
+        return self._to_external(status)
+
+
+@view_config(context=CourseAdminPathAdapter)
+@view_defaults(route_name='objects.generic.traversal',
+               renderer='rest',
+               request_method='DELETE',
+               name=VIEW_IMPORT_UPLOADS,
+               permission=nauth.ACT_CONTENT_EDIT)
+class DeleteUploadView(UploadMixin):
+    """
+    Discard a chunked upload.
+
+    params:
+        UploadId - the upload identifier
+    """
+
+    def __call__(self):
+        status = self._get_upload()
+        component.getUtility(ICourseArchiveUploads).remove(status['UploadId'])
+        return hexc.HTTPNoContent()
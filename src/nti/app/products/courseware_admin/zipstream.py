@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Write zip archives to non seekable streams (e.g. an HTTP response).
+
+Entries are written with a trailing data descriptor so their sizes and
+checksums need not be known before the data; ZIP64 records are used when
+sizes or offsets require them.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import os
+import time
+import zlib
+import struct
+
+import six
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+#: Default read size when streaming files
+CHUNK_SIZE = 256 * 1024
+
+ZIP32_LIMIT = 0xFFFFFFFF
+ZIP32_COUNT_LIMIT = 0xFFFF
+
+#: Entries whose size is over this limit are written as ZIP64 since
+#: their compressed size may not fit in 32 bits
+ZIP64_THRESHOLD = 0x7FFFFFFF
+
+#: Compression policies, see :func:`get_zip_writer`
+COMPRESSION_AUTO = 'auto'
+COMPRESSION_STORE = 'store'
+COMPRESSION_DEFLATE = 'deflate'
+
+#: Extensions of already compressed files, stored as is by the auto policy
+STORED_EXTENSIONS = frozenset((
+    '.7z', '.aac', '.avi', '.bz2', '.docx', '.epub', '.flac', '.gif', '.gz',
+    '.jpeg', '.jpg', '.m4a', '.m4v', '.mkv', '.mov', '.mp3', '.mp4', '.mpeg',
+    '.mpg', '.odp', '.ods', '.odt', '.ogg', '.ogv', '.png', '.pptx', '.rar',
+    '.tgz', '.webm', '.webp', '.woff', '.woff2', '.xlsx', '.xz', '.zip',
+))
+
+#: Bytes of a file sampled by the auto policy
+SAMPLE_SIZE = 64 * 1024
+
+#: Files whose sample does not deflate below this ratio are stored
+MIN_COMPRESSION_RATIO = 0.9
+
+_FLAG_DATA_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+
+_LOCAL_HEADER = struct.Struct('<4sHHHHHLLLHH')
+_DATA_DESCRIPTOR = struct.Struct('<4sLLL')
+_DATA_DESCRIPTOR64 = struct.Struct('<4sLQQ')
+_CENTRAL_HEADER = struct.Struct('<4sHHHHHHLLLHHHHHLL')
+_END_RECORD = struct.Struct('<4sHHHHLLH')
+_END_RECORD64 = struct.Struct('<4sQHHLLQQQQ')
+_END_LOCATOR64 = struct.Struct('<4sLQL')
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def _dos_datetime(mtime):
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+class _Entry(object):
+
+    __slots__ = ('name', 'flags', 'method', 'dos_time', 'dos_date', 'crc',
+                 'compressed', 'size', 'offset', 'zip64')
+
+    def __init__(self, name, method, mtime, offset, zip64):
+        self.name = name
+        self.crc = 0
+        self.size = self.compressed = 0
+        self.method = method
+        self.offset = offset
+        self.zip64 = zip64
+        self.flags = _FLAG_DATA_DESCRIPTOR | _FLAG_UTF8
+        self.dos_time, self.dos_date = _dos_datetime(mtime)
+
+
+class ZipStreamWriter(object):
+    """
+    Produce a zip archive as an iterable of byte chunks.
+
+    Each ``iter_*`` method yields the bytes for its part of the archive;
+    they must be consumed in order, ending with :meth:`iter_close`.
+    """
+
+    def __init__(self, compression=ZIP_DEFLATED, level=zlib.Z_DEFAULT_COMPRESSION,
+                 chunk_size=CHUNK_SIZE):
+        self.level = level
+        self.compression = compression
+        self.chunk_size = chunk_size
+        self.entries = []
+        self.offset = 0
+
+    @property
+    def bytes_written(self):
+        return self.offset
+
+    def _emit(self, data):
+        self.offset += len(data)
+        return data
+
+    def _encode_name(self, name):
+        if isinstance(name, six.binary_type):
+            name = name.decode('utf-8')
+        return name.replace(os.sep, '/').lstrip('/').encode('utf-8')
+
+    def _compression_for(self, unused_name, unused_path=None):
+        return self.compression, self.level
+
+    def iter_stream(self, name, stream, mtime=None, size=None,
+                    compression=None, level=None):
+        """
+        Write the contents of the given stream as ``name``.
+        """
+        method = self.compression if compression is None else compression
+        level = self.level if level is None else level
+        zip64 = size is None or size > ZIP64_THRESHOLD
+        entry = _Entry(self._encode_name(name), method,
+                       mtime or time.time(), self.offset, zip64)
+        extra = struct.pack('<HHQQ', 1, 16, 0, 0) if zip64 else b''
+        version = 45 if zip64 else 20
+        yield self._emit(_LOCAL_HEADER.pack(b'PK\x03\x04', version, entry.flags,
+                                            entry.method, entry.dos_time,
+                                            entry.dos_date, 0, 0, 0,
+                                            len(entry.name), len(extra)))
+        yield self._emit(entry.name + extra)
+        compressor = None
+        if method == ZIP_DEFLATED:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        crc = 0
+        while True:
+            data = stream.read(self.chunk_size)
+            if not data:
+                break
+            entry.size += len(data)
+            crc = zlib.crc32(data, crc)
+            if compressor is not None:
+                data = compressor.compress(data)
+            if data:
+                entry.compressed += len(data)
+                yield self._emit(data)
+        if compressor is not None:
+            data = compressor.flush()
+            entry.compressed += len(data)
+            yield self._emit(data)
+        entry.crc = crc & 0xFFFFFFFF
+        if zip64:
+            descriptor = _DATA_DESCRIPTOR64.pack(b'PK\x07\x08', entry.crc,
+                                                 entry.compressed, entry.size)
+        else:
+            descriptor = _DATA_DESCRIPTOR.pack(b'PK\x07\x08', entry.crc,
+                                               entry.compressed, entry.size)
+        yield self._emit(descriptor)
+        self.entries.append(entry)
+
+    def iter_file(self, path, name=None):
+        """
+        Write the file at the given path as ``name``.
+        """
+        name = name or os.path.basename(path)
+        compression, level = self._compression_for(name, path)
+        stat = os.stat(path)
+        with open(path, 'rb') as stream:
+            for data in self.iter_stream(name, stream, stat.st_mtime,
+                                         stat.st_size, compression, level):
+                yield data
+
+    def iter_directory(self, root):
+        """
+        Write every file under the given directory, named relative to it.
+        """
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, root)
+                for data in self.iter_file(path, name):
+                    yield data
+
+    def _central_header(self, entry):
+        extra = []
+        size, compressed, offset = entry.size, entry.compressed, entry.offset
+        if size >= ZIP32_LIMIT:
+            extra.append(size)
+            size = ZIP32_LIMIT
+        if compressed >= ZIP32_LIMIT:
+            extra.append(compressed)
+            compressed = ZIP32_LIMIT
+        if offset >= ZIP32_LIMIT:
+            extra.append(offset)
+            offset = ZIP32_LIMIT
+        if extra:
+            extra = struct.pack('<HH' + 'Q' * len(extra), 1, 8 * len(extra), *extra)
+        else:
+            extra = b''
+        version = 45 if extra or entry.zip64 else 20
+        header = _CENTRAL_HEADER.pack(b'PK\x01\x02', (3 << 8) | version,
+                                      version, entry.flags, entry.method,
+                                      entry.dos_time, entry.dos_date,
+                                      entry.crc, compressed, size,
+                                      len(entry.name), len(extra), 0, 0, 0,
+                                      0o100644 << 16, offset)
+        return header + entry.name + extra
+
+    def iter_close(self):
+        """
+        Write the central directory, completing the archive.
+        """
+        start = self.offset
+        for entry in self.entries:
+            yield self._emit(self._central_header(entry))
+        count = len(self.entries)
+        size = self.offset - start
+        if      count >= ZIP32_COUNT_LIMIT \
+            or size >= ZIP32_LIMIT \
+            or start >= ZIP32_LIMIT:
+            end64 = self.offset
+            yield self._emit(_END_RECORD64.pack(b'PK\x06\x06', 44, 45, 45, 0, 0,
+                                                count, count, size, start))
+            yield self._emit(_END_LOCATOR64.pack(b'PK\x06\x07', 0, end64, 1))
+            count = min(count, ZIP32_COUNT_LIMIT)
+            size = min(size, ZIP32_LIMIT)
+            start = min(start, ZIP32_LIMIT)
+        yield self._emit(_END_RECORD.pack(b'PK\x05\x06', 0, 0, count, count,
+                                          size, start, 0))
+
+
+class AutoZipStreamWriter(ZipStreamWriter):
+    """
+    A :class:`ZipStreamWriter` that stores (rather than deflates) files that
+    are already compressed, as told by their extension or by how well a
+    sample of their contents deflates.
+    """
+
+    def _compressible(self, path):
+        with open(path, 'rb') as fp:
+            sample = fp.read(SAMPLE_SIZE)
+        if not sample:
+            return False
+        compressed = zlib.compress(sample, 1)
+        return len(compressed) < len(sample) * MIN_COMPRESSION_RATIO
+
+    def _compression_for(self, name, path=None):
+        ext = os.path.splitext(name)[1].lower()
+        if      ext in STORED_EXTENSIONS \
+            or (path is not None and not self._compressible(path)):
+            return ZIP_STORED, self.level
+        return self.compression, self.level
+
+
+def get_zip_writer(policy=None):
+    """
+    Return a :class:`ZipStreamWriter` for the given compression policy:
+    ``store``, ``deflate`` (the default), a deflate level (``0`` to ``9``,
+    optionally as ``deflate:<level>``) or ``auto``, to store files that are
+    already compressed.
+
+    :raises ValueError: If the policy is invalid.
+    """
+    policy = (policy or COMPRESSION_DEFLATE).strip().lower()
+    if policy == COMPRESSION_AUTO:
+        return AutoZipStreamWriter()
+    if policy == COMPRESSION_STORE:
+        return ZipStreamWriter(compression=ZIP_STORED)
+    if policy == COMPRESSION_DEFLATE:
+        return ZipStreamWriter()
+    if policy.startswith(COMPRESSION_DEFLATE + ':'):
+        policy = policy[len(COMPRESSION_DEFLATE) + 1:]
+    if policy.isdigit() and 0 <= int(policy) <= 9:
+        return ZipStreamWriter(level=int(policy))
+    raise ValueError("Invalid compression policy %s" % policy)
+
+
+def iter_zip_directory(root, writer=None):
+    """
+    Return an iterable of the bytes of a zip archive of the given directory.
+    """
+    writer = ZipStreamWriter() if writer is None else writer
+    for data in writer.iter_directory(root):
+        yield data
+    for data in writer.iter_close():
+        yield data
+
+
+def write_zip(chunks, path):
+    """
+    Write the given zip archive chunks to a file, returning its size.
+    """
+    size = 0
+    with open(path, 'wb') as fp:
+        for data in chunks:
+            fp.write(data)
+            size += len(data)
+    return size
+
+
+def write_zip_directory(root, path, writer=None):
+    """
+    Write a zip archive of the given directory to a file, returning its size.
+    """
+    return write_zip(iter_zip_directory(root, writer), path)